@@ -0,0 +1,170 @@
+# WaveAI - Registre unique des agents
+# Chargé une fois depuis agents.json, prompts précompilés, rechargé à chaud si le fichier change
+
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from string import Template
+
+from keyword_matcher import KeywordMatcher
+
+logger = logging.getLogger(__name__)
+
+AGENTS_FILE = os.environ.get('WAVEAI_AGENTS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'agents.json'))
+RELOAD_INTERVAL = float(os.environ.get('WAVEAI_AGENTS_RELOAD_INTERVAL', 5))
+
+# Partie statique construite au chargement ; seuls le nom et la date sont substitués par appel
+EXPERT_PROMPT = """Tu es {name}, {role}.
+
+PERSONNALITÉ: {personality}
+
+EXPERTISE:
+{expertise}
+
+TON: {tone}
+
+RÈGLES DE RÉPONSE:
+1. Reste TOUJOURS dans ton rôle d'expert {role}
+2. Utilise un ton {tone}
+3. Propose des conseils CONCRETS et ACTIONNABLES
+4. Utilise des émojis appropriés à ta personnalité
+5. Structure tes réponses avec des listes ou étapes quand pertinent
+6. Référence tes domaines d'expertise spécifiques
+7. Limite-toi à 200-300 mots maximum
+8. Termine par une question engageante ou une suggestion d'action
+
+CONTEXTE:
+- L'utilisateur s'appelle $user_name
+- Tu fais partie de la plateforme WaveAI avec 3 autres agents experts
+- Date actuelle: $date
+"""
+
+
+class Agent:
+    def __init__(self, agent_id, data):
+        self.id = agent_id
+        self.name = data['name']
+        self.emoji = data.get('emoji', '🌊')
+        self.description = data.get('description', '')
+        self.prompt = data.get('prompt') or f"Tu es {self.name}, agent de WaveAI."
+        self.role = data.get('role', '')
+        self.system_prompt = data.get('system_prompt') or self.prompt
+        self.specialties = tuple(data.get('specialties', []))
+        # false : réponses trop personnelles ou datées pour être réutilisées par similarité
+        self.semantic_cache = data.get('semantic_cache', True)
+
+        # Précompilés une seule fois par chargement
+        expertise = '\n'.join(f'• {item}' for item in data.get('expertise', []))
+        self.expert_template = Template(EXPERT_PROMPT.format(
+            name=self.name,
+            role=self.role,
+            personality=data.get('personality', '').replace('$', '$$'),
+            expertise=expertise.replace('$', '$$'),
+            tone=data.get('tone', '').replace('$', '$$')
+        ))
+        fallbacks = data.get('fallbacks', {})
+        self.default_fallback = fallbacks.get('default')
+        # Clé : mot-clé ou "mot1|mot2" ; valeur : réponse ou {"response": ..., "weight": ...}
+        self.fallbacks = KeywordMatcher(
+            (keywords, entry['response'], entry.get('weight')) if isinstance(entry, dict) else (keywords, entry)
+            for keywords, entry in fallbacks.items() if keywords != 'default'
+        )
+        # Vue dict attendue par WaveAISystem et les templates
+        self.profile = {
+            'name': self.name,
+            'emoji': self.emoji,
+            'description': self.description,
+            'prompt': self.prompt
+        }
+
+    def expert_prompt(self, user_name=None, date=None):
+        return self.expert_template.substitute(
+            user_name=user_name or 'utilisateur',
+            date=date or datetime.now().strftime('%d/%m/%Y')
+        )
+
+    def fallback(self, message):
+        """Réponse la mieux notée sur l'ensemble des mots-clés trouvés, sinon la réponse par défaut"""
+        return self.fallbacks.best(message) or self.default_fallback
+
+
+class AgentRegistry:
+    def __init__(self, path=AGENTS_FILE, reload_interval=RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.agents = {}
+        self.profiles = {}
+        self.default_agent = 'kai'
+        self.mtime = None
+        self.loaded_at = None
+        self._checked_at = 0
+        self._rejected_mtime = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Charge le fichier ; en cas d'erreur la version précédente reste active"""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, encoding='utf-8') as handle:
+                data = json.load(handle)
+            agents = {agent_id: Agent(agent_id, entry) for agent_id, entry in data['agents'].items()}
+            default_agent = data.get('default_agent', 'kai')
+            if default_agent not in agents:
+                raise ValueError(f"agent par défaut inconnu: {default_agent}")
+        except Exception as e:
+            logger.error(f"Erreur chargement agents ({self.path}): {e}")
+            if not self.agents:
+                raise
+            return False
+
+        with self._lock:
+            # Remplacement atomique : les lecteurs voient l'ancien ou le nouveau registre, jamais un mélange
+            self.agents = agents
+            self.profiles = {agent_id: agent.profile for agent_id, agent in agents.items()}
+            self.default_agent = default_agent
+            self.mtime = mtime
+            self.loaded_at = time.time()
+        return True
+
+    def maybe_reload(self):
+        """Vérifie la date du fichier au plus une fois par intervalle (un stat, pas de lecture)"""
+        if self.reload_interval <= 0:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return False
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        # Une version invalide n'est signalée qu'une fois, jusqu'à la prochaine modification
+        if mtime in (self.mtime, self._rejected_mtime):
+            return False
+        if self.load():
+            logger.info(f"Agents rechargés depuis {self.path}")
+            return True
+        self._rejected_mtime = mtime
+        return False
+
+    def get(self, agent_id, default=True):
+        self.maybe_reload()
+        agent = self.agents.get(agent_id)
+        if agent is None and default:
+            agent = self.agents[self.default_agent]
+        return agent
+
+    def get_profiles(self):
+        self.maybe_reload()
+        return self.profiles
+
+    def __contains__(self, agent_id):
+        return agent_id in self.agents
+
+
+# Instance globale partagée par les trois systèmes d'agents
+agent_registry = AgentRegistry()
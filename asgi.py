@@ -0,0 +1,191 @@
+# WaveAI - Point d'entrée ASGI
+# /api/chat servi en asyncio natif, le reste de l'application Flask via WsgiToAsgi
+
+import os
+import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from multi_user_app import (app, ai_system, get_settings_snapshot, save_conversation,
+                            validate_chat_payload, load_chat_context, check_chat_limits)
+from rate_limit import client_ip
+from async_chat import AsyncWaveAISystem
+
+logger = logging.getLogger(__name__)
+
+# Requêtes Flask simultanées par processus (un flux SSE occupe un thread jusqu'à sa fin)
+WSGI_THREADS = int(os.environ.get('WAVEAI_WSGI_THREADS', 40))
+wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='waveai-wsgi')
+
+
+class ThreadedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    """asgiref exécute l'app WSGI avec thread_sensitive=True : un seul thread pour tout le processus.
+    Ici chaque requête prend un thread du pool, les routes Flask ne s'attendent plus entre elles.
+    """
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self.run_wsgi_app_sync, thread_sensitive=False, executor=wsgi_executor)(body)
+
+    def run_wsgi_app_sync(self, body):
+        # Même protocole que WsgiToAsgiInstance.run_wsgi_app (en-têtes au premier morceau, Content-Length respecté)
+        environ = self.build_environ(self.scope, body)
+        bytes_sent = 0
+        for output in self.wsgi_application(environ, self.start_response):
+            if not self.response_started:
+                self.response_started = True
+                self.sync_send(self.response_start)
+            if self.response_content_length is not None:
+                output = output[:self.response_content_length - bytes_sent]
+            self.sync_send({'type': 'http.response.body', 'body': output, 'more_body': True})
+            bytes_sent += len(output)
+            if bytes_sent == self.response_content_length:
+                break
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({'type': 'http.response.body'})
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await ThreadedWsgiToAsgiInstance(self.wsgi_application)(scope, receive, send)
+
+
+async_ai = AsyncWaveAISystem(ai_system)
+flask_asgi = ThreadedWsgiToAsgi(app)
+
+
+def load_flask_session(scope):
+    """Relit le cookie de session signé par Flask (même secret, même durée de vie)"""
+    headers = dict(scope.get('headers') or [])
+    cookie_header = headers.get(b'cookie', b'').decode('latin-1')
+    if not cookie_header:
+        return {}
+
+    cookies = SimpleCookie()
+    cookies.load(cookie_header)
+    morsel = cookies.get(app.config['SESSION_COOKIE_NAME'])
+    if morsel is None:
+        return {}
+
+    serializer = app.session_interface.get_signing_serializer(app)
+    try:
+        return serializer.loads(morsel.value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return {}
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        event = await receive()
+        body += event.get('body', b'')
+        if not event.get('more_body'):
+            return body
+
+
+async def send_json(send, status, data, headers=None):
+    body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii'))
+        ] + (headers or [])
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def scope_client_ip(scope):
+    headers = dict(scope.get('headers') or [])
+    client = scope.get('client') or (None, None)
+    return client_ip(client[0], headers.get(b'x-forwarded-for', b'').decode('latin-1'))
+
+
+def check_limits(user_id, ip):
+    # Le quota peut relire la base : hors de la boucle
+    with app.app_context():
+        return check_chat_limits(user_id, ip)
+
+
+def load_context(user_id, agent_type, message, conversation_id):
+    # Accès base synchrone : exécuté hors de la boucle, copie détachée de la session
+    with app.app_context():
+        settings = get_settings_snapshot(user_id)
+        conversation_id, history = load_chat_context(user_id, agent_type, message, conversation_id, settings)
+        return settings, conversation_id, history
+
+
+def store_conversation(user_id, agent_type, message, response, conversation_id):
+    with app.app_context():
+        return save_conversation(user_id, agent_type, message, response, conversation_id)
+
+
+async def chat_endpoint(scope, receive, send):
+    session = load_flask_session(scope)
+    if 'user_id' not in session:
+        await send_json(send, 401, {'error': 'Non connecté'})
+        return
+
+    try:
+        try:
+            data = json.loads(await read_body(receive) or b'null')
+        except ValueError:
+            data = None
+
+        message, agent_type, conversation_id, error = validate_chat_payload(data if isinstance(data, dict) else None)
+        if error:
+            await send_json(send, 400, {'error': error})
+            return
+
+        user_id = session['user_id']
+        limit = await asyncio.to_thread(check_limits, user_id, scope_client_ip(scope))
+        if limit:
+            payload, retry_after = limit
+            await send_json(send, 429, payload, [(b'retry-after', str(retry_after).encode('ascii'))])
+            return
+
+        settings, conversation_id, history = await asyncio.to_thread(load_context, user_id, agent_type, message, conversation_id)
+
+        response = await async_ai.aget_response(message, agent_type, settings, history)
+
+        conversation_id = await asyncio.to_thread(store_conversation, user_id, agent_type, message, response, conversation_id)
+
+        await send_json(send, 200, dict(response, conversation_id=conversation_id))
+
+    except Exception as e:
+        logger.error(f"Erreur API chat (async): {e}")
+        await send_json(send, 500, {'error': 'Erreur interne'})
+
+
+def is_async_job_request(scope):
+    # /api/chat?async=1 : mise en file gérée par Flask
+    return parse_qs(scope.get('query_string', b'').decode('latin-1')).get('async') == ['1']
+
+
+async def lifespan(receive, send):
+    while True:
+        event = await receive()
+        if event['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif event['type'] == 'lifespan.shutdown':
+            await async_ai.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif (scope['type'] == 'http' and scope['path'] == '/api/chat' and scope['method'] == 'POST'
+          and not is_async_job_request(scope)):
+        await chat_endpoint(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
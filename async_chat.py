@@ -0,0 +1,232 @@
+# WaveAI - Chemin chat asynchrone (asyncio)
+# Appels providers non bloquants avec limite de concurrence par provider
+
+import os
+import time
+import asyncio
+import logging
+
+import httpx
+
+from http_pool import LRUClientCache, api_key_fingerprint, CLIENT_CACHE_SIZE, ANTHROPIC_BASE_URL
+from circuit_breaker import breakers
+from single_flight import AsyncSingleFlight
+from metrics import CHAT_STAGE_SECONDS, observe_provider_call
+
+logger = logging.getLogger(__name__)
+
+
+def provider_limit(provider):
+    """Appels simultanés autorisés pour un provider (WAVEAI_ASYNC_LIMIT_<PROVIDER>)"""
+    default = int(os.environ.get('WAVEAI_ASYNC_PROVIDER_LIMIT', 64))
+    return max(1, int(os.environ.get(f'WAVEAI_ASYNC_LIMIT_{provider.upper()}', default)))
+
+
+class AsyncWaveAISystem:
+    """Version asyncio de WaveAISystem.get_response : mêmes agents, ordre, cache et fallback"""
+
+    def __init__(self, ai_system):
+        self.ai = ai_system
+        self.providers = {
+            'openai': self.aget_openai_response,
+            'anthropic': self.aget_anthropic_response,
+            'huggingface': self.aget_huggingface_response
+        }
+        self.semaphores = {name: asyncio.Semaphore(provider_limit(name)) for name in self.providers}
+        self.single_flight = AsyncSingleFlight()
+        self.clients = LRUClientCache(CLIENT_CACHE_SIZE)
+        self._http = None
+        self._aiohttp = None
+
+    # Clients partagés (créés dans la boucle d'événements)
+    def get_http_client(self):
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=30,
+                limits=httpx.Limits(max_connections=provider_limit('huggingface'), max_keepalive_connections=20)
+            )
+        return self._http
+
+    def get_aiohttp_session(self):
+        import aiohttp
+        if self._aiohttp is None or self._aiohttp.closed:
+            self._aiohttp = aiohttp.ClientSession()
+        return self._aiohttp
+
+    def get_anthropic_client(self, api_key):
+        import anthropic
+        key = ('anthropic-async', api_key_fingerprint(api_key))
+        return self.clients.get_or_create(key, lambda: anthropic.AsyncAnthropic(api_key=api_key, base_url=ANTHROPIC_BASE_URL))
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+        if self._aiohttp is not None:
+            await self._aiohttp.close()
+
+    # Providers
+    async def aget_openai_response(self, message, agent_type, settings, history=None):
+        try:
+            if not settings or not settings.openai_api_key:
+                return None
+
+            import openai
+            # Session aiohttp partagée : connexions keep-alive entre requêtes
+            openai.aiosession.set(self.get_aiohttp_session())
+            params = self.ai.generation_params(settings)
+            messages = await asyncio.to_thread(self.ai.build_chat_messages, message, agent_type, history)
+
+            response = await openai.ChatCompletion.acreate(
+                api_key=settings.openai_api_key,
+                model="gpt-3.5-turbo",
+                messages=messages,
+                max_tokens=params['max_tokens'],
+                temperature=params['temperature'],
+                request_timeout=self.ai.provider_timeout('openai', 60)
+            )
+            return self.ai.make_response(response.choices[0].message.content.strip(), 'openai', agent_type,
+                                         usage=response.get('usage'))
+        except Exception as e:
+            logger.error(f"Erreur OpenAI (async): {e}")
+            return None
+
+    async def aget_anthropic_response(self, message, agent_type, settings, history=None):
+        try:
+            if not settings or not settings.anthropic_api_key:
+                return None
+
+            client = self.get_anthropic_client(settings.anthropic_api_key)
+            params = self.ai.generation_params(settings)
+            prompt = await asyncio.to_thread(self.ai.build_anthropic_prompt, message, agent_type, history)
+
+            response = await client.completions.create(
+                model="claude-instant-1.2",
+                max_tokens_to_sample=params['max_tokens'],
+                temperature=params['temperature'],
+                prompt=prompt,
+                timeout=self.ai.provider_timeout('anthropic', 60)
+            )
+            return self.ai.make_response(response.completion.strip(), 'anthropic', agent_type)
+        except Exception as e:
+            logger.error(f"Erreur Anthropic (async): {e}")
+            return None
+
+    async def aget_huggingface_response(self, message, agent_type, settings=None, history=None):
+        try:
+            headers, payload = self.ai.build_huggingface_request(message, settings)
+            response = await self.get_http_client().post(self.ai.hf_url, headers=headers, json=payload,
+                                                         timeout=self.ai.provider_timeout('huggingface', 30))
+
+            if response.status_code == 200:
+                text = self.ai.parse_huggingface_result(response.json(), message)
+                if text:
+                    return self.ai.make_response(text, 'huggingface', agent_type)
+        except Exception as e:
+            logger.error(f"Erreur Hugging Face (async): {e}")
+        return None
+
+    async def acall_provider(self, name, message, agent_type, settings, history=None):
+        """Appel borné par le sémaphore et le disjoncteur du provider, mesuré dans le registre de santé"""
+        breaker = self.ai.breaker_name(name, settings)
+        if not self.ai.provider_budget_ok(name) or not breakers.allow(breaker):
+            return None
+        async with self.semaphores[name]:
+            started = time.monotonic()
+            # Une annulation (perdant d'une course) n'est comptée ni comme succès ni comme échec
+            response = await self.providers[name](message, agent_type, settings, history)
+            ok = bool(response and response.get('response'))
+            elapsed = time.monotonic() - started
+            breakers.record(breaker, ok, self.ai.provider_health_key(name), elapsed)
+            observe_provider_call(name, elapsed, ok)
+            if ok:
+                # Estimation des tokens : relit le prompt système (base de connaissances)
+                await asyncio.to_thread(self.ai.record_usage, name, message, agent_type, history, response)
+            return response
+
+    async def arace_providers(self, candidates, message, agent_type, settings, history=None):
+        tasks = {
+            asyncio.ensure_future(self.acall_provider(name, message, agent_type, settings, history)): name
+            for name in candidates[:self.ai.race_width]
+        }
+        pending = set(tasks)
+        deadline = time.monotonic() + self.ai.race_timeout
+        winner = None
+
+        try:
+            while pending and not winner:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result() and task.result().get('response'):
+                        winner = (tasks[task], task.result())
+                        break
+        finally:
+            # En asyncio les perdants sont réellement annulés
+            for task in pending:
+                task.cancel()
+
+        if winner:
+            self.ai.record_win(winner[0])
+            return winner[1]
+
+        for name in candidates[self.ai.race_width:]:
+            response = await self.acall_provider(name, message, agent_type, settings, history)
+            if response and response.get('response'):
+                self.ai.record_win(name)
+                return response
+        return None
+
+    async def aget_provider_response(self, message, agent_type, settings, history=None):
+        candidates = self.ai.get_provider_order(settings)
+        response = (await self.atry_providers(candidates, message, agent_type, settings, history)
+                    or self.ai.get_fallback_response(agent_type))
+        self.ai.record_fallback_depth(candidates, response)
+        return response
+
+    async def atry_providers(self, candidates, message, agent_type, settings, history=None):
+        if self.ai.race_mode and len(candidates) > 1:
+            return await self.arace_providers(candidates, message, agent_type, settings, history)
+
+        for name in candidates:
+            response = await self.acall_provider(name, message, agent_type, settings, history)
+            if response and response.get('response'):
+                self.ai.record_win(name)
+                return response
+        return None
+
+    def lookup_caches(self, message, agent_type, user_settings, history=None):
+        with CHAT_STAGE_SECONDS.time(stage='cache'):
+            cache_args = self.ai.get_cache_args(message, agent_type, user_settings, history)
+            cached = self.ai.get_cached_response(cache_args)
+            semantic_args = None
+            if not cached:
+                semantic_args = self.ai.get_semantic_args(message, agent_type, user_settings, history)
+                cached = self.ai.get_semantic_response(semantic_args)
+        return cache_args, semantic_args, cached
+
+    def store_caches(self, cache_args, semantic_args, response):
+        self.ai.store_cached_response(cache_args, response)
+        self.ai.store_semantic_response(semantic_args, response)
+
+    async def aget_response(self, message, agent_type='kai', user_settings=None, history=None):
+        if not message or not message.strip():
+            return self.ai.get_response(message, agent_type, user_settings)
+
+        # Caches SQLite / Redis : lus et écrits hors de la boucle d'événements
+        cache_args, semantic_args, cached = await asyncio.to_thread(
+            self.lookup_caches, message, agent_type, user_settings, history)
+        if cached:
+            return cached
+
+        async def fetch():
+            with CHAT_STAGE_SECONDS.time(stage='provider'):
+                result = await self.aget_provider_response(message, agent_type, user_settings, history)
+            await asyncio.to_thread(self.store_caches, cache_args, semantic_args, result)
+            return result
+
+        if not self.ai.coalesce:
+            return await fetch()
+        key = self.ai.coalesce_key(message, agent_type, user_settings, history)
+        return dict(await self.single_flight.do(key, fetch))
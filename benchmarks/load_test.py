@@ -0,0 +1,293 @@
+# WaveAI - Test de charge du chemin login / dashboard / chat
+# Lance les providers simulés, pilote multi_user_app en concurrence et écrit un rapport JSON
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_providers import start_mock_server, add_mock_arguments, config_from_args  # noqa: E402
+from provider_health import percentile  # noqa: E402
+
+QUESTIONS = [
+    "Comment organiser ma boîte mail ?",
+    "Peux-tu m'aider à planifier ma semaine ?",
+    "Donne-moi des idées de posts LinkedIn",
+    "Comment automatiser mes relances clients ?",
+    "Quels outils pour gérer mes tâches ?",
+    "Comment rédiger une newsletter efficace ?"
+]
+AGENTS = ['kai', 'alex', 'lina', 'marco', 'sofia']
+
+
+class Recorder:
+    """Latences et statuts par endpoint, requêtes SQL attribuées à l'endpoint Flask courant"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.queries = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, status, expected):
+        with self._lock:
+            self.latencies[endpoint].append(seconds * 1000)
+            self.statuses[endpoint][str(status)] += 1
+            if status != expected:
+                self.errors[endpoint] += 1
+
+    def count_query(self, endpoint):
+        with self._lock:
+            self.queries[endpoint] += 1
+
+
+class VirtualUser:
+    def __init__(self, base_url, index, args, recorder):
+        self.base_url = base_url
+        self.index = index
+        self.args = args
+        self.recorder = recorder
+        self.http = requests.Session()
+        self.email = f"bench{index}@waveai.test"
+
+    def call(self, endpoint, method, path, expected=200, measured=True, **kwargs):
+        started = time.perf_counter()
+        status = None
+        try:
+            response = self.http.request(method, self.base_url + path, allow_redirects=False,
+                                         timeout=self.args.timeout, **kwargs)
+            status = response.status_code
+            # Flux SSE : mesuré jusqu'au dernier octet
+            for _ in response.iter_content(chunk_size=None):
+                pass
+        except requests.RequestException:
+            pass
+        if measured:
+            # Un dashboard redirigé vers /login est un échec, pas une réponse rapide
+            self.recorder.record(endpoint, time.perf_counter() - started, status, expected)
+        return status
+
+    def setup(self):
+        """Connexion puis réglages IA du provider testé (non mesuré)"""
+        self.call('login', 'POST', '/login', measured=False, data={'email': self.email})
+        form = {
+            'default_model': self.args.provider,
+            'temperature': '0.2',
+            'max_tokens': '500',
+            'use_ollama': 'on'
+        }
+        if self.args.provider == 'openai':
+            form['openai_key'] = f"sk-bench-{self.index}"
+        elif self.args.provider == 'anthropic':
+            form['anthropic_key'] = f"sk-ant-bench-{self.index}"
+        if self.args.response_cache:
+            form['response_cache_enabled'] = 'on'
+        self.call('ai_settings', 'POST', '/ai-settings', measured=False, data=form)
+
+    def message(self, number):
+        question = QUESTIONS[(self.index + number) % len(QUESTIONS)]
+        return f"{question} (#{self.index}-{number})" if self.args.unique_messages else question
+
+    def run(self, chats):
+        self.call('login', 'POST', '/login', expected=302, data={'email': self.email})
+        self.call('dashboard', 'GET', '/dashboard')
+        for number in range(chats):
+            payload = {'message': self.message(number), 'agent': AGENTS[(self.index + number) % len(AGENTS)]}
+            if self.args.stream:
+                self.call('chat_stream', 'POST', '/api/chat/stream', json=payload)
+            else:
+                self.call('chat', 'POST', '/api/chat', json=payload)
+            if self.args.dashboard_every and (number + 1) % self.args.dashboard_every == 0:
+                self.call('dashboard', 'GET', '/dashboard')
+
+
+def start_app(args, mock_server, recorder):
+    """multi_user_app dans ce processus : serveur WSGI multi-thread et compteur de requêtes SQL"""
+    os.environ.update(mock_server.provider_env())
+    # Jamais la DATABASE_URL de l'environnement : une base de production ne doit pas recevoir les comptes de test
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='waveai-bench-')}/bench.db"
+    os.environ.setdefault('SECRET_KEY', 'waveai-benchmark')
+    # Tous les utilisateurs virtuels partagent 127.0.0.1 : limites et quotas coupés sauf demande explicite
+    for name in ('WAVEAI_RATE_USER', 'WAVEAI_RATE_IP', 'WAVEAI_DAILY_REQUESTS', 'WAVEAI_DAILY_TOKENS'):
+        os.environ.setdefault(name, '0')
+
+    from flask import has_request_context, request
+    from sqlalchemy import event
+    from werkzeug.serving import make_server
+    import multi_user_app
+
+    with multi_user_app.app.app_context():
+        engine = multi_user_app.db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        recorder.count_query(request.endpoint if has_request_context() else '_background')
+
+    server = make_server('127.0.0.1', 0, multi_user_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True, name='waveai-bench-app').start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        'min': round(min(values), 2),
+        'mean': round(sum(values) / len(values), 2),
+        'p50': round(percentile(values, 50), 2),
+        'p95': round(percentile(values, 95), 2),
+        'p99': round(percentile(values, 99), 2),
+        'max': round(max(values), 2)
+    }
+
+
+# Endpoint Flask correspondant à chaque étape mesurée (attribution des requêtes SQL)
+FLASK_ENDPOINTS = {'login': 'login', 'dashboard': 'dashboard', 'chat': 'api_chat', 'chat_stream': 'api_chat_stream'}
+
+
+def build_report(args, recorder, duration, mock_server, in_process):
+    endpoints = {}
+    total_requests = 0
+    total_errors = 0
+    for endpoint, values in sorted(recorder.latencies.items()):
+        count = len(values)
+        total_requests += count
+        total_errors += recorder.errors[endpoint]
+        queries = recorder.queries.get(FLASK_ENDPOINTS.get(endpoint, endpoint), 0) if in_process else None
+        endpoints[endpoint] = {
+            'requests': count,
+            'errors': recorder.errors[endpoint],
+            'error_rate': round(recorder.errors[endpoint] / count, 4) if count else 0.0,
+            'status': dict(recorder.statuses[endpoint]),
+            'rps': round(count / duration, 2) if duration else None,
+            'latency_ms': summarize(values),
+            'db_queries': {'total': queries, 'per_request': round(queries / count, 2) if count else None} if in_process else None
+        }
+    return {
+        'generated_at': datetime.utcnow().isoformat(),
+        'config': {
+            'target': args.target or 'in-process',
+            'provider': args.provider,
+            'users': args.users,
+            'concurrency': args.concurrency,
+            'chats_per_user': args.chats,
+            'stream': args.stream,
+            'unique_messages': args.unique_messages,
+            'response_cache': args.response_cache,
+            'mock': {'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms,
+                     'error_rate': args.error_rate, 'stream_chunks': args.stream_chunks}
+        },
+        'duration_s': round(duration, 3),
+        'total': {
+            'requests': total_requests,
+            'errors': total_errors,
+            'error_rate': round(total_errors / total_requests, 4) if total_requests else 0.0,
+            'rps': round(total_requests / duration, 2) if duration else None
+        },
+        'endpoints': endpoints,
+        'db_queries_background': recorder.queries.get('_background', 0) if in_process else None,
+        'provider_calls': mock_server.stats() if mock_server else None
+    }
+
+
+def check_thresholds(args, report):
+    """Seuils de non-régression : liste des dépassements (vide si tout passe)"""
+    failures = []
+    chat = report['endpoints'].get('chat_stream' if args.stream else 'chat')
+    if args.max_p95_ms is not None and chat and chat['latency_ms']['p95'] > args.max_p95_ms:
+        failures.append(f"p95 chat {chat['latency_ms']['p95']} ms > {args.max_p95_ms} ms")
+    if args.max_error_rate is not None and report['total']['error_rate'] > args.max_error_rate:
+        failures.append(f"taux d'erreur {report['total']['error_rate']} > {args.max_error_rate}")
+    if args.max_queries_per_chat is not None and chat and chat['db_queries']:
+        per_request = chat['db_queries']['per_request']
+        if per_request is not None and per_request > args.max_queries_per_chat:
+            failures.append(f"requêtes SQL par chat {per_request} > {args.max_queries_per_chat}")
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Test de charge WaveAI (login, dashboard, /api/chat)')
+    parser.add_argument('--target', help="URL d'une instance déjà lancée (sinon multi_user_app dans ce processus)")
+    parser.add_argument('--database-url', help='base du mode local (défaut : SQLite temporaire)')
+    parser.add_argument('--no-mock', action='store_true', help='ne pas démarrer les providers simulés (mode --target)')
+    parser.add_argument('--mock-port', type=int, default=0, help='port des providers simulés (0 = libre)')
+    parser.add_argument('--provider', choices=['openai', 'anthropic', 'huggingface'], default='openai')
+    parser.add_argument('--users', type=int, default=20, help='utilisateurs virtuels')
+    parser.add_argument('--concurrency', type=int, default=10, help='utilisateurs actifs simultanément')
+    parser.add_argument('--chats', type=int, default=10, help='messages /api/chat par utilisateur')
+    parser.add_argument('--dashboard-every', type=int, default=0, help='recharge le dashboard tous les N messages')
+    parser.add_argument('--stream', action='store_true', help='utilise /api/chat/stream')
+    parser.add_argument('--unique-messages', action='store_true', help='messages tous différents (caches contournés)')
+    parser.add_argument('--response-cache', action='store_true', help='active le cache de réponses des utilisateurs')
+    parser.add_argument('--timeout', type=float, default=120, help='timeout HTTP client (secondes)')
+    parser.add_argument('--output', default='benchmark_report.json', help="rapport JSON ('-' = sortie standard)")
+    parser.add_argument('--max-p95-ms', type=float, help='échec si le p95 du chat dépasse ce seuil')
+    parser.add_argument('--max-error-rate', type=float, help="échec si le taux d'erreur dépasse ce seuil")
+    parser.add_argument('--max-queries-per-chat', type=float, help='échec si un chat fait plus de N requêtes SQL')
+    add_mock_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    recorder = Recorder()
+
+    mock_server = None if args.no_mock else start_mock_server(port=args.mock_port, config=config_from_args(args))
+    in_process = not args.target
+    if in_process:
+        app_server, base_url = start_app(args, mock_server, recorder)
+    else:
+        app_server, base_url = None, args.target.rstrip('/')
+        if mock_server:
+            print(f"🧪 Providers simulés sur {mock_server.url} (à configurer sur l'instance cible) :", file=sys.stderr)
+            for name, value in mock_server.provider_env().items():
+                print(f"   {name}={value}", file=sys.stderr)
+
+    users = [VirtualUser(base_url, index, args, recorder) for index in range(args.users)]
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        list(executor.map(VirtualUser.setup, users))
+        # Seule la phase de charge compte dans les statistiques SQL
+        recorder.queries.clear()
+        started = time.perf_counter()
+        list(executor.map(lambda user: user.run(args.chats), users))
+        duration = time.perf_counter() - started
+
+    report = build_report(args, recorder, duration, mock_server, in_process)
+    failures = check_thresholds(args, report)
+    report['thresholds'] = {'passed': not failures, 'failures': failures}
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(output + '\n')
+        chat = report['endpoints'].get('chat_stream' if args.stream else 'chat') or {}
+        latency = chat.get('latency_ms') or {}
+        print(f"📊 {report['total']['requests']} requêtes en {report['duration_s']} s "
+              f"({report['total']['rps']} req/s), chat p50 {latency.get('p50')} ms / p95 {latency.get('p95')} ms "
+              f"/ p99 {latency.get('p99')} ms -> {args.output}")
+
+    if app_server:
+        app_server.shutdown()
+    if mock_server:
+        mock_server.shutdown()
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
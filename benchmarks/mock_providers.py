@@ -0,0 +1,236 @@
+# WaveAI - Serveur simulé des providers IA pour les benchmarks
+# Imite OpenAI, Anthropic, Hugging Face Inference et Ollama : latence, taux d'erreur et streaming configurables
+
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockConfig:
+    def __init__(self, latency_ms=150, jitter_ms=50, error_rate=0.0, stream_chunks=8, chunk_delay_ms=20, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.stream_chunks = max(1, stream_chunks)
+        self.chunk_delay_ms = chunk_delay_ms
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            jitter = self.random.uniform(0, self.jitter_ms)
+        time.sleep((self.latency_ms + jitter) / 1000)
+
+    def should_fail(self):
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+
+def mock_reply(provider, prompt):
+    """Réponse déterministe : même question, même texte (les caches restent mesurables)"""
+    words = (prompt or '').split()[-6:]
+    return f"Réponse simulée {provider} : voici trois conseils concrets sur « {' '.join(words)} » 🌊"
+
+
+def split_chunks(text, count):
+    words = text.split(' ')
+    size = max(1, -(-len(words) // count))
+    return [' '.join(words[i:i + size]) + (' ' if i + size < len(words) else '') for i in range(0, len(words), size)]
+
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'WaveAIMock/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    # Routage
+
+    def do_GET(self):
+        if self.path == '/__stats':
+            return self.send_json(200, self.server.stats())
+        if self.path == '/v1/models':
+            return self.send_json(200, {'object': 'list', 'data': [{'id': 'gpt-3.5-turbo', 'object': 'model'}]})
+        if self.path == '/api/tags':
+            return self.send_json(200, {'models': [{'name': 'llama2'}]})
+        if self.path.startswith('/models/'):
+            return self.send_json(200, {'loaded': True})
+        self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self.send_json(400, {'error': 'invalid json'})
+
+        routes = {
+            '/v1/chat/completions': ('openai', self.openai),
+            '/v1/complete': ('anthropic', self.anthropic),
+            '/api/generate': ('ollama', self.ollama)
+        }
+        provider, handler = routes.get(self.path, ('huggingface', self.huggingface) if self.path.startswith('/models/') else (None, None))
+        if handler is None:
+            return self.send_json(404, {'error': 'not found'})
+
+        config = self.server.config
+        config.delay()
+        if config.should_fail():
+            self.server.record(provider, error=True)
+            return self.send_json(500, {'error': {'message': 'mock provider error', 'type': 'server_error'}})
+        self.server.record(provider)
+        handler(body)
+
+    # Providers
+
+    def openai(self, body):
+        prompt = (body.get('messages') or [{}])[-1].get('content', '')
+        text = mock_reply('openai', prompt)
+        if body.get('stream'):
+            events = [{'id': 'mock', 'object': 'chat.completion.chunk', 'model': body.get('model'),
+                       'choices': [{'index': 0, 'delta': {'content': chunk}, 'finish_reason': None}]}
+                      for chunk in split_chunks(text, self.server.config.stream_chunks)]
+            return self.send_sse([(None, event) for event in events], done='[DONE]')
+        self.send_json(200, {
+            'id': 'mock', 'object': 'chat.completion', 'created': int(time.time()), 'model': body.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(text) // 4,
+                      'total_tokens': (len(prompt) + len(text)) // 4}
+        })
+
+    def anthropic(self, body):
+        prompt = body.get('prompt', '').rsplit('Human:', 1)[-1].split('Assistant:')[0]
+        text = mock_reply('anthropic', prompt)
+        model = body.get('model', 'claude-instant-1.2')
+        if body.get('stream'):
+            chunks = split_chunks(text, self.server.config.stream_chunks)
+            return self.send_sse([('completion', {'completion': chunk, 'stop_reason': None, 'model': model})
+                                  for chunk in chunks])
+        self.send_json(200, {'completion': text, 'stop_reason': 'stop_sequence', 'model': model})
+
+    def huggingface(self, body):
+        prompt = body.get('inputs', '')
+        self.send_json(200, [{'generated_text': f"{prompt} {mock_reply('huggingface', prompt)}"}])
+
+    def ollama(self, body):
+        text = mock_reply('ollama', body.get('prompt', ''))
+        if body.get('stream', True):
+            lines = [{'model': body.get('model'), 'response': chunk, 'done': False}
+                     for chunk in split_chunks(text, self.server.config.stream_chunks)]
+            lines.append({'model': body.get('model'), 'response': '', 'done': True})
+            return self.send_stream('application/x-ndjson', (json.dumps(line) + '\n' for line in lines))
+        self.send_json(200, {'model': body.get('model'), 'response': text, 'done': True})
+
+    # Réponses
+
+    def send_json(self, status, data):
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_sse(self, events, done=None):
+        def lines():
+            for event, data in events:
+                yield (f"event: {event}\n" if event else '') + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+            if done:
+                yield f"data: {done}\n\n"
+        self.send_stream('text/event-stream', lines())
+
+    def send_stream(self, content_type, parts):
+        # Découpage HTTP/1.1 « chunked » : la connexion keep-alive reste utilisable
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        delay = self.server.config.chunk_delay_ms / 1000
+        for part in parts:
+            data = part.encode('utf-8')
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+            if delay:
+                time.sleep(delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class MockProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config=None):
+        super().__init__(address, MockProviderHandler)
+        self.config = config or MockConfig()
+        self.calls = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, provider, error=False):
+        with self._lock:
+            self.calls[provider] += 1
+            if error:
+                self.errors[provider] += 1
+
+    def stats(self):
+        with self._lock:
+            return {provider: {'calls': self.calls[provider], 'errors': self.errors[provider]} for provider in sorted(self.calls)}
+
+    def provider_env(self):
+        """Variables d'environnement qui redirigent WaveAI vers ce serveur"""
+        return {
+            'OPENAI_API_BASE': f"{self.url}/v1",
+            'ANTHROPIC_BASE_URL': self.url,
+            'HUGGINGFACE_API_URL': f"{self.url}/models/microsoft/DialoGPT-medium",
+            'OLLAMA_URL': self.url
+        }
+
+
+def start_mock_server(host='127.0.0.1', port=0, config=None):
+    """Démarre le serveur dans un thread ; port 0 = port libre choisi par le système"""
+    server = MockProviderServer((host, port), config)
+    threading.Thread(target=server.serve_forever, daemon=True, name='waveai-mock-providers').start()
+    return server
+
+
+def add_mock_arguments(parser):
+    parser.add_argument('--latency-ms', type=float, default=150, help='latence de base par appel provider')
+    parser.add_argument('--jitter-ms', type=float, default=50, help='latence aléatoire ajoutée (0 à N ms)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='part des appels en erreur 500 (0 à 1)')
+    parser.add_argument('--stream-chunks', type=int, default=8, help='morceaux par réponse en streaming')
+    parser.add_argument('--chunk-delay-ms', type=float, default=20, help='délai entre deux morceaux streamés')
+    parser.add_argument('--seed', type=int, default=None, help='graine aléatoire (runs reproductibles)')
+
+
+def config_from_args(args):
+    return MockConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.stream_chunks, args.chunk_delay_ms, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serveur simulé OpenAI / Anthropic / Hugging Face / Ollama')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockProviderServer((args.host, args.port), config_from_args(args))
+    print(f"🧪 Providers simulés sur {server.url}")
+    for name, value in server.provider_env().items():
+        print(f"export {name}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
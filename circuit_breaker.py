@@ -0,0 +1,137 @@
+# WaveAI - Disjoncteurs par endpoint provider
+# États fermé / ouvert / semi-ouvert et timeouts adaptés au p95 observé
+
+import os
+import time
+import threading
+
+from provider_health import health_registry
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+FAILURE_THRESHOLD = int(os.environ.get('WAVEAI_BREAKER_FAILURES', 3))
+RECOVERY_TIME = float(os.environ.get('WAVEAI_BREAKER_RECOVERY', 30))
+HALF_OPEN_CALLS = int(os.environ.get('WAVEAI_BREAKER_HALF_OPEN_CALLS', 1))
+TIMEOUT_MULTIPLIER = float(os.environ.get('WAVEAI_TIMEOUT_MULTIPLIER', 2.0))
+TIMEOUT_MIN = float(os.environ.get('WAVEAI_TIMEOUT_MIN', 2.0))
+TIMEOUT_MIN_SAMPLES = int(os.environ.get('WAVEAI_TIMEOUT_MIN_SAMPLES', 10))
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, recovery_time=RECOVERY_TIME,
+                 half_open_calls=HALF_OPEN_CALLS):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_time = recovery_time
+        self.half_open_calls = max(1, half_open_calls)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trials = 0
+        self.trial_started_at = None
+        self.changed_at = time.time()
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        if self.state != state:
+            self.state = state
+            self.changed_at = time.time()
+
+    def allow(self):
+        """Autorise un appel ; en semi-ouvert, seul un nombre limité d'appels d'essai passe"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if now - self.opened_at < self.recovery_time:
+                    return False
+                self._set_state(HALF_OPEN)
+                self.trials = 0
+            # Un essai jamais conclu (appel annulé) libère sa place après recovery_time
+            if self.trials >= self.half_open_calls and now - self.trial_started_at >= self.recovery_time:
+                self.trials = 0
+            if self.trials < self.half_open_calls:
+                self.trials += 1
+                self.trial_started_at = now
+                return True
+            return False
+
+    def is_open(self):
+        """Lecture sans effet de bord : vrai tant que l'endpoint doit être ignoré"""
+        return self.state == OPEN and time.monotonic() - self.opened_at < self.recovery_time
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                self.failures = 0
+                self._set_state(CLOSED)
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def to_dict(self):
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = round(max(0.0, self.recovery_time - (time.monotonic() - self.opened_at)), 1)
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'changed_at': self.changed_at,
+            'retry_in': retry_in
+        }
+
+
+class CircuitBreakerRegistry:
+    def __init__(self):
+        self.breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self.breakers.setdefault(name, CircuitBreaker(name))
+        return breaker
+
+    def allow(self, name):
+        return self.get(name).allow()
+
+    def is_open(self, name):
+        breaker = self.breakers.get(name)
+        return breaker is not None and breaker.is_open()
+
+    def record(self, name, ok, health_name=None, latency=None, error=None):
+        """Résultat d'un appel : disjoncteur et registre de santé (health_name, défaut name)"""
+        self.get(name).record(ok)
+        health_registry.record(health_name or name, ok, latency, error=error)
+
+    def timeout(self, health_name, default):
+        """p95 des appels réels x multiplicateur, borné par [WAVEAI_TIMEOUT_MIN, default]"""
+        if health_registry.call_samples(health_name) < TIMEOUT_MIN_SAMPLES:
+            return default
+        p95 = health_registry.percentile(health_name, 95)
+        if p95 is None:
+            return default
+        adaptive = max(TIMEOUT_MIN, p95 * TIMEOUT_MULTIPLIER)
+        return round(adaptive if default is None else min(default, adaptive), 2)
+
+    def reset(self, name=None):
+        with self._lock:
+            if name is None:
+                self.breakers.clear()
+            else:
+                self.breakers.pop(name, None)
+
+    def snapshot(self):
+        with self._lock:
+            breakers = list(self.breakers.items())
+        return {name: breaker.to_dict() for name, breaker in breakers}
+
+
+# Instance globale partagée par les systèmes IA
+breakers = CircuitBreakerRegistry()
@@ -0,0 +1,88 @@
+# WaveAI - Fenêtre d'historique pour le contexte des agents
+# Estimation rapide des tokens et sélection des derniers échanges dans un budget
+
+import os
+import hashlib
+
+CONTEXT_TOKENS = int(os.environ.get('WAVEAI_CONTEXT_TOKENS', 4096))
+HISTORY_MAX_TOKENS = int(os.environ.get('WAVEAI_HISTORY_MAX_TOKENS', 1500))
+HISTORY_MAX_TURNS = int(os.environ.get('WAVEAI_HISTORY_MAX_TURNS', 20))
+SUMMARY_MAX_TOKENS = int(os.environ.get('WAVEAI_HISTORY_SUMMARY_TOKENS', 150))
+
+ROLE_LABELS = {'user': 'Utilisateur', 'assistant': 'Agent'}
+
+
+def estimate_tokens(text):
+    """Approximation rapide : ~4 caractères par token (pas de tokenizer à charger)"""
+    if not text:
+        return 0
+    return (len(text) + 3) // 4
+
+
+def history_budget(max_tokens, *fixed_texts):
+    """Tokens disponibles pour l'historique : fenêtre du modèle moins réponse attendue et prompt fixe"""
+    reserved = min(max_tokens or 1000, 1500) + sum(estimate_tokens(text) for text in fixed_texts)
+    return max(0, min(HISTORY_MAX_TOKENS, CONTEXT_TOKENS - reserved))
+
+
+class HistoryWindow:
+    def __init__(self, turns=None, summary=None):
+        self.turns = turns or []
+        self.summary = summary
+
+    def __bool__(self):
+        return bool(self.turns or self.summary)
+
+    def fingerprint(self):
+        """Identifiant stable du contexte (clé de cache)"""
+        parts = [self.summary or ''] + [f"{role}:{content}" for role, content in self.turns]
+        return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def to_text(self):
+        lines = []
+        if self.summary:
+            lines.append(self.summary)
+        if self.turns:
+            lines.append("HISTORIQUE RÉCENT:")
+            lines.extend(f"{ROLE_LABELS.get(role, role)}: {content}" for role, content in self.turns)
+        return '\n'.join(lines)
+
+
+def summarize_turns(turns, budget):
+    """Résumé compact des échanges écartés : début des questions de l'utilisateur"""
+    if budget <= 0:
+        return None
+    topics = []
+    used = estimate_tokens("Résumé des échanges précédents : ")
+    for role, content in turns:
+        if role != 'user':
+            continue
+        topic = ' '.join(content.split())[:80]
+        cost = estimate_tokens(topic) + 1
+        if used + cost > budget:
+            break
+        topics.append(topic)
+        used += cost
+    if not topics:
+        return None
+    return "Résumé des échanges précédents : " + ' ; '.join(topics)
+
+
+def build_history_window(turns, budget):
+    """Garde les échanges les plus récents qui tiennent dans le budget, résume les plus anciens"""
+    turns = [(role, content) for role, content in turns if content][-HISTORY_MAX_TURNS:]
+    kept = []
+    used = 0
+    for role, content in reversed(turns):
+        cost = estimate_tokens(content) + 4
+        if used + cost > budget:
+            break
+        kept.append((role, content))
+        used += cost
+    kept.reverse()
+
+    dropped = turns[:len(turns) - len(kept)]
+    summary = None
+    if dropped:
+        summary = summarize_turns(dropped, min(SUMMARY_MAX_TOKENS, budget - used))
+    return HistoryWindow(kept, summary)
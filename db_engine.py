@@ -0,0 +1,131 @@
+# WaveAI - Configuration du moteur SQLAlchemy et télémétrie du pool de connexions
+# Taille, débordement, pré-ping et recyclage réglables ; mode PgBouncer (NullPool) ; métriques d'attente
+
+import os
+import time
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, NullPool
+
+from metrics import metrics, METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.environ.get('WAVEAI_DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.environ.get('WAVEAI_DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('WAVEAI_DB_POOL_TIMEOUT', 10))
+# Render et la plupart des hébergeurs coupent les connexions inactives : recyclées avant
+DB_POOL_RECYCLE = int(os.environ.get('WAVEAI_DB_POOL_RECYCLE', 1800))
+DB_PRE_PING = os.environ.get('WAVEAI_DB_PRE_PING', 'true').lower() == 'true'
+DB_CONNECT_TIMEOUT = int(os.environ.get('WAVEAI_DB_CONNECT_TIMEOUT', 10))
+# PgBouncer en mode transaction : c'est lui qui mutualise, pas de pool côté app
+PGBOUNCER = os.environ.get('WAVEAI_DB_PGBOUNCER', 'false').lower() == 'true'
+
+POOL_CHECKOUT_SECONDS = metrics.histogram('waveai_db_pool_checkout_seconds',
+                                          "Temps pour obtenir une connexion (attente du pool, pré-ping, ouverture)")
+POOL_HELD_SECONDS = metrics.histogram('waveai_db_connection_held_seconds', 'Durée de détention des connexions empruntées')
+POOL_TIMEOUTS = metrics.counter('waveai_db_pool_timeouts_total', 'Attentes de connexion abandonnées (pool épuisé)')
+POOL_EVENTS = metrics.counter('waveai_db_pool_events_total', 'Connexions ouvertes et invalidées (coupées, pré-ping en échec)',
+                              ['event'])
+
+
+class TimedPoolMixin:
+    """Chronomètre l'obtention de chaque connexion, attente dans la file comprise"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            if METRICS_ENABLED:
+                POOL_TIMEOUTS.inc()
+            # Seul QueuePool attend une connexion libre (NullPool en ouvre toujours une)
+            logger.error(f"Pool de connexions épuisé après {self._timeout} s d'attente")
+            raise
+        finally:
+            if METRICS_ENABLED:
+                POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedNullPool(TimedPoolMixin, NullPool):
+    pass
+
+
+def is_memory_sqlite(url):
+    return url in ('sqlite://', 'sqlite:///:memory:') or ':memory:' in url or 'mode=memory' in url
+
+
+def engine_options(url):
+    """Options passées à create_engine (SQLALCHEMY_ENGINE_OPTIONS) selon la base et l'environnement"""
+    if url.startswith('sqlite'):
+        # Base en mémoire : une seule connexion partagée (pool par défaut de SQLAlchemy)
+        if is_memory_sqlite(url):
+            return {}
+        return {'poolclass': TimedQueuePool, 'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW,
+                'pool_timeout': DB_POOL_TIMEOUT}
+
+    options = {'connect_args': {}}
+    if url.startswith('postgresql'):
+        # psycopg2 (requirements.txt) n'utilise jamais d'instructions préparées côté serveur : rien à désactiver pour PgBouncer
+        options['connect_args'] = {'connect_timeout': DB_CONNECT_TIMEOUT, 'application_name': 'waveai'}
+
+    if PGBOUNCER:
+        options['poolclass'] = TimedNullPool
+        return options
+
+    options.update({
+        'poolclass': TimedQueuePool,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_PRE_PING
+    })
+    return options
+
+
+def install_pool_metrics(engine):
+    """Durée de détention des connexions et événements du pool (ouvertures, invalidations)"""
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        if METRICS_ENABLED:
+            POOL_EVENTS.inc(event='connect')
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checked_out_at'] = time.perf_counter()
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop('checked_out_at', None)
+        if started is not None and METRICS_ENABLED:
+            POOL_HELD_SECONDS.observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        if METRICS_ENABLED:
+            POOL_EVENTS.inc(event='invalidate')
+        if exception is not None:
+            logger.warning(f"Connexion base invalidée: {exception}")
+
+
+def pool_status(engine):
+    """État instantané du pool : connexions empruntées, libres et en débordement"""
+    pool = engine.pool
+    status = {'pool': type(pool).__name__, 'pgbouncer': PGBOUNCER}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(0, pool.overflow()),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout()
+        })
+    return status
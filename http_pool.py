@@ -0,0 +1,119 @@
+# WaveAI - Pool de connexions HTTP et clients SDK réutilisés
+# Sessions keep-alive par provider et cache LRU de clients par clé API
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+POOL_CONNECTIONS = int(os.environ.get('WAVEAI_HTTP_POOL_CONNECTIONS', 4))
+POOL_MAXSIZE = int(os.environ.get('WAVEAI_HTTP_POOL_MAXSIZE', 20))
+CLIENT_CACHE_SIZE = int(os.environ.get('WAVEAI_CLIENT_CACHE_SIZE', 128))
+# None : URL officielle du SDK ; OPENAI_API_BASE est lu directement par le SDK OpenAI
+ANTHROPIC_BASE_URL = os.environ.get('ANTHROPIC_BASE_URL') or None
+
+
+def api_key_fingerprint(api_key):
+    """Empreinte d'une clé API : la clé brute ne sert jamais de clé de cache"""
+    return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()
+
+
+class LRUClientCache:
+    """Cache LRU thread-safe de clients, avec éviction des moins récemment utilisés.
+
+    Un client évincé n'est pas fermé : une requête d'un autre thread peut encore s'en servir,
+    ses connexions sont libérées quand plus personne ne le référence.
+    """
+
+    def __init__(self, max_size=CLIENT_CACHE_SIZE):
+        self.max_size = max(1, max_size)
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_create(self, key, factory):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+
+        # Création hors verrou : un client SDK peut être lent à construire
+        client = factory()
+        with self._lock:
+            if key in self._items:
+                # Créé en parallèle par un autre thread : le sien est partagé, celui-ci abandonné
+                client = self._items[key]
+                self._items.move_to_end(key)
+            else:
+                self._items[key] = client
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last=False)
+                    self.evictions += 1
+        return client
+
+    def discard(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        return {
+            'size': len(self._items),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+sdk_clients = LRUClientCache(CLIENT_CACHE_SIZE)
+
+
+def get_session(provider):
+    """Session requests keep-alive partagée pour un provider"""
+    session = _sessions.get(provider)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        if provider not in _sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[provider] = session
+        return _sessions[provider]
+
+
+def get_anthropic_client(api_key):
+    """Client Anthropic mis en cache par clé API (pool httpx réutilisé)"""
+    import anthropic
+    key = ('anthropic', api_key_fingerprint(api_key))
+    return sdk_clients.get_or_create(key, lambda: anthropic.Anthropic(api_key=api_key, base_url=ANTHROPIC_BASE_URL))
+
+
+def configure_openai():
+    """Le SDK OpenAI (0.28) réutilise notre session keep-alive pour tous les threads"""
+    import openai
+    openai.requestssession = get_session('openai')
+
+
+def pool_stats():
+    return {
+        'sessions': sorted(_sessions),
+        'sdk_clients': sdk_clients.stats()
+    }
@@ -0,0 +1,321 @@
+# WaveAI - File de tâches pour les générations longues
+# Pool de workers local, file en mémoire ou table en base (reprise après redémarrage)
+
+import os
+import json
+import time
+import queue
+import secrets
+import logging
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get('WAVEAI_JOB_WORKERS', 4))
+JOB_POLL_INTERVAL = float(os.environ.get('WAVEAI_JOB_POLL_INTERVAL', 1.0))
+# Bail d'une tâche en cours, prolongé tant que le worker est vivant : une génération longue
+# (fallback séquentiel sur plusieurs providers) n'est jamais reprise par un autre worker
+JOB_LEASE_SECONDS = int(os.environ.get('WAVEAI_JOB_LEASE_SECONDS', 30))
+JOB_MAX_ATTEMPTS = int(os.environ.get('WAVEAI_JOB_MAX_ATTEMPTS', 3))
+JOB_RETENTION_SECONDS = int(os.environ.get('WAVEAI_JOB_RETENTION', 3600))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def new_job_id():
+    return secrets.token_urlsafe(16)
+
+
+class MemoryJobStore:
+    """File du processus : rapide, mais les tâches en cours sont perdues au redémarrage"""
+
+    def __init__(self, retention=JOB_RETENTION_SECONDS):
+        self.retention = retention
+        self.jobs = {}
+        self.pending = queue.Queue()
+        self._lock = threading.Lock()
+
+    def enqueue(self, user_id, payload):
+        job = {
+            'id': new_job_id(),
+            'user_id': user_id,
+            'status': QUEUED,
+            'payload': payload,
+            'result': None,
+            'error': None,
+            'attempts': 0,
+            'created_at': datetime.utcnow(),
+            'started_at': None,
+            'finished_at': None
+        }
+        with self._lock:
+            self._purge()
+            self.jobs[job['id']] = job
+        self.pending.put(job['id'])
+        return job['id']
+
+    def claim(self, timeout):
+        try:
+            job_id = self.pending.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job['status'] != QUEUED:
+                return None
+            job['status'] = RUNNING
+            job['started_at'] = datetime.utcnow()
+            job['attempts'] += 1
+            return job['id'], job['payload']
+
+    def finish(self, job_id, result=None, error=None):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job['status'] = FAILED if error else DONE
+            job['result'] = result
+            job['error'] = error
+            job['finished_at'] = datetime.utcnow()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def recover(self):
+        return 0
+
+    def renew(self):
+        return 0
+
+    def stats(self):
+        with self._lock:
+            statuses = [job['status'] for job in self.jobs.values()]
+        return {status: statuses.count(status) for status in (QUEUED, RUNNING, DONE, FAILED)}
+
+    def _purge(self):
+        limit = datetime.utcnow() - timedelta(seconds=self.retention)
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job['finished_at'] and job['finished_at'] < limit]:
+            del self.jobs[job_id]
+
+
+class DatabaseJobStore:
+    """File persistée dans une table : les tâches survivent au redémarrage d'un worker"""
+
+    def __init__(self, app, db, model, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.wakeup = threading.Event()
+        # Tâches réservées par ce processus : id -> jeton de réservation (locked_by)
+        self._leases = {}
+        self._leases_lock = threading.Lock()
+
+    def enqueue(self, user_id, payload):
+        with self.app.app_context():
+            job = self.model(id=new_job_id(), user_id=user_id, status=QUEUED, payload=json.dumps(payload), attempts=0)
+            self.db.session.add(job)
+            self.db.session.commit()
+            job_id = job.id
+        self.wakeup.set()
+        return job_id
+
+    def queued_query(self):
+        """Prochaines tâches en file, plus anciennes d'abord (index status, created_at)"""
+        return (self.db.session.query(self.model.id)
+                .filter_by(status=QUEUED)
+                .order_by(self.model.created_at)
+                .limit(5))
+
+    def claim(self, timeout):
+        with self.app.app_context():
+            candidates = self.queued_query().all()
+            for (job_id,) in candidates:
+                # Réservation atomique : un seul worker (ou processus) obtient la tâche
+                token = new_job_id()
+                now = datetime.utcnow()
+                claimed = (self.db.session.query(self.model)
+                           .filter_by(id=job_id, status=QUEUED)
+                           .update({'status': RUNNING, 'started_at': now, 'locked_by': token,
+                                    'lease_until': now + timedelta(seconds=self.lease_seconds),
+                                    'attempts': self.model.attempts + 1}, synchronize_session=False))
+                self.db.session.commit()
+                if claimed:
+                    with self._leases_lock:
+                        self._leases[job_id] = token
+                    return job_id, json.loads(self.db.session.get(self.model, job_id).payload)
+        self.wakeup.wait(timeout)
+        self.wakeup.clear()
+        return None
+
+    def finish(self, job_id, result=None, error=None):
+        with self._leases_lock:
+            token = self._leases.pop(job_id, None)
+        with self.app.app_context():
+            # Bail perdu (tâche reprise par un autre worker) : son résultat fait foi
+            finished = (self.db.session.query(self.model)
+                        .filter_by(id=job_id, locked_by=token)
+                        .update({'status': FAILED if error else DONE,
+                                 'result': json.dumps(result, ensure_ascii=False) if result is not None else None,
+                                 'error': error,
+                                 'finished_at': datetime.utcnow(),
+                                 'lease_until': None}, synchronize_session=False))
+            self.db.session.commit()
+        if not finished:
+            logger.warning(f"Tâche {job_id} reprise par un autre worker : résultat ignoré")
+
+    def renew(self):
+        """Prolonge le bail des tâches en cours dans ce processus (battement de cœur)"""
+        with self._leases_lock:
+            leases = dict(self._leases)
+        if not leases:
+            return 0
+        with self.app.app_context():
+            until = datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+            renewed = 0
+            for job_id, token in leases.items():
+                renewed += (self.db.session.query(self.model)
+                            .filter_by(id=job_id, locked_by=token, status=RUNNING)
+                            .update({'lease_until': until}, synchronize_session=False))
+            self.db.session.commit()
+        return renewed
+
+    def get(self, job_id):
+        with self.app.app_context():
+            job = self.db.session.get(self.model, job_id)
+            if job is None:
+                return None
+            return {
+                'id': job.id,
+                'user_id': job.user_id,
+                'status': job.status,
+                'result': json.loads(job.result) if job.result else None,
+                'error': job.error,
+                'attempts': job.attempts,
+                'created_at': job.created_at,
+                'started_at': job.started_at,
+                'finished_at': job.finished_at
+            }
+
+    def recover(self):
+        """Remet en file les tâches dont le bail a expiré (worker arrêté sans avoir fini)"""
+        with self.app.app_context():
+            now = datetime.utcnow()
+            expired = (self.db.session.query(self.model)
+                       .filter(self.model.status == RUNNING,
+                               self.db.or_(self.model.lease_until < now,
+                                           # Réservées avant l'arrivée des baux
+                                           self.db.and_(self.model.lease_until.is_(None),
+                                                        self.model.started_at < now - timedelta(seconds=self.lease_seconds)))))
+            requeued = 0
+            for job in expired:
+                job.locked_by = None
+                job.lease_until = None
+                if job.attempts >= self.max_attempts:
+                    job.status = FAILED
+                    job.error = 'Nombre maximal de tentatives atteint'
+                    job.finished_at = now
+                else:
+                    job.status = QUEUED
+                    requeued += 1
+            self.db.session.commit()
+            return requeued
+
+    def stats(self):
+        with self.app.app_context():
+            counts = dict(self.db.session.query(self.model.status, self.db.func.count(self.model.id))
+                          .group_by(self.model.status).all())
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)}
+
+
+class JobQueue:
+    """Pool de threads qui exécute handler(payload) pour chaque tâche de la file"""
+
+    def __init__(self, store, handler, workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL):
+        self.store = store
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._last_recover = 0
+
+    def enqueue(self, user_id, payload):
+        self.start()
+        return self.store.enqueue(user_id, payload)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._last_recover = time.monotonic()
+            try:
+                requeued = self.store.recover()
+                if requeued:
+                    logger.info(f"{requeued} tâche(s) remise(s) en file")
+            except Exception as e:
+                logger.error(f"Erreur reprise des tâches: {e}")
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, daemon=True, name=f'waveai-job-{index}')
+                thread.start()
+                self._threads.append(thread)
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat, daemon=True, name='waveai-job-heartbeat')
+            self._heartbeat_thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                self._maybe_recover()
+                claimed = self.store.claim(self.poll_interval)
+            except Exception as e:
+                logger.error(f"Erreur lecture file de tâches: {e}")
+                time.sleep(self.poll_interval)
+                continue
+            if claimed is None:
+                continue
+
+            job_id, payload = claimed
+            try:
+                self.store.finish(job_id, result=self.handler(payload))
+            except Exception as e:
+                logger.error(f"Erreur tâche {job_id}: {e}")
+                try:
+                    self.store.finish(job_id, error=str(e)[:500])
+                except Exception as finish_error:
+                    logger.error(f"Erreur fin de tâche {job_id}: {finish_error}")
+
+    def _heartbeat(self):
+        # Trois renouvellements par bail : une écriture ratée ne suffit pas à perdre la tâche
+        while not self._stop.wait(JOB_LEASE_SECONDS / 3):
+            try:
+                self.store.renew()
+            except Exception as e:
+                logger.error(f"Erreur renouvellement des tâches en cours: {e}")
+
+    def _maybe_recover(self):
+        now = time.monotonic()
+        if now - self._last_recover < JOB_LEASE_SECONDS:
+            return
+        self._last_recover = now
+        self.store.recover()
+
+    def stats(self):
+        stats = self.store.stats()
+        stats['workers'] = len(self._threads)
+        return stats
@@ -0,0 +1,94 @@
+# WaveAI - Recherche multi mots-clés pour les réponses hors ligne
+# Automate Aho-Corasick sur mots-clés normalisés (casse, accents) et score cumulé par réponse
+
+from collections import deque
+
+from response_cache import normalize_message
+
+WHOLE_WORD_BONUS = 1.5
+
+
+class KeywordMatcher:
+    """Un seul parcours du message, quel que soit le nombre de mots-clés"""
+
+    def __init__(self, entries=()):
+        # entries : (mot-clé ou "mot1|mot2", réponse, poids optionnel)
+        self.responses = []
+        self.keywords = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for entry in entries:
+            self.add(*entry)
+        self.build()
+
+    def add(self, keywords, response, weight=None):
+        index = len(self.responses)
+        self.responses.append(response)
+        for keyword in keywords.split('|'):
+            folded = normalize_message(keyword)
+            if not folded:
+                continue
+            self.keywords.append((folded, index, float(weight) if weight is not None else float(len(folded))))
+            self._insert(folded, len(self.keywords) - 1)
+
+    def _insert(self, keyword, keyword_id):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(keyword_id)
+
+    def build(self):
+        """Liens d'échec (parcours en largeur) : aucune relecture du message"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                candidate = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, message):
+        """Mots-clés présents : {keyword_id: entier mot (bool)}"""
+        text = normalize_message(message)
+        found = {}
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword_id in self._output[state]:
+                keyword = self.keywords[keyword_id][0]
+                start = position - len(keyword) + 1
+                whole = (start == 0 or text[start - 1] == ' ') and (position + 1 == len(text) or text[position + 1] == ' ')
+                found[keyword_id] = found.get(keyword_id, False) or whole
+        return found
+
+    def scores(self, message):
+        scores = {}
+        for keyword_id, whole in self.find(message).items():
+            _, index, weight = self.keywords[keyword_id]
+            scores[index] = scores.get(index, 0.0) + weight * (WHOLE_WORD_BONUS if whole else 1.0)
+        return scores
+
+    def best(self, message):
+        """Réponse au meilleur score cumulé ; à égalité, la première déclarée"""
+        scores = self.scores(message)
+        if not scores:
+            return None
+        index = max(scores, key=lambda index: (scores[index], -index))
+        return self.responses[index]
+
+    def __len__(self):
+        return len(self.responses)
@@ -0,0 +1,387 @@
+# WaveAI - Base de connaissances locale des agents (RAG)
+# Documents knowledge/<agent>/*.md|*.txt découpés, vectorisés et stockés en matrice NumPy mappée en mémoire
+
+import os
+import re
+import json
+import math
+import zlib
+import time
+import logging
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from response_cache import normalize_message
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_DIR = os.environ.get('WAVEAI_KNOWLEDGE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'knowledge'))
+INDEX_DIR = os.environ.get('WAVEAI_KNOWLEDGE_INDEX_DIR', os.path.join(KNOWLEDGE_DIR, '.index'))
+EMBEDDING_MODEL = os.environ.get('WAVEAI_EMBEDDING_MODEL', '')
+HASH_DIM = int(os.environ.get('WAVEAI_RAG_HASH_DIM', 4096))
+CHUNK_CHARS = int(os.environ.get('WAVEAI_RAG_CHUNK_CHARS', 800))
+TOP_K = int(os.environ.get('WAVEAI_RAG_TOP_K', 3))
+MIN_SCORE = float(os.environ.get('WAVEAI_RAG_MIN_SCORE', 0.12))
+CONTEXT_CHARS = int(os.environ.get('WAVEAI_RAG_CONTEXT_CHARS', 1500))
+# Intervalle de vérification des documents (un stat par fichier) ; 0 pour ne jamais recharger
+RELOAD_INTERVAL = float(os.environ.get('WAVEAI_RAG_RELOAD_INTERVAL', 30))
+EXTENSIONS = ('.md', '.txt')
+
+STOPWORDS = frozenset("""
+a au aux avec ce ces dans de des du elle en et eux il je la le les leur lui ma mais me meme mes moi mon ne nos notre
+nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre vous c d j l m n s t y
+est sont ai as avons avez ont etre avoir fait faire comment quoi quel quelle quels quelles plus tres bien
+""".split())
+
+_HEADING = re.compile(r'^#{1,6}\s+(.*)$')
+
+
+def tokenize(text):
+    return [token for token in normalize_message(text).split() if len(token) > 1 and token not in STOPWORDS]
+
+
+def chunk_document(text, max_chars=CHUNK_CHARS):
+    """Découpe par titres puis paragraphes ; chaque morceau garde le titre de sa section"""
+    chunks = []
+    title = ''
+    buffer = []
+
+    def flush():
+        body = '\n\n'.join(buffer).strip()
+        if body:
+            chunks.append({'title': title, 'text': body})
+        buffer.clear()
+
+    for block in re.split(r'\n\s*\n', text):
+        block = block.strip()
+        if not block:
+            continue
+        heading = _HEADING.match(block.split('\n', 1)[0])
+        if heading:
+            flush()
+            title = heading.group(1).strip()
+            block = block.split('\n', 1)[1].strip() if '\n' in block else ''
+            if not block:
+                continue
+        if buffer and sum(len(part) for part in buffer) + len(block) > max_chars:
+            flush()
+        buffer.append(block[:max_chars * 2])
+    flush()
+    return chunks
+
+
+def replace_file(path, write, mode):
+    """Écrit dans un fichier temporaire du même dossier puis le substitue atomiquement à path"""
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporary, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as handle:
+            write(handle)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+class HashingTfidfVectorizer:
+    """TF-IDF sur un espace haché : aucun vocabulaire ni modèle à télécharger"""
+
+    name = 'tfidf'
+
+    def __init__(self, dim=HASH_DIM, idf=None):
+        self.dim = dim
+        self.idf = idf
+
+    def _counts(self, text):
+        counts = Counter()
+        for token in tokenize(text):
+            counts[zlib.crc32(token.encode('utf-8')) % self.dim] += 1
+        return counts
+
+    def fit(self, texts):
+        document_frequency = np.zeros(self.dim, dtype=np.float32)
+        for text in texts:
+            for index in self._counts(text):
+                document_frequency[index] += 1
+        total = max(1, len(texts))
+        self.idf = (np.log((1 + total) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self
+
+    def transform(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for index, count in self._counts(text).items():
+                matrix[row, index] = 1 + math.log(count)
+        if self.idf is not None:
+            matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+
+class SentenceEmbeddingVectorizer:
+    """Petit modèle d'embeddings CPU (sentence-transformers, optionnel)"""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.name = f'model:{model_name}'
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.idf = None
+
+    def fit(self, texts):
+        return self
+
+    def transform(self, texts):
+        return np.asarray(self.model.encode(list(texts), normalize_embeddings=True), dtype=np.float32)
+
+
+class KnowledgeIndex:
+    def __init__(self, agent, matrix, chunks, vectorizer):
+        self.agent = agent
+        self.matrix = matrix
+        self.chunks = chunks
+        self.vectorizer = vectorizer
+
+    def search(self, query, k=TOP_K, min_score=MIN_SCORE):
+        """Top-k cosinus : un produit matrice-vecteur sur des lignes normalisées"""
+        if not len(self.chunks) or not query:
+            return []
+        vector = self.vectorizer.transform([query])[0]
+        if not vector.any():
+            return []
+        scores = self.matrix @ vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[index]), self.chunks[index]) for index in top if scores[index] >= min_score]
+
+
+class KnowledgeBase:
+    def __init__(self, knowledge_dir=KNOWLEDGE_DIR, index_dir=INDEX_DIR, embedding_model=EMBEDDING_MODEL,
+                 reload_interval=RELOAD_INTERVAL):
+        self.knowledge_dir = knowledge_dir
+        self.index_dir = index_dir
+        self.embedding_model = embedding_model
+        self.reload_interval = reload_interval
+        self.indexes = {}
+        self.signatures = {}
+        self._vectorizer = None
+        self._contexts = OrderedDict()
+        self._checked_at = {}
+        self._rebuilding = set()
+        self._lock = threading.Lock()
+
+    def agents(self):
+        if not os.path.isdir(self.knowledge_dir):
+            return []
+        return sorted(name for name in os.listdir(self.knowledge_dir)
+                      if not name.startswith('.') and os.path.isdir(os.path.join(self.knowledge_dir, name)))
+
+    def _sources(self, agent):
+        folder = os.path.join(self.knowledge_dir, agent)
+        if not os.path.isdir(folder):
+            return []
+        sources = []
+        for root, _, files in os.walk(folder):
+            for filename in sorted(files):
+                if filename.endswith(EXTENSIONS):
+                    path = os.path.join(root, filename)
+                    stat = os.stat(path)
+                    sources.append((os.path.relpath(path, folder), stat.st_mtime, stat.st_size))
+        return sorted(sources)
+
+    def model_vectorizer(self):
+        if self._vectorizer is None and self.embedding_model:
+            try:
+                self._vectorizer = SentenceEmbeddingVectorizer(self.embedding_model)
+            except Exception as e:
+                logger.error(f"Modèle d'embeddings indisponible, repli TF-IDF: {e}")
+                self.embedding_model = ''
+        return self._vectorizer
+
+    def _signature(self, sources):
+        vectorizer = self.model_vectorizer()
+        return {
+            'vectorizer': vectorizer.name if vectorizer else f'tfidf:{HASH_DIM}',
+            'chunk_chars': CHUNK_CHARS,
+            'sources': [list(source) for source in sources]
+        }
+
+    def _paths(self, agent):
+        base = os.path.join(self.index_dir, agent)
+        return base + '.npy', base + '.json', base + '.idf.npy'
+
+    def build(self, agent):
+        """Découpe, vectorise et écrit l'index d'un agent ; renvoie (index, signature)"""
+        sources = self._sources(agent)
+        chunks = []
+        folder = os.path.join(self.knowledge_dir, agent)
+        for relative_path, _, _ in sources:
+            with open(os.path.join(folder, relative_path), encoding='utf-8') as handle:
+                for chunk in chunk_document(handle.read()):
+                    chunk['source'] = relative_path
+                    chunks.append(chunk)
+
+        vectorizer = self.model_vectorizer() or HashingTfidfVectorizer()
+        texts = [f"{chunk['title']}\n{chunk['text']}" for chunk in chunks]
+        vectorizer.fit(texts)
+        matrix = vectorizer.transform(texts) if texts else np.zeros((0, HASH_DIM), dtype=np.float32)
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        matrix_path, meta_path, idf_path = self._paths(agent)
+        # Fichiers remplacés (jamais réécrits) : un index encore mappé garde l'ancien contenu ;
+        # métadonnées en dernier, un lecteur ne voit jamais de nouveaux morceaux avec l'ancienne matrice
+        replace_file(matrix_path, lambda handle: np.save(handle, matrix), 'wb')
+        if vectorizer.idf is not None:
+            replace_file(idf_path, lambda handle: np.save(handle, vectorizer.idf), 'wb')
+        replace_file(meta_path, lambda handle: json.dump({'signature': self._signature(sources), 'chunks': chunks},
+                                                         handle, ensure_ascii=False), 'w')
+        logger.info(f"Index de connaissances {agent}: {len(chunks)} morceau(x)")
+        return self._load(agent)
+
+    def _load(self, agent):
+        matrix_path, meta_path, idf_path = self._paths(agent)
+        with open(meta_path, encoding='utf-8') as handle:
+            meta = json.load(handle)
+        vectorizer = self.model_vectorizer()
+        if vectorizer is None:
+            vectorizer = HashingTfidfVectorizer(idf=np.load(idf_path) if os.path.exists(idf_path) else None)
+        # Mappée en mémoire : partagée par le cache disque entre processus, chargée à la demande
+        matrix = np.load(matrix_path, mmap_mode='r')
+        if matrix.shape[0] != len(meta['chunks']):
+            # Reconstruction d'un autre processus entre la lecture des métadonnées et celle de la matrice
+            raise ValueError(f"index {agent} incohérent")
+        return KnowledgeIndex(agent, matrix, meta['chunks'], vectorizer), meta['signature']
+
+    def _open(self, agent, rebuild=False):
+        """Index sur disque s'il correspond encore aux documents, sinon reconstruit"""
+        sources = self._sources(agent)
+        if not sources:
+            return None, self._signature(sources)
+        if not rebuild:
+            try:
+                index, signature = self._load(agent)
+                if signature == self._signature(sources):
+                    return index, signature
+            except (OSError, ValueError, KeyError):
+                pass
+        return self.build(agent)
+
+    def _install(self, agent, index, signature):
+        # Appelé sous verrou : les extraits mémorisés de l'ancien index sont oubliés
+        self.indexes[agent] = index
+        self.signatures[agent] = signature
+        self._checked_at[agent] = time.monotonic()
+        for key in [key for key in self._contexts if key[0] == agent]:
+            del self._contexts[key]
+
+    def refresh(self, agent, rebuild=False):
+        """Charge (ou reconstruit) l'index d'un agent et le publie ; utilisé au démarrage et par build-knowledge"""
+        with self._lock:
+            index, signature = self._open(agent, rebuild)
+            self._install(agent, index, signature)
+            return index
+
+    def warm(self, rebuild=False):
+        """Prépare les index de tous les agents, pour qu'aucune requête de chat ne les construise"""
+        for agent in self.agents():
+            try:
+                self.refresh(agent, rebuild)
+            except Exception as e:
+                logger.error(f"Erreur préparation index de connaissances {agent}: {e}")
+
+    def start(self):
+        """Préparation en arrière-plan : le démarrage n'attend pas le modèle ni la vectorisation"""
+        thread = threading.Thread(target=self.warm, name='waveai-knowledge-warm', daemon=True)
+        thread.start()
+        return thread
+
+    def maybe_reload(self, agent):
+        """Vérifie les documents au plus une fois par intervalle ; reconstruction hors requête"""
+        if self.reload_interval <= 0 or agent not in self.indexes:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at.get(agent, 0) < self.reload_interval:
+            return False
+        self._checked_at[agent] = now
+        try:
+            signature = self._signature(self._sources(agent))
+        except OSError:
+            return False
+        with self._lock:
+            if signature == self.signatures.get(agent) or agent in self._rebuilding:
+                return False
+            self._rebuilding.add(agent)
+        # L'ancien index reste servi jusqu'à ce que le nouveau soit prêt
+        threading.Thread(target=self._rebuild, args=(agent,), name=f'waveai-knowledge-{agent}', daemon=True).start()
+        return True
+
+    def _rebuild(self, agent):
+        try:
+            self.refresh(agent)
+            logger.info(f"Index de connaissances {agent} rechargé (documents modifiés)")
+        except Exception as e:
+            logger.error(f"Erreur reconstruction index de connaissances {agent}: {e}")
+        finally:
+            with self._lock:
+                self._rebuilding.discard(agent)
+
+    def get_index(self, agent):
+        if agent in self.indexes:
+            self.maybe_reload(agent)
+            return self.indexes[agent]
+        with self._lock:
+            # Agent pas encore préparé (démarrage en cours) : chargé ou construit une seule fois
+            if agent not in self.indexes:
+                self._install(agent, *self._open(agent))
+            return self.indexes[agent]
+
+    def search(self, agent, query, k=TOP_K):
+        try:
+            index = self.get_index(agent)
+            return index.search(query, k) if index else []
+        except Exception as e:
+            logger.error(f"Erreur recherche connaissances {agent}: {e}")
+            return []
+
+    def context(self, agent, query):
+        """Extraits pertinents à injecter dans le prompt ('' si rien de pertinent)"""
+        key = (agent, query)
+        self.maybe_reload(agent)
+        cached = self._contexts.get(key)
+        if cached is not None:
+            return cached
+
+        signature = self.signatures.get(agent)
+        parts = []
+        used = 0
+        for _, chunk in self.search(agent, query):
+            text = f"[{chunk['title'] or chunk['source']}] {chunk['text']}"
+            if used + len(text) > CONTEXT_CHARS:
+                text = text[:max(0, CONTEXT_CHARS - used)]
+            if not text:
+                break
+            parts.append(text)
+            used += len(text)
+        context = ("CONNAISSANCES UTILES:\n" + '\n\n'.join(parts)) if parts else ''
+
+        # Petit mémo : la course et le streaming reconstruisent le même prompt
+        with self._lock:
+            # Index remplacé pendant la recherche : extraits non mémorisés
+            if agent in self.signatures and self.signatures[agent] == signature:
+                self._contexts[key] = context
+            while len(self._contexts) > 256:
+                self._contexts.popitem(last=False)
+        return context
+
+    def reset(self):
+        with self._lock:
+            self.indexes.clear()
+            self.signatures.clear()
+            self._checked_at.clear()
+            self._contexts.clear()
+
+
+# Instance globale partagée par les systèmes IA
+knowledge_base = KnowledgeBase()
@@ -0,0 +1,228 @@
+# WaveAI - Métriques au format Prometheus
+# Compteurs, histogrammes et jauges en mémoire du processus, exposés par /metrics (sans dépendance)
+
+import os
+import time
+import bisect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get('WAVEAI_METRICS', 'true').lower() == 'true'
+
+# Secondes : du cache mémoire (ms) à un appel provider lent
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000)
+DEPTH_BUCKETS = (0, 1, 2, 3, 4)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Premier seuil >= valeur (sémantique « le » de Prometheus)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return Timer(self, labels)
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Timer:
+    """Chronomètre d'une étape : with metric.time(stage='...') ou en décorateur"""
+
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if METRICS_ENABLED:
+            self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+    def __call__(self, function):
+        histogram, labels = self.histogram, self.labels
+
+        def wrapper(*args, **kwargs):
+            with Timer(histogram, labels):
+                return function(*args, **kwargs)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, function):
+        """Fonction appelée à chaque lecture : [(nom, type, aide, [(labels, valeur)])] depuis les stats existantes"""
+        self.collectors.append(function)
+        return function
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            body = metric.render()
+            if body:
+                lines.extend(metric.header() + body)
+        for collect in self.collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                logger.error(f"Erreur collecte métriques ({collect.__name__}): {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    label_text = _format_labels(labels.keys(), labels.values())
+                    lines.append(f"{name}{label_text} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# Registre global du processus (un par worker : agréger côté Prometheus)
+metrics = MetricsRegistry()
+
+# Chemin de chat
+HTTP_SECONDS = metrics.histogram('waveai_http_request_seconds', "Durée des requêtes HTTP (jusqu'aux en-têtes)",
+                                 ['endpoint', 'method', 'status'])
+CHAT_STAGE_SECONDS = metrics.histogram('waveai_chat_stage_seconds', 'Durée de chaque étape du chat', ['stage'])
+PROVIDER_SECONDS = metrics.histogram('waveai_provider_call_seconds', 'Durée des appels aux providers IA',
+                                     ['provider', 'outcome'])
+FALLBACK_DEPTH = metrics.histogram('waveai_fallback_depth', 'Rang du provider qui a répondu (nombre de providers essayés = secours)',
+                                   buckets=DEPTH_BUCKETS)
+DB_SECONDS = metrics.histogram('waveai_db_seconds', 'Durée des opérations base de données', ['operation'])
+RESPONSES = metrics.counter('waveai_chat_responses_total', 'Réponses de chat par source', ['source', 'cached'])
+RESPONSE_CHARS = metrics.histogram('waveai_response_chars', 'Taille des réponses (caractères)', ['source'],
+                                   buckets=SIZE_BUCKETS)
+TOKENS = metrics.counter('waveai_tokens_total', 'Tokens consommés par provider (usage renvoyé, sinon estimé)',
+                         ['provider', 'kind'])
+
+
+def observe_provider_call(provider, seconds, ok):
+    if METRICS_ENABLED:
+        PROVIDER_SECONDS.observe(seconds, provider=provider, outcome='ok' if ok else 'error')
+
+
+def observe_response(response):
+    if METRICS_ENABLED and response:
+        source = response.get('source', 'unknown')
+        RESPONSES.inc(source=source, cached='true' if response.get('cached') else 'false')
+        RESPONSE_CHARS.observe(len(response.get('response') or ''), source=source)
+
+
+def observe_tokens(provider, prompt_tokens, completion_tokens):
+    if METRICS_ENABLED:
+        TOKENS.inc(prompt_tokens, provider=provider, kind='prompt')
+        TOKENS.inc(completion_tokens, provider=provider, kind='completion')
@@ -0,0 +1,88 @@
+"""Schéma initial : utilisateurs, paramètres IA, conversations, versions
+
+Revision ID: 0001_baseline
+Revises: 
+Create Date: 2026-10-17 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    # Bases créées par db.create_all() avant les migrations : les tables existantes sont conservées
+    if not has_table('users'):
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('password_hash', sa.String(length=200), nullable=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('last_login', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_users_email', 'users', ['email'], unique=True)
+
+    if not has_table('ai_settings'):
+        op.create_table(
+            'ai_settings',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('openai_api_key', sa.String(length=200), nullable=True),
+            sa.Column('anthropic_api_key', sa.String(length=200), nullable=True),
+            sa.Column('huggingface_token', sa.String(length=200), nullable=True),
+            sa.Column('default_model', sa.String(length=100), nullable=True),
+            sa.Column('use_ollama', sa.Boolean(), nullable=True),
+            sa.Column('temperature', sa.Float(), nullable=True),
+            sa.Column('max_tokens', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if not has_table('conversations'):
+        op.create_table(
+            'conversations',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('agent_type', sa.String(length=50), nullable=False),
+            sa.Column('title', sa.String(length=200), nullable=True),
+            sa.Column('messages', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if not has_table('app_versions'):
+        op.create_table(
+            'app_versions',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('version', sa.String(length=20), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('release_date', sa.DateTime(), nullable=True),
+            sa.Column('is_current', sa.Boolean(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('app_versions')
+    op.drop_table('conversations')
+    op.drop_table('ai_settings')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_table('users')
@@ -0,0 +1,113 @@
+"""Messages normalisés, statistiques, tâches de chat et quotas journaliers
+
+Revision ID: 0002_chat_storage
+Revises: 0001_baseline
+Create Date: 2026-10-17 09:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_chat_storage'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+
+def has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def has_column(table, column):
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def has_index(table, name):
+    return name in {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # Ajouts faits depuis le schéma initial ; déjà présents si la base vient de db.create_all()
+    if not has_column('ai_settings', 'response_cache_enabled'):
+        op.add_column('ai_settings', sa.Column('response_cache_enabled', sa.Boolean(), nullable=True,
+                                               server_default=sa.true()))
+
+    if not has_index('conversations', 'ix_conversations_user_agent_updated'):
+        op.create_index('ix_conversations_user_agent_updated', 'conversations',
+                        ['user_id', 'agent_type', 'updated_at'])
+
+    if not has_table('messages'):
+        op.create_table(
+            'messages',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('conversation_id', sa.Integer(), nullable=False),
+            sa.Column('role', sa.String(length=20), nullable=False),
+            sa.Column('content', sa.Text(), nullable=False),
+            sa.Column('source', sa.String(length=50), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_messages_conversation_created', 'messages', ['conversation_id', 'created_at'])
+
+    if not has_table('user_stats'):
+        op.create_table(
+            'user_stats',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('total_conversations', sa.Integer(), nullable=False),
+            sa.Column('total_messages', sa.Integer(), nullable=False),
+            sa.Column('agent_counts', sa.Text(), nullable=True),
+            sa.Column('last_activity', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_user_stats_user_id', 'user_stats', ['user_id'], unique=True)
+
+    if not has_table('chat_jobs'):
+        op.create_table(
+            'chat_jobs',
+            sa.Column('id', sa.String(length=32), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('payload', sa.Text(), nullable=False),
+            sa.Column('result', sa.Text(), nullable=True),
+            sa.Column('error', sa.String(length=500), nullable=True),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_chat_jobs_status_created', 'chat_jobs', ['status', 'created_at'])
+
+    if not has_table('user_usage'):
+        op.create_table(
+            'user_usage',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('requests', sa.Integer(), nullable=False),
+            sa.Column('tokens', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('user_id', 'day', name='uq_user_usage_user_day')
+        )
+
+
+def downgrade():
+    op.drop_table('user_usage')
+    op.drop_index('ix_chat_jobs_status_created', table_name='chat_jobs')
+    op.drop_table('chat_jobs')
+    op.drop_index('ix_user_stats_user_id', table_name='user_stats')
+    op.drop_table('user_stats')
+    op.drop_index('ix_messages_conversation_created', table_name='messages')
+    op.drop_table('messages')
+    op.drop_index('ix_conversations_user_agent_updated', table_name='conversations')
+    with op.batch_alter_table('ai_settings') as batch_op:
+        batch_op.drop_column('response_cache_enabled')
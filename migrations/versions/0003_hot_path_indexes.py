@@ -0,0 +1,63 @@
+"""Index du chemin chaud : paramètres IA uniques par utilisateur, listes de conversations
+
+Revision ID: 0003_hot_path_indexes
+Revises: 0002_chat_storage
+Create Date: 2026-10-17 09:10:00
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_hot_path_indexes'
+down_revision = '0002_chat_storage'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    # (nom, table, colonnes, unique)
+    ('ix_ai_settings_user_id', 'ai_settings', ['user_id'], True),
+    ('ix_conversations_user_created', 'conversations', ['user_id', 'created_at', 'id'], False),
+    ('ix_conversations_user_agent_created', 'conversations', ['user_id', 'agent_type', 'created_at', 'id'], False),
+]
+
+
+def has_index(table, name):
+    return name in {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def duplicated_settings():
+    return op.get_bind().execute(sa.text(
+        "SELECT COUNT(*) FROM (SELECT user_id FROM ai_settings GROUP BY user_id HAVING COUNT(*) > 1) AS duplicated"
+    )).scalar()
+
+
+def upgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    missing = [index for index in INDEXES if not has_index(index[1], index[0])]
+    # Doublons créés par des requêtes concurrentes : jamais supprimés ici (migration lancée au démarrage),
+    # l'index unique est créé par « flask dedupe-ai-settings » après revue des lignes supprimées
+    duplicated = duplicated_settings()
+    if duplicated:
+        logger.warning(f"⚠️ {duplicated} utilisateur(s) avec plusieurs ai_settings : index unique non créé, "
+                       f"lancer « flask --app multi_user_app dedupe-ai-settings »")
+        missing = [index for index in missing if index[0] != 'ix_ai_settings_user_id']
+    if postgresql and missing:
+        # CONCURRENTLY : les écritures ne sont pas bloquées pendant la construction sur une grosse table
+        with op.get_context().autocommit_block():
+            for name, table, columns, unique in missing:
+                op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True)
+    else:
+        for name, table, columns, unique in missing:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    for name, table, _, _ in reversed(INDEXES):
+        if has_index(table, name):
+            op.drop_index(name, table_name=table)
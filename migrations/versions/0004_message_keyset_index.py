@@ -0,0 +1,52 @@
+"""Index (conversation_id, created_at, id) des messages pour la pagination par curseur
+
+Revision ID: 0004_message_keyset_index
+Revises: 0003_hot_path_indexes
+Create Date: 2026-10-17 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_message_keyset_index'
+down_revision = '0003_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+
+def is_partitioned(table):
+    # Table partitionnée par « flask partition-messages » : CONCURRENTLY n'y est pas accepté
+    return op.get_bind().execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid))"
+    ), {'table': table}).scalar()
+
+
+def has_index(table, name):
+    return name in {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # Base créée par db.create_all (WAVEAI_AUTO_MIGRATE=false) : le nouvel index peut déjà exister
+    create = not has_index('messages', 'ix_messages_conversation_created_id')
+    drop = has_index('messages', 'ix_messages_conversation_created')
+    # Le nouvel index couvre l'ancien (même préfixe) : créé d'abord, l'historique reste indexé
+    if op.get_bind().dialect.name == 'postgresql' and not is_partitioned('messages'):
+        with op.get_context().autocommit_block():
+            if create:
+                op.create_index('ix_messages_conversation_created_id', 'messages',
+                                ['conversation_id', 'created_at', 'id'], postgresql_concurrently=True)
+            if drop:
+                op.drop_index('ix_messages_conversation_created', table_name='messages', postgresql_concurrently=True)
+    else:
+        if create:
+            op.create_index('ix_messages_conversation_created_id', 'messages', ['conversation_id', 'created_at', 'id'])
+        if drop:
+            op.drop_index('ix_messages_conversation_created', table_name='messages')
+
+
+def downgrade():
+    op.create_index('ix_messages_conversation_created', 'messages', ['conversation_id', 'created_at'])
+    op.drop_index('ix_messages_conversation_created_id', table_name='messages')
@@ -0,0 +1,67 @@
+"""Recherche plein texte des messages : tsvector + GIN (PostgreSQL), FTS5 (SQLite)
+
+Revision ID: 0005_message_search
+Revises: 0004_message_keyset_index
+Create Date: 2026-10-17 11:00:00
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_message_search'
+down_revision = '0004_message_keyset_index'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+# Copie de chaque message avec son propriétaire (« u<user_id> ») : le filtre par utilisateur se fait dans l'index
+SQLITE_TRIGGERS = [
+    """CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts (rowid, content, owner)
+        SELECT new.id, new.content, 'u' || conversations.user_id FROM conversations WHERE conversations.id = new.conversation_id;
+    END""",
+    """CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        UPDATE messages_fts SET content = new.content WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+        DELETE FROM messages_fts WHERE rowid = old.id;
+    END""",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # Colonne calculée par PostgreSQL à chaque écriture, rien à maintenir côté application
+        op.execute("ALTER TABLE messages ADD COLUMN search_vector tsvector "
+                   "GENERATED ALWAYS AS (to_tsvector('french', coalesce(content, ''))) STORED")
+        op.execute("CREATE INDEX ix_messages_search_vector ON messages USING gin (search_vector)")
+    elif dialect == 'sqlite':
+        try:
+            op.execute("CREATE VIRTUAL TABLE messages_fts USING fts5("
+                       "content, owner, tokenize = 'unicode61 remove_diacritics 2')")
+        except sa.exc.OperationalError as e:
+            # SQLite compilé sans FTS5 : la recherche se rabat sur LIKE
+            logger.warning(f"FTS5 indisponible, recherche sans index plein texte: {e}")
+            return
+        for trigger in SQLITE_TRIGGERS:
+            op.execute(trigger)
+        op.execute("INSERT INTO messages_fts (rowid, content, owner) "
+                   "SELECT messages.id, messages.content, 'u' || conversations.user_id "
+                   "FROM messages JOIN conversations ON conversations.id = messages.conversation_id")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_messages_search_vector")
+        op.execute("ALTER TABLE messages DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        for name in ('messages_fts_insert', 'messages_fts_update', 'messages_fts_delete'):
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+        op.execute("DROP TABLE IF EXISTS messages_fts")
@@ -0,0 +1,35 @@
+"""Bail des tâches de chat (locked_by, lease_until) renouvelé par le worker
+
+Revision ID: 0006_chat_job_lease
+Revises: 0005_message_search
+Create Date: 2026-10-17 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_chat_job_lease'
+down_revision = '0005_message_search'
+branch_labels = None
+depends_on = None
+
+
+def has_column(table, column):
+    return column in {info['name'] for info in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    # Colonnes éventuellement déjà ajoutées au démarrage sans migrations (add_missing_columns)
+    with op.batch_alter_table('chat_jobs') as batch_op:
+        if not has_column('chat_jobs', 'locked_by'):
+            batch_op.add_column(sa.Column('locked_by', sa.String(length=32), nullable=True))
+        if not has_column('chat_jobs', 'lease_until'):
+            batch_op.add_column(sa.Column('lease_until', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('chat_jobs') as batch_op:
+        batch_op.drop_column('lease_until')
+        batch_op.drop_column('locked_by')
@@ -0,0 +1,76 @@
+"""Conversion des anciens blobs JSON conversations.messages en lignes de la table messages
+
+Revision ID: 0007_convert_message_blobs
+Revises: 0006_chat_job_lease
+Create Date: 2026-10-18 09:00:00
+
+"""
+import json
+import logging
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_convert_message_blobs'
+down_revision = '0006_chat_job_lease'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+BATCH = 500
+
+conversations = sa.table('conversations', sa.column('id', sa.Integer), sa.column('messages', sa.Text),
+                         sa.column('created_at', sa.DateTime))
+messages = sa.table('messages', sa.column('conversation_id', sa.Integer), sa.column('role', sa.String),
+                    sa.column('content', sa.Text), sa.column('source', sa.String),
+                    sa.column('created_at', sa.DateTime), sa.column('updated_at', sa.DateTime))
+
+
+def blob_rows(conversation_id, blob, default_created_at):
+    try:
+        entries = json.loads(blob or '[]')
+    except ValueError:
+        logger.warning(f"Blob JSON invalide pour la conversation {conversation_id}, ignoré")
+        return []
+    rows = []
+    for entry in entries:
+        try:
+            created_at = datetime.fromisoformat(entry.get('timestamp'))
+        except (TypeError, ValueError):
+            created_at = default_created_at
+        if entry.get('user_message'):
+            rows.append({'conversation_id': conversation_id, 'role': 'user', 'content': entry['user_message'],
+                         'source': None, 'created_at': created_at, 'updated_at': created_at})
+        if entry.get('agent_response'):
+            rows.append({'conversation_id': conversation_id, 'role': 'assistant', 'content': entry['agent_response'],
+                         'source': entry.get('source'), 'created_at': created_at, 'updated_at': created_at})
+    return rows
+
+
+def upgrade():
+    # Le blob est vidé dans la même transaction que l'insertion : chaque conversation est convertie une seule fois
+    bind = op.get_bind()
+    converted = 0
+    while True:
+        batch = bind.execute(sa.select(conversations.c.id, conversations.c.messages, conversations.c.created_at)
+                             .where(conversations.c.messages.isnot(None))
+                             .order_by(conversations.c.id).limit(BATCH)).all()
+        if not batch:
+            break
+        rows = [row for conversation in batch for row in blob_rows(*conversation)]
+        if rows:
+            bind.execute(messages.insert(), rows)
+        bind.execute(conversations.update().where(conversations.c.id.in_([conversation.id for conversation in batch]))
+                     .values(messages=None))
+        converted += len(batch)
+    if converted:
+        logger.info(f"{converted} conversation(s) convertie(s) vers la table messages")
+
+
+def downgrade():
+    # Conversion de données : les messages restent dans leur table
+    pass
@@ -0,0 +1,61 @@
+# WaveAI - Cache des objets utilisateur et paramètres IA
+# Copies détachées à durée de vie courte, invalidées à chaque écriture
+
+import os
+import threading
+
+from response_cache import MemoryCacheBackend
+
+MODEL_CACHE_TTL = int(os.environ.get('WAVEAI_MODEL_CACHE_TTL', 60))
+MODEL_CACHE_MAX_ENTRIES = int(os.environ.get('WAVEAI_MODEL_CACHE_MAX_ENTRIES', 2048))
+
+
+class ModelCache:
+    """Cache local au processus : un autre worker voit une modification au plus tard après le TTL"""
+
+    def __init__(self, ttl=MODEL_CACHE_TTL, max_entries=MODEL_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.backend = MemoryCacheBackend(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get(self, kind, key):
+        if not self.enabled:
+            return None
+        value = self.backend.get((kind, key))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, kind, key, value):
+        if self.enabled and value is not None:
+            self.backend.set((kind, key), value, self.ttl)
+
+    def invalidate(self, kind, key):
+        self.backend.delete((kind, key))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'ttl': self.ttl,
+                'entries': self.backend.size(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0
+            }
+
+
+model_cache = ModelCache()
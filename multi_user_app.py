@@ -5,13 +5,46 @@ import os
 import logging
 import json
 import secrets
+import hashlib
 import re
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, make_response
+import click
+
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, make_response, Response, stream_with_context, g
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from flask_migrate import Migrate, upgrade as migrate_upgrade
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from provider_health import health_registry, hf_endpoint_name, http_probe
+from http_pool import get_session, get_anthropic_client, configure_openai, pool_stats, api_key_fingerprint
+from circuit_breaker import breakers
+from response_cache import response_cache
+from semantic_cache import semantic_cache
+from model_cache import model_cache
+from agent_registry import agent_registry
+from knowledge_index import knowledge_base
+from single_flight import SingleFlight, COALESCE_ENABLED
+from job_queue import JobQueue, MemoryJobStore, DatabaseJobStore
+from rate_limit import rate_limiter, quota_tracker, DatabaseQuotaStore, PROXY_COUNT
+from query_plans import check_queries
+from partitioning import is_supported, partition_messages
+from pagination import keyset_page, keyset_query, encode_cursor, parse_limit, etag_for, InvalidCursor
+from search_index import MessageSearch
+from transcript_buffer import TranscriptBuffer, ConversationIdAllocator, register_shutdown
+from db_engine import engine_options, install_pool_metrics, pool_status
+from context_window import build_history_window, history_budget, estimate_tokens, HISTORY_MAX_TURNS
+from metrics import (metrics, METRICS_ENABLED, HTTP_SECONDS, CHAT_STAGE_SECONDS, DB_SECONDS, FALLBACK_DEPTH,
+                     observe_provider_call, observe_response, observe_tokens)
 
 # Configuration
 app = Flask(__name__)
@@ -23,11 +56,22 @@ if database_url.startswith('postgres://'):
     database_url = database_url.replace('postgres://', 'postgresql://', 1)
 app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Pool de connexions (taille, pré-ping, recyclage, mode PgBouncer) : voir db_engine.py
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_url)
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
 
+# Derrière un reverse proxy (Render) : IP client lue dans X-Forwarded-For pour la limite par IP
+if PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_COUNT, x_proto=PROXY_COUNT)
+
 # Initialisation
 db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+with app.app_context():
+    install_pool_metrics(db.engine)
+# Schéma versionné dans migrations/ (flask db upgrade), appliqué au démarrage si WAVEAI_AUTO_MIGRATE
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+AUTO_MIGRATE = os.environ.get('WAVEAI_AUTO_MIGRATE', 'true').lower() == 'true'
+migrate = Migrate(app, db, directory=MIGRATIONS_DIR, render_as_batch=True)
 
 # Logging
 logging.basicConfig(level=logging.INFO)
@@ -56,12 +100,14 @@ class User(db.Model):
 class AISettings(db.Model):
     __tablename__ = 'ai_settings'
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # Une seule ligne par utilisateur, lue à chaque chat (cache expiré)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True, index=True)
     openai_api_key = db.Column(db.String(200))
     anthropic_api_key = db.Column(db.String(200))
     huggingface_token = db.Column(db.String(200))
     default_model = db.Column(db.String(100), default='huggingface')
     use_ollama = db.Column(db.Boolean, default=True)
+    response_cache_enabled = db.Column(db.Boolean, default=True)
     temperature = db.Column(db.Float, default=0.7)
     max_tokens = db.Column(db.Integer, default=1000)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -73,9 +119,94 @@ class Conversation(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     agent_type = db.Column(db.String(50), nullable=False)
     title = db.Column(db.String(200))
+    # Ancien stockage JSON, remplacé par la table messages (voir flask migrate-messages)
     messages = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Recherche de la conversation active d'un utilisateur avec un agent
+        db.Index('ix_conversations_user_agent_updated', 'user_id', 'agent_type', 'updated_at'),
+        # Historique paginé par (created_at, id), tous agents ou filtré par agent
+        db.Index('ix_conversations_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_conversations_user_agent_created', 'user_id', 'agent_type', 'created_at', 'id'),
+    )
+
+class Message(db.Model):
+    __tablename__ = 'messages'
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
+    role = db.Column(db.String(20), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    source = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # id départage les deux messages d'un échange (même created_at) : historique et pages sans tri
+        db.Index('ix_messages_conversation_created_id', 'conversation_id', 'created_at', 'id'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'role': self.role,
+            'content': self.content,
+            'source': self.source,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class UserStats(db.Model):
+    """Agrégats par utilisateur tenus à jour à chaque écriture (lecture du dashboard en une ligne)"""
+    __tablename__ = 'user_stats'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True, index=True)
+    total_conversations = db.Column(db.Integer, default=0, nullable=False)
+    total_messages = db.Column(db.Integer, default=0, nullable=False)
+    # Nombre de conversations par agent (JSON)
+    agent_counts = db.Column(db.Text, default='{}')
+    last_activity = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def get_agent_counts(self):
+        try:
+            return json.loads(self.agent_counts or '{}')
+        except ValueError:
+            return {}
+
+class ChatJob(db.Model):
+    """Requête /api/chat?async=1 en attente ou traitée par le pool de workers"""
+    __tablename__ = 'chat_jobs'
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    payload = db.Column(db.Text, nullable=False)
+    result = db.Column(db.Text)
+    error = db.Column(db.String(500))
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Réservation par un worker, prolongée tant qu'il tourne (job_queue.JobQueue._heartbeat)
+    locked_by = db.Column(db.String(32))
+    lease_until = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_chat_jobs_status_created', 'status', 'created_at'),
+    )
+
+class UserUsage(db.Model):
+    """Consommation journalière par utilisateur (quotas), incrémentée par lots depuis la mémoire"""
+    __tablename__ = 'user_usage'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    requests = db.Column(db.Integer, default=0, nullable=False)
+    tokens = db.Column(db.Integer, default=0, nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', name='uq_user_usage_user_day'),
+    )
 
 class AppVersion(db.Model):
     __tablename__ = 'app_versions'
@@ -85,144 +216,358 @@ class AppVersion(db.Model):
     release_date = db.Column(db.DateTime, default=datetime.utcnow)
     is_current = db.Column(db.Boolean, default=False)
 
+# Champs de comptabilité ajoutés par call_provider, propres à l'appel qui les a consommés
+INTERNAL_RESPONSE_FIELDS = ('tokens', 'usage')
+
 # Système IA
 class WaveAISystem:
     def __init__(self):
-        self.agents = {
-            'kai': {
-                'name': 'Kai Wave',
-                'emoji': '🌊',
-                'description': 'Assistant IA conversationnel et créatif',
-                'prompt': 'Tu es Kai Wave, assistant IA amical de WaveAI.'
-            },
-            'alex': {
-                'name': 'Alex Wave',
-                'emoji': '⚡',
-                'description': 'Spécialiste productivité et Gmail',
-                'prompt': 'Tu es Alex Wave, expert productivité de WaveAI.'
-            },
-            'lina': {
-                'name': 'Lina Wave',
-                'emoji': '💼',
-                'description': 'Experte LinkedIn et networking',
-                'prompt': 'Tu es Lina Wave, experte LinkedIn de WaveAI.'
-            },
-            'marco': {
-                'name': 'Marco Wave',
-                'emoji': '📱',
-                'description': 'Expert réseaux sociaux',
-                'prompt': 'Tu es Marco Wave, expert réseaux sociaux de WaveAI.'
-            },
-            'sofia': {
-                'name': 'Sofia Wave',
-                'emoji': '📅',
-                'description': 'Assistante planning et organisation',
-                'prompt': 'Tu es Sofia Wave, experte organisation de WaveAI.'
-            }
+        # Providers disponibles (nom -> méthode)
+        self.providers = {
+            'openai': self.get_openai_response,
+            'anthropic': self.get_anthropic_response,
+            'huggingface': self.get_huggingface_response
         }
+        
+        # Mode course : interroge les N premiers providers en parallèle
+        self.race_mode = os.environ.get('WAVEAI_RACE_MODE', 'false').lower() == 'true'
+        self.race_width = max(1, int(os.environ.get('WAVEAI_RACE_WIDTH', 2)))
+        self.race_timeout = float(os.environ.get('WAVEAI_RACE_TIMEOUT', 30))
+        self.race_max_workers = max(1, int(os.environ.get('WAVEAI_RACE_MAX_WORKERS', 8)))
+        self._race_executor = None
+        self._executor_lock = threading.Lock()
+        
+        # Ollama local (streaming)
+        self.ollama_url = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+        self.ollama_model = os.environ.get('OLLAMA_MODEL', 'llama2')
+        
+        self.hf_url = os.environ.get('HUGGINGFACE_API_URL', "https://api-inference.huggingface.co/models/microsoft/DialoGPT-medium")
+        # Surchargeables pour un proxy ou le serveur simulé des benchmarks (benchmarks/mock_providers.py)
+        self.openai_url = os.environ.get('OPENAI_API_BASE', 'https://api.openai.com/v1')
+        self.anthropic_url = os.environ.get('ANTHROPIC_BASE_URL', 'https://api.anthropic.com')
+        
+        # Endpoints suivis par le registre de santé
+        health_registry.register('ollama', http_probe(f'{self.ollama_url}/api/tags', ok_status=200), default_up=False)
+        health_registry.register('openai', http_probe(f'{self.openai_url}/models'))
+        health_registry.register('anthropic', http_probe(f'{self.anthropic_url}/v1/complete'))
+        health_registry.register(hf_endpoint_name(self.hf_url), http_probe(self.hf_url))
+        
+        # Cache des réponses (None si WAVEAI_RESPONSE_CACHE=off)
+        self.response_cache = response_cache
+        # Cache sémantique (None si WAVEAI_SEMANTIC_CACHE=false)
+        self.semantic_cache = semantic_cache
+        self.coalesce = COALESCE_ENABLED
+        self.rag_enabled = os.environ.get('WAVEAI_RAG', 'true').lower() == 'true'
+        self.single_flight = SingleFlight()
+        
+        # Victoires par provider pour adapter l'ordre par défaut
+        # (score avec décroissance : les victoires récentes pèsent plus)
+        self.provider_wins = {name: 0 for name in self.providers}
+        self.provider_scores = {name: 0.0 for name in self.providers}
+        self.win_decay = float(os.environ.get('WAVEAI_WIN_DECAY', 0.95))
+        self._wins_lock = threading.Lock()
+    
+    @property
+    def agents(self):
+        # Registre partagé (agents.json), rechargé à chaud
+        return agent_registry.get_profiles()
     
     def check_ollama_availability(self):
-        try:
-            import requests
-            response = requests.get('http://localhost:11434/api/tags', timeout=2)
-            return response.status_code == 200
-        except Exception:
-            return False
+        # Lecture en cache du registre de santé (rafraîchi en arrière-plan)
+        return health_registry.is_up('ollama', default=False)
+    
+    def provider_health_key(self, provider):
+        if provider == 'huggingface':
+            return hf_endpoint_name(self.hf_url)
+        return provider
+    
+    def breaker_name(self, provider, settings=None):
+        """Disjoncteur par endpoint, et par clé API pour OpenAI/Anthropic (une clé invalide ne coupe que son utilisateur)"""
+        name = self.provider_health_key(provider)
+        api_key = None
+        if settings is not None:
+            api_key = {'openai': settings.openai_api_key, 'anthropic': settings.anthropic_api_key}.get(provider)
+        return f"{name}:{api_key_fingerprint(api_key)[:12]}" if api_key else name
+    
+    def provider_timeout(self, provider, default):
+        return breakers.timeout(self.provider_health_key(provider), default)
+    
+    def provider_budget_ok(self, provider):
+        """Seau partagé par provider (quota HF commun à tous) : épuisé, on passe au suivant"""
+        return not rate_limiter.hit(f'provider:{provider}', 'global')
+    
+    def is_provider_up(self, provider, settings=None):
+        return (health_registry.is_up(self.provider_health_key(provider))
+                and not breakers.is_open(self.breaker_name(provider, settings)))
     
-    def get_huggingface_response(self, message, agent_type, settings=None):
+    def call_provider(self, name, message, agent_type, settings, history=None):
+        """Appelle un provider derrière son disjoncteur, latence et résultat enregistrés"""
+        breaker = self.breaker_name(name, settings)
+        if not self.provider_budget_ok(name) or not breakers.allow(breaker):
+            return None
+        started = time.monotonic()
+        response = None
         try:
-            import requests
-            agent = self.agents.get(agent_type, self.agents['kai'])
-            
-            headers = {'Content-Type': 'application/json'}
-            if settings and settings.huggingface_token:
-                headers['Authorization'] = f'Bearer {settings.huggingface_token}'
-            
-            url = "https://api-inference.huggingface.co/models/microsoft/DialoGPT-medium"
-            payload = {
-                "inputs": message,
-                "parameters": {
-                    "max_length": min(settings.max_tokens if settings else 150, 200),
-                    "temperature": settings.temperature if settings else 0.7,
-                    "do_sample": True
-                }
+            response = self.providers[name](message, agent_type, settings, history)
+            return response
+        finally:
+            ok = bool(response and response.get('response'))
+            elapsed = time.monotonic() - started
+            breakers.record(breaker, ok, self.provider_health_key(name), elapsed)
+            observe_provider_call(name, elapsed, ok)
+            if ok:
+                self.record_usage(name, message, agent_type, history, response)
+    
+    def record_usage(self, provider, message, agent_type, history, response):
+        """Tokens consommés : usage renvoyé par le provider (OpenAI), sinon estimation sur le prompt envoyé"""
+        usage = response.pop('usage', None)
+        if usage:
+            prompt_tokens, completion_tokens = usage['prompt_tokens'], usage['completion_tokens']
+        else:
+            # DialoGPT ne reçoit que le message
+            prompt_tokens = estimate_tokens(message)
+            if provider != 'huggingface':
+                prompt_tokens += estimate_tokens(self.build_system_prompt(message, agent_type))
+                if history:
+                    prompt_tokens += estimate_tokens(history.to_text())
+            completion_tokens = estimate_tokens(response['response'])
+        # Décompté du quota journalier de l'utilisateur à la sauvegarde
+        response['tokens'] = prompt_tokens + completion_tokens
+        if METRICS_ENABLED:
+            observe_tokens(provider, prompt_tokens, completion_tokens)
+    
+    def record_fallback_depth(self, candidates, response):
+        """Rang du provider qui a répondu ; len(candidates) quand la réponse de secours a servi"""
+        if METRICS_ENABLED:
+            source = response.get('source')
+            FALLBACK_DEPTH.observe(candidates.index(source) if source in candidates else len(candidates))
+    
+    # Construction des requêtes (partagée par les chemins sync, streaming et async)
+    def make_response(self, text, source, agent_type, usage=None):
+        response = {
+            'response': text,
+            'source': source,
+            'agent': agent_type,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        # Retiré par call_provider une fois compté (jamais renvoyé ni mis en cache)
+        if usage:
+            response['usage'] = {'prompt_tokens': usage['prompt_tokens'], 'completion_tokens': usage['completion_tokens']}
+        return response
+    
+    def build_history(self, turns, agent_type, message, settings):
+        """Fenêtre d'historique dans le budget dérivé de max_tokens (anciens échanges résumés)"""
+        if not turns:
+            return None
+        budget = history_budget(settings.max_tokens if settings else 1000, self.build_system_prompt(message, agent_type), message)
+        return build_history_window(turns, budget) or None
+    
+    def build_system_prompt(self, message, agent_type):
+        """Prompt court de l'agent, complété par les extraits de sa base de connaissances pertinents pour ce message"""
+        agent = self.agents.get(agent_type, self.agents['kai'])
+        knowledge = knowledge_base.context(agent_type, message) if self.rag_enabled else ''
+        return f"{agent['prompt']}\n\n{knowledge}" if knowledge else agent['prompt']
+    
+    def build_text_prompt(self, message, agent_type, history=None):
+        system_prompt = self.build_system_prompt(message, agent_type)
+        if history:
+            return f"{system_prompt}\n\n{history.to_text()}\n\n{message}"
+        return f"{system_prompt}\n\n{message}"
+    
+    def build_chat_messages(self, message, agent_type, history=None):
+        messages = [{"role": "system", "content": self.build_system_prompt(message, agent_type)}]
+        if history:
+            if history.summary:
+                messages.append({"role": "system", "content": history.summary})
+            messages.extend({"role": role, "content": content} for role, content in history.turns)
+        messages.append({"role": "user", "content": message})
+        return messages
+    
+    def build_anthropic_prompt(self, message, agent_type, history=None):
+        return f"Human: {self.build_text_prompt(message, agent_type, history)}\n\nAssistant:"
+    
+    def generation_params(self, settings):
+        return {
+            'max_tokens': min(settings.max_tokens or 1000, 1500),
+            'temperature': min(max(settings.temperature or 0.7, 0.0), 1.0)
+        }
+    
+    def build_huggingface_request(self, message, settings):
+        headers = {'Content-Type': 'application/json'}
+        if settings and settings.huggingface_token:
+            headers['Authorization'] = f'Bearer {settings.huggingface_token}'
+        
+        payload = {
+            "inputs": message,
+            "parameters": {
+                "max_length": min(settings.max_tokens if settings else 150, 200),
+                "temperature": settings.temperature if settings else 0.7,
+                "do_sample": True
             }
-            
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+        }
+        return headers, payload
+    
+    def parse_huggingface_result(self, result, message):
+        if isinstance(result, list) and len(result) > 0:
+            generated = result[0].get('generated_text', '').strip()
+            if generated and generated != message:
+                clean_response = generated.replace(message, '').strip()
+                if clean_response:
+                    return clean_response
+        return None
+    
+    def get_huggingface_response(self, message, agent_type, settings=None, history=None):
+        # DialoGPT (max_length 200) ne reçoit que le message : l'historique ne tiendrait pas
+        try:
+            headers, payload = self.build_huggingface_request(message, settings)
+            response = get_session('huggingface').post(self.hf_url, headers=headers, json=payload,
+                                                       timeout=self.provider_timeout('huggingface', 30))
             
             if response.status_code == 200:
-                result = response.json()
-                if isinstance(result, list) and len(result) > 0:
-                    generated = result[0].get('generated_text', '').strip()
-                    if generated and generated != message:
-                        clean_response = generated.replace(message, '').strip()
-                        if clean_response:
-                            return {
-                                'response': clean_response,
-                                'source': 'huggingface',
-                                'agent': agent_type,
-                                'timestamp': datetime.utcnow().isoformat()
-                            }
+                text = self.parse_huggingface_result(response.json(), message)
+                if text:
+                    return self.make_response(text, 'huggingface', agent_type)
         except Exception as e:
             logger.error(f"Erreur Hugging Face: {e}")
         return None
     
-    def get_openai_response(self, message, agent_type, settings):
+    def get_openai_response(self, message, agent_type, settings, history=None):
         try:
             if not settings or not settings.openai_api_key:
                 return None
             
             import openai
-            openai.api_key = settings.openai_api_key
-            agent = self.agents.get(agent_type, self.agents['kai'])
+            params = self.generation_params(settings)
             
+            # Clé passée par appel : pas de mutation globale partagée entre utilisateurs
             response = openai.ChatCompletion.create(
+                api_key=settings.openai_api_key,
                 model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": agent['prompt']},
-                    {"role": "user", "content": message}
-                ],
-                max_tokens=min(settings.max_tokens or 1000, 1500),
-                temperature=min(max(settings.temperature or 0.7, 0.0), 1.0)
+                messages=self.build_chat_messages(message, agent_type, history),
+                max_tokens=params['max_tokens'],
+                temperature=params['temperature'],
+                request_timeout=self.provider_timeout('openai', 60)
             )
             
-            return {
-                'response': response.choices[0].message.content.strip(),
-                'source': 'openai',
-                'agent': agent_type,
-                'timestamp': datetime.utcnow().isoformat()
-            }
+            return self.make_response(response.choices[0].message.content.strip(), 'openai', agent_type,
+                                      usage=response.get('usage'))
         except Exception as e:
             logger.error(f"Erreur OpenAI: {e}")
             return None
     
-    def get_anthropic_response(self, message, agent_type, settings):
+    def get_anthropic_response(self, message, agent_type, settings, history=None):
         try:
             if not settings or not settings.anthropic_api_key:
                 return None
             
-            import anthropic
-            client = anthropic.Client(api_key=settings.anthropic_api_key)
-            agent = self.agents.get(agent_type, self.agents['kai'])
+            client = get_anthropic_client(settings.anthropic_api_key)
+            params = self.generation_params(settings)
             
             response = client.completions.create(
                 model="claude-instant-1.2",
-                max_tokens_to_sample=min(settings.max_tokens or 1000, 1500),
-                temperature=min(max(settings.temperature or 0.7, 0.0), 1.0),
-                prompt=f"Human: {agent['prompt']}\n\n{message}\n\nAssistant:"
+                max_tokens_to_sample=params['max_tokens'],
+                temperature=params['temperature'],
+                prompt=self.build_anthropic_prompt(message, agent_type, history),
+                timeout=self.provider_timeout('anthropic', 60)
             )
             
-            return {
-                'response': response.completion.strip(),
-                'source': 'anthropic',
-                'agent': agent_type,
-                'timestamp': datetime.utcnow().isoformat()
-            }
+            return self.make_response(response.completion.strip(), 'anthropic', agent_type)
         except Exception as e:
             logger.error(f"Erreur Anthropic: {e}")
             return None
     
-    def get_response(self, message, agent_type='kai', user_settings=None):
+    def get_provider_order(self, user_settings):
+        """Providers éligibles : modèle par défaut d'abord, puis par nombre de victoires"""
+        preferred = None
+        eligible = []
+        if user_settings:
+            if user_settings.default_model == 'openai' and user_settings.openai_api_key:
+                preferred = 'openai'
+            elif user_settings.default_model == 'anthropic' and user_settings.anthropic_api_key:
+                preferred = 'anthropic'
+            
+            if user_settings.openai_api_key:
+                eligible.append('openai')
+            if user_settings.anthropic_api_key:
+                eligible.append('anthropic')
+        
+        eligible.append('huggingface')
+        
+        # Les endpoints connus comme injoignables sont écartés
+        eligible = [name for name in eligible if self.is_provider_up(name, user_settings)]
+        
+        with self._wins_lock:
+            scores = dict(self.provider_scores)
+        # Tri stable : à score égal l'ordre historique est conservé
+        others = sorted((name for name in eligible if name != preferred), key=lambda name: -scores.get(name, 0.0))
+        return ([preferred] if preferred in eligible else []) + others
+    
+    def record_win(self, provider):
+        with self._wins_lock:
+            self.provider_wins[provider] = self.provider_wins.get(provider, 0) + 1
+            for name in self.provider_scores:
+                self.provider_scores[name] *= self.win_decay
+            self.provider_scores[provider] = self.provider_scores.get(provider, 0.0) + 1.0
+    
+    def get_race_executor(self):
+        if self._race_executor is None:
+            with self._executor_lock:
+                if self._race_executor is None:
+                    self._race_executor = ThreadPoolExecutor(
+                        max_workers=self.race_max_workers,
+                        thread_name_prefix='waveai-race'
+                    )
+        return self._race_executor
+    
+    def race_providers(self, candidates, message, agent_type, user_settings, history=None):
+        """Lance les N premiers providers en parallèle et garde la première bonne réponse"""
+        # Copie des réglages : les threads ne doivent pas toucher à la session SQLAlchemy
+        settings = snapshot_settings(user_settings)
+        executor = self.get_race_executor()
+        
+        futures = {}
+        for name in candidates[:self.race_width]:
+            futures[executor.submit(self.call_provider, name, message, agent_type, settings, history)] = name
+        
+        pending = set(futures)
+        deadline = time.monotonic() + self.race_timeout
+        winner = None
+        
+        while pending and not winner:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    logger.error(f"Erreur méthode IA ({futures[future]}): {e}")
+                    continue
+                if response and response.get('response'):
+                    winner = (futures[future], response)
+                    break
+        
+        # Les perdants sont annulés s'ils n'ont pas démarré, ignorés sinon
+        for future in pending:
+            future.cancel()
+        
+        if winner:
+            self.record_win(winner[0])
+            return winner[1]
+        
+        # Aucun coureur n'a répondu : on tente les providers restants un par un
+        for name in candidates[self.race_width:]:
+            try:
+                response = self.call_provider(name, message, agent_type, settings, history)
+                if response and response.get('response'):
+                    self.record_win(name)
+                    return response
+            except Exception as e:
+                logger.error(f"Erreur méthode IA: {e}")
+        return None
+    
+    def get_response(self, message, agent_type='kai', user_settings=None, history=None):
         if not message or not message.strip():
             agent = self.agents.get(agent_type, self.agents['kai'])
             return {
@@ -232,32 +577,141 @@ class WaveAISystem:
                 'timestamp': datetime.utcnow().isoformat()
             }
         
-        # Ordre des tentatives
-        methods = []
-        if user_settings:
-            if user_settings.default_model == 'openai' and user_settings.openai_api_key:
-                methods.append(self.get_openai_response)
-            elif user_settings.default_model == 'anthropic' and user_settings.anthropic_api_key:
-                methods.append(self.get_anthropic_response)
+        with CHAT_STAGE_SECONDS.time(stage='cache'):
+            # Cache des réponses (opt-in, contournable par utilisateur)
+            cache_args = self.get_cache_args(message, agent_type, user_settings, history)
+            cached = self.get_cached_response(cache_args)
             
-            if user_settings.openai_api_key and self.get_openai_response not in methods:
-                methods.append(self.get_openai_response)
-            if user_settings.anthropic_api_key and self.get_anthropic_response not in methods:
-                methods.append(self.get_anthropic_response)
+            # Puis une question similaire déjà traitée (reformulation d'une question fréquente)
+            semantic_args = None
+            if not cached:
+                semantic_args = self.get_semantic_args(message, agent_type, user_settings, history)
+                cached = self.get_semantic_response(semantic_args)
+        if cached:
+            return cached
         
-        methods.append(self.get_huggingface_response)
+        def fetch():
+            with CHAT_STAGE_SECONDS.time(stage='provider'):
+                result = self.get_provider_response(message, agent_type, user_settings, history)
+            self.store_cached_response(cache_args, result)
+            self.store_semantic_response(semantic_args, result)
+            return result
+        
+        if not self.coalesce:
+            return fetch()
+        # Requêtes identiques simultanées : un seul appel provider partagé
+        return dict(self.single_flight.do(self.coalesce_key(message, agent_type, user_settings, history), fetch))
+    
+    def coalesce_key(self, message, agent_type, user_settings, history=None):
+        """Clé de regroupement : tout ce qui influence la réponse, clés API comprises (jamais partagées)"""
+        settings = user_settings
+        parts = [
+            agent_type,
+            message,
+            history.fingerprint() if history else '',
+            settings.default_model if settings else '',
+            settings.temperature if settings else '',
+            settings.max_tokens if settings else '',
+            self.api_keys_scope(settings)
+        ]
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+    
+    def api_keys_scope(self, settings):
+        """Empreinte des clés API de l'utilisateur : une réponse payée avec ses clés ne sert qu'à lui"""
+        if not settings:
+            return ''
+        keys = (settings.openai_api_key, settings.anthropic_api_key, settings.huggingface_token)
+        return ':'.join(api_key_fingerprint(key) if key else '' for key in keys) if any(keys) else ''
+    
+    def get_cache_args(self, message, agent_type, user_settings, history=None):
+        """Arguments de clé du cache de réponses, ou None si le cache ne s'applique pas"""
+        if self.response_cache is None:
+            return None
+        if user_settings and user_settings.response_cache_enabled is False:
+            return None
+        return {
+            'agent': agent_type,
+            'model': user_settings.default_model if user_settings else 'huggingface',
+            'temperature': user_settings.temperature if user_settings else 0.7,
+            'message': message,
+            # Même question dans un autre contexte : autre réponse
+            'extra': history.fingerprint() if history else None,
+            'scope': self.api_keys_scope(user_settings)
+        }
+    
+    def cache_payload(self, response):
+        """Réponse sans ses champs de comptabilité (tokens, usage) : ni stockée ni renvoyée par les caches"""
+        return {key: value for key, value in response.items() if key not in INTERNAL_RESPONSE_FIELDS}
+    
+    def get_cached_response(self, cache_args):
+        if not cache_args:
+            return None
+        cached = self.response_cache.get(**cache_args)
+        if cached:
+            # Entrées stockées avant le filtrage (cache SQLite ou Redis persistant)
+            return dict(self.cache_payload(cached), cached=True, timestamp=datetime.utcnow().isoformat())
+        return None
+    
+    def store_cached_response(self, cache_args, response):
+        # Les réponses de secours ne sont jamais mises en cache
+        if cache_args and response['source'] not in ('fallback', 'default'):
+            self.response_cache.set(value=self.cache_payload(response), **cache_args)
+    
+    def get_semantic_args(self, message, agent_type, user_settings, history=None):
+        """Arguments du cache sémantique, ou None (désactivé, historique présent ou agent exclu)"""
+        if self.semantic_cache is None or history:
+            return None
+        if user_settings and user_settings.response_cache_enabled is False:
+            return None
+        agent = agent_registry.get(agent_type, default=False)
+        if agent is not None and not agent.semantic_cache:
+            return None
+        return {
+            'agent': agent_type,
+            'model': user_settings.default_model if user_settings else 'huggingface',
+            'temperature': user_settings.temperature if user_settings else 0.7,
+            'message': message,
+            'scope': self.api_keys_scope(user_settings)
+        }
+    
+    def get_semantic_response(self, semantic_args):
+        if not semantic_args:
+            return None
+        cached = self.semantic_cache.get(**semantic_args)
+        if cached:
+            return dict(self.cache_payload(cached), cached=True, timestamp=datetime.utcnow().isoformat())
+        return None
+    
+    def store_semantic_response(self, semantic_args, response):
+        if semantic_args and response['source'] not in ('fallback', 'default'):
+            self.semantic_cache.set(value=self.cache_payload(response), **semantic_args)
+    
+    def get_provider_response(self, message, agent_type, user_settings, history=None):
+        # Ordre des tentatives
+        candidates = self.get_provider_order(user_settings)
+        # Fallback ultime si aucun provider n'a répondu
+        response = (self.try_providers(candidates, message, agent_type, user_settings, history)
+                    or self.get_fallback_response(agent_type))
+        self.record_fallback_depth(candidates, response)
+        return response
+    
+    def try_providers(self, candidates, message, agent_type, user_settings, history=None):
+        if self.race_mode and len(candidates) > 1:
+            return self.race_providers(candidates, message, agent_type, user_settings, history)
         
         # Essayer chaque méthode
-        for method in methods:
+        for name in candidates:
             try:
-                response = method(message, agent_type, user_settings)
+                response = self.call_provider(name, message, agent_type, user_settings, history)
                 if response and response.get('response'):
+                    self.record_win(name)
                     return response
             except Exception as e:
                 logger.error(f"Erreur méthode IA: {e}")
                 continue
-        
-        # Fallback ultime
+        return None
+    
+    def get_fallback_response(self, agent_type):
         agent = self.agents.get(agent_type, self.agents['kai'])
         return {
             'response': f"Je suis {agent['name']} {agent['emoji']}. Désolé, je rencontre des difficultés techniques. Pouvez-vous reformuler votre question ?",
@@ -265,8 +719,125 @@ class WaveAISystem:
             'agent': agent_type,
             'timestamp': datetime.utcnow().isoformat()
         }
+    
+    # Streaming token par token
+    def stream_openai_response(self, message, agent_type, settings, history=None):
+        import openai
+        params = self.generation_params(settings)
+        
+        stream = openai.ChatCompletion.create(
+            api_key=settings.openai_api_key,
+            model="gpt-3.5-turbo",
+            messages=self.build_chat_messages(message, agent_type, history),
+            max_tokens=params['max_tokens'],
+            temperature=params['temperature'],
+            stream=True
+        )
+        for chunk in stream:
+            text = chunk.choices[0].delta.get('content')
+            if text:
+                yield text
+    
+    def stream_anthropic_response(self, message, agent_type, settings, history=None):
+        client = get_anthropic_client(settings.anthropic_api_key)
+        params = self.generation_params(settings)
+        
+        stream = client.completions.create(
+            model="claude-instant-1.2",
+            max_tokens_to_sample=params['max_tokens'],
+            temperature=params['temperature'],
+            prompt=self.build_anthropic_prompt(message, agent_type, history),
+            stream=True
+        )
+        for completion in stream:
+            if completion.completion:
+                yield completion.completion
+    
+    def build_ollama_payload(self, message, agent_type, settings, stream=False, history=None):
+        return {
+            "model": self.ollama_model,
+            "prompt": self.build_text_prompt(message, agent_type, history),
+            "stream": stream,
+            "options": {
+                "temperature": settings.temperature if settings else 0.7,
+                "num_predict": settings.max_tokens if settings else 1000
+            }
+        }
+    
+    def stream_ollama_response(self, message, agent_type, settings, history=None):
+        payload = self.build_ollama_payload(message, agent_type, settings, stream=True, history=history)
+        with get_session('ollama').post(f"{self.ollama_url}/api/generate", json=payload, stream=True, timeout=(3, 60)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('response'):
+                    yield chunk['response']
+                if chunk.get('done'):
+                    break
+    
+    def get_stream_order(self, user_settings):
+        """Providers streamables dans l'ordre habituel, Ollama juste avant Hugging Face"""
+        streamers = {
+            'openai': self.stream_openai_response,
+            'anthropic': self.stream_anthropic_response
+        }
+        order = []
+        for name in self.get_provider_order(user_settings):
+            if name == 'huggingface':
+                if user_settings and user_settings.use_ollama and self.check_ollama_availability():
+                    order.append(('ollama', self.stream_ollama_response))
+            elif name in streamers:
+                order.append((name, streamers[name]))
+        return order
+    
+    def stream_response(self, message, agent_type='kai', user_settings=None, history=None):
+        """Génère ('token', texte) au fil de l'eau puis ('done', réponse complète)"""
+        for name, streamer in self.get_stream_order(user_settings):
+            breaker = self.breaker_name(name, user_settings)
+            if not self.provider_budget_ok(name) or not breakers.allow(breaker):
+                continue
+            parts = []
+            started = time.monotonic()
+            try:
+                for text in streamer(message, agent_type, user_settings, history):
+                    parts.append(text)
+                    yield 'token', text
+            except Exception as e:
+                logger.error(f"Erreur streaming {name}: {e}")
+                # Échec avant le premier token : on passe au provider suivant
+                if not parts:
+                    breakers.record(breaker, False, name, time.monotonic() - started, error=e)
+                    observe_provider_call(name, time.monotonic() - started, False)
+                    continue
+            
+            full_text = ''.join(parts).strip()
+            elapsed = time.monotonic() - started
+            breakers.record(breaker, bool(full_text), name, elapsed)
+            observe_provider_call(name, elapsed, bool(full_text))
+            if full_text:
+                self.record_win(name)
+                response = self.make_response(full_text, name, agent_type)
+                self.record_usage(name, message, agent_type, history, response)
+                yield 'done', response
+                return
+        
+        # Pas de streaming possible : réponse complète envoyée d'un bloc
+        response = self.get_huggingface_response(message, agent_type, user_settings)
+        if response and response.get('response'):
+            self.record_win('huggingface')
+        else:
+            response = self.get_fallback_response(agent_type)
+        yield 'token', response['response']
+        yield 'done', response
 
 ai_system = WaveAISystem()
+configure_openai()
+
+# Rafraîchissement périodique de la santé des providers
+if os.environ.get('WAVEAI_HEALTH_BACKGROUND', 'true').lower() == 'true':
+    health_registry.start()
 
 # Fonctions utilitaires
 def validate_email(email):
@@ -276,16 +847,91 @@ def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None and len(email) <= 120
 
+def snapshot_settings(settings):
+    if not settings:
+        return None
+    return SimpleNamespace(**{column.name: getattr(settings, column.name, None) for column in AISettings.__table__.columns})
+
+def snapshot_model(instance):
+    """Copie en lecture seule des colonnes, partageable entre requêtes et threads"""
+    return SimpleNamespace(**{column.name: getattr(instance, column.name, None) for column in instance.__table__.columns})
+
+def attach_snapshot(model, snapshot):
+    """Rattache une copie en cache à la session courante sans requête (merge load=False)"""
+    instance = model(**vars(snapshot))
+    make_transient_to_detached(instance)
+    return db.session.merge(instance, load=False)
+
+def load_user(user_id):
+    """User de la session, servi depuis le cache tant qu'il n'a pas été modifié"""
+    cached = model_cache.get('user', user_id)
+    if cached is not None:
+        return attach_snapshot(User, cached)
+    user = User.query.get(user_id)
+    if user:
+        model_cache.set('user', user_id, snapshot_model(user))
+    return user
+
+@CHAT_STAGE_SECONDS.time(stage='settings')
+def get_settings_snapshot(user_id):
+    """Paramètres IA en lecture seule pour le chat : aucune requête tant que le cache est valide"""
+    cached = model_cache.get('settings', user_id)
+    if cached is not None:
+        return cached
+    return snapshot_settings(get_user_settings(user_id))
+
+# Requêtes du chemin chaud : construites ici, exécutées par les routes et vérifiées par explain-hot-queries
+def settings_query(user_id):
+    return AISettings.query.filter_by(user_id=user_id)
+
+def active_conversation_query(user_id, agent_type, since):
+    return (Conversation.query
+            .filter(Conversation.user_id == user_id,
+                    Conversation.agent_type == agent_type,
+                    Conversation.updated_at >= since,
+                    # Ancien blob pas encore converti : jamais repris (ses messages seraient mélangés)
+                    Conversation.messages.is_(None))
+            .order_by(Conversation.updated_at.desc()))
+
+def conversation_list_query(user_id, agent_type=None):
+    """Projection des conversations (sans les messages), paginée par keyset_page"""
+    query = db.session.query(Conversation.id, Conversation.agent_type, Conversation.title,
+                             Conversation.created_at, Conversation.updated_at) \
+                      .filter(Conversation.user_id == user_id)
+    if agent_type:
+        query = query.filter(Conversation.agent_type == agent_type)
+    return query
+
+def conversation_messages_query(conversation_id):
+    return Message.query.filter_by(conversation_id=conversation_id)
+
+def latest_messages_query(conversation_id):
+    return conversation_messages_query(conversation_id).order_by(Message.created_at.desc(), Message.id.desc())
+
+def user_stats_query(user_id):
+    return UserStats.query.filter_by(user_id=user_id)
+
 def get_user_settings(user_id):
     try:
-        settings = AISettings.query.filter_by(user_id=user_id).first()
-        if not settings:
-            settings = AISettings(user_id=user_id)
-            db.session.add(settings)
-            db.session.commit()
+        cached = model_cache.get('settings', user_id)
+        if cached is not None:
+            return attach_snapshot(AISettings, cached)
+        with DB_SECONDS.time(operation='get_user_settings'):
+            settings = settings_query(user_id).first()
+            if not settings:
+                settings = AISettings(user_id=user_id)
+                db.session.add(settings)
+                try:
+                    db.session.commit()
+                except IntegrityError:
+                    # Créée entre-temps par une requête concurrente (index unique sur user_id)
+                    db.session.rollback()
+                    settings = settings_query(user_id).first()
+        model_cache.set('settings', user_id, snapshot_settings(settings))
         return settings
     except Exception as e:
         logger.error(f"Erreur get_user_settings: {e}")
+        db.session.rollback()
         return None
 
 # Routes
@@ -323,6 +969,8 @@ def login():
             
             user.last_login = datetime.utcnow()
             db.session.commit()
+            model_cache.invalidate('user', user.id)
+            model_cache.invalidate('settings', user.id)
             
             session['user_id'] = user.id
             session['user_email'] = user.email
@@ -351,21 +999,29 @@ def dashboard():
         return redirect(url_for('login'))
     
     try:
-        user = User.query.get(session['user_id'])
+        user = load_user(session['user_id'])
         if not user:
             session.clear()
             return redirect(url_for('login'))
         
+        user_stats = user_stats_query(user.id).first()
+        last_activity = (user_stats.last_activity if user_stats and user_stats.last_activity else None) or user.last_login
         stats = {
-            'total_conversations': Conversation.query.filter_by(user_id=user.id).count(),
-            'agents_used': db.session.query(Conversation.agent_type).filter_by(user_id=user.id).distinct().count(),
-            'last_activity': user.last_login.strftime('%d/%m/%Y à %H:%M') if user.last_login else 'Première connexion',
+            'total_conversations': user_stats.total_conversations if user_stats else 0,
+            'agents_used': len(user_stats.get_agent_counts()) if user_stats else 0,
+            'last_activity': last_activity.strftime('%d/%m/%Y à %H:%M') if last_activity else 'Première connexion',
             'account_age': (datetime.utcnow() - user.created_at).days if user.created_at else 0
         }
         
+        # Budgets : quota du jour (mémoire, relu en base au plus toutes les WAVEAI_QUOTA_FLUSH_INTERVAL s) et débit
+        budget = dict(quota_tracker.usage(user.id),
+                      rate=rate_limiter.describe('user'),
+                      rate_remaining=rate_limiter.remaining('user', user.id))
+        
         return render_template('dashboard.html', 
                              user=user, 
                              stats=stats, 
+                             budget=budget, 
                              agents=ai_system.agents,
                              ollama_available=ai_system.check_ollama_availability())
     except Exception as e:
@@ -379,7 +1035,7 @@ def ai_settings():
         return redirect(url_for('login'))
     
     try:
-        user = User.query.get(session['user_id'])
+        user = load_user(session['user_id'])
         if not user:
             return redirect(url_for('login'))
         
@@ -392,6 +1048,7 @@ def ai_settings():
                 settings.huggingface_token = request.form.get('huggingface_token', '').strip()
                 settings.default_model = request.form.get('default_model', 'huggingface')
                 settings.use_ollama = 'use_ollama' in request.form
+                settings.response_cache_enabled = 'response_cache_enabled' in request.form
                 
                 try:
                     temp = float(request.form.get('temperature', 0.7))
@@ -407,6 +1064,7 @@ def ai_settings():
                 
                 settings.updated_at = datetime.utcnow()
                 db.session.commit()
+                model_cache.invalidate('settings', user.id)
                 
                 flash('Paramètres IA mis à jour ! 🤖', 'success')
                 return redirect(url_for('dashboard'))
@@ -432,55 +1090,547 @@ def chat(agent_type):
     agent = ai_system.agents[agent_type]
     return render_template('chat.html', agent=agent, agent_type=agent_type)
 
+def validate_chat_payload(data):
+    """Valide un corps de requête chat : (message, agent, conversation, erreur)"""
+    if not data:
+        return None, None, None, 'Données manquantes'
+    
+    message = (data.get('message') or '').strip()
+    agent_type = data.get('agent', 'kai')
+    
+    if not message:
+        return None, None, None, 'Message vide'
+    
+    if len(message) > 5000:
+        return None, None, None, 'Message trop long'
+    
+    try:
+        conversation_id = int(data['conversation_id']) if data.get('conversation_id') else None
+    except (TypeError, ValueError):
+        return None, None, None, 'Conversation invalide'
+    
+    return message, agent_type, conversation_id, None
+
+def parse_chat_request():
+    message, agent_type, conversation_id, error = validate_chat_payload(request.get_json(silent=True))
+    if error:
+        return None, None, None, (jsonify({'error': error}), 400)
+    return message, agent_type, conversation_id, None
+
+CONVERSATION_IDLE_MINUTES = int(os.environ.get('WAVEAI_CONVERSATION_IDLE_MINUTES', 30))
+
+def find_active_conversation(user_id, agent_type, conversation_id=None):
+    """Conversation demandée, sinon la plus récente encore active avec cet agent"""
+    conversation = None
+    if conversation_id:
+        # Écriture différée : la conversation peut encore attendre son INSERT
+        if transcript_buffer.enabled:
+            conversation = transcript_buffer.pending_conversation(conversation_id, user_id, agent_type)
+        if conversation is None:
+            conversation = (Conversation.query
+                            .filter_by(id=conversation_id, user_id=user_id, agent_type=agent_type, messages=None)
+                            .first())
+    
+    if conversation is None:
+        since = datetime.utcnow() - timedelta(minutes=CONVERSATION_IDLE_MINUTES)
+        if transcript_buffer.enabled:
+            conversation = transcript_buffer.latest_conversation(user_id, agent_type, since)
+    
+    if conversation is None:
+        conversation = active_conversation_query(user_id, agent_type, since).first()
+    return conversation
+
+def conversation_title(message):
+    return message[:100] + ('...' if len(message) > 100 else '')
+
+# Premiers messages simultanés d'un utilisateur à un agent : une seule conversation créée.
+# Verrous du processus (SQLite, tampon d'écriture) et verrou de la ligne users en PostgreSQL (plusieurs workers)
+CONVERSATION_LOCKS = [threading.Lock() for _ in range(64)]
+
+def conversation_lock(user_id, agent_type):
+    return CONVERSATION_LOCKS[hash((user_id, agent_type)) % len(CONVERSATION_LOCKS)]
+
+def get_or_create_conversation(user_id, agent_type, message, conversation_id=None):
+    """Renvoie (conversation, créée) ; appelé sous conversation_lock, verrou de ligne gardé jusqu'au commit"""
+    db.session.query(User.id).filter_by(id=user_id).with_for_update().first()
+    conversation = find_active_conversation(user_id, agent_type, conversation_id)
+    if conversation is not None:
+        return conversation, False
+    
+    conversation = Conversation(
+        user_id=user_id,
+        agent_type=agent_type,
+        title=conversation_title(message)
+    )
+    db.session.add(conversation)
+    db.session.flush()
+    return conversation, True
+
+def get_user_stats(user_id, lock=False):
+    query = user_stats_query(user_id)
+    if lock:
+        # Verrou de ligne (PostgreSQL) : les compteurs JSON ne perdent pas d'incrément
+        query = query.with_for_update()
+    stats = query.first()
+    if stats is None:
+        stats = UserStats(user_id=user_id, total_conversations=0, total_messages=0, agent_counts='{}')
+        db.session.add(stats)
+    return stats
+
+def record_user_activity(user_id, agent_type, new_conversation, message_count, when):
+    """Mise à jour incrémentale des statistiques, dans la transaction de l'écriture"""
+    stats = get_user_stats(user_id, lock=True)
+    stats.total_messages = (stats.total_messages or 0) + message_count
+    if new_conversation:
+        stats.total_conversations = (stats.total_conversations or 0) + 1
+        counts = stats.get_agent_counts()
+        counts[agent_type] = counts.get(agent_type, 0) + 1
+        stats.agent_counts = json.dumps(counts)
+    stats.last_activity = when
+
+@CHAT_STAGE_SECONDS.time(stage='save')
+@DB_SECONDS.time(operation='save_conversation')
+def save_conversation(user_id, agent_type, message, response, conversation_id=None):
+    """Ajoute l'échange à la conversation et renvoie son id (None en cas d'erreur)"""
+    # Tous les chemins de chat (sync, streaming, tâches, ASGI) passent par ici
+    observe_response(response)
+    if transcript_buffer.enabled:
+        return buffer_conversation(user_id, agent_type, message, response, conversation_id)
+    try:
+        with conversation_lock(user_id, agent_type):
+            conversation, created = get_or_create_conversation(user_id, agent_type, message, conversation_id)
+            now = datetime.utcnow()
+            
+            db.session.add(Message(conversation_id=conversation.id, role='user', content=message, created_at=now))
+            db.session.add(Message(conversation_id=conversation.id, role='assistant', content=response['response'],
+                                   source=response['source'], created_at=now))
+            conversation.updated_at = now
+            record_user_activity(user_id, agent_type, created, 2, now)
+            conversation_id = conversation.id
+            db.session.commit()
+        charge_chat_usage(user_id, response)
+        return conversation_id
+    except Exception as e:
+        logger.error(f"Erreur sauvegarde conversation: {e}")
+        db.session.rollback()
+        return None
+
+def buffer_conversation(user_id, agent_type, message, response, conversation_id=None):
+    """Écriture différée : l'id de la conversation est connu tout de suite, le commit se fait par lots"""
+    try:
+        # La conversation créée est visible des requêtes suivantes dès submit (tampon du processus)
+        with conversation_lock(user_id, agent_type):
+            conversation = find_active_conversation(user_id, agent_type, conversation_id)
+            created = conversation is None
+            conversation_id = conversation_ids.allocate() if created else conversation.id
+            transcript_buffer.submit({
+                'user_id': user_id,
+                'agent_type': agent_type,
+                'conversation_id': conversation_id,
+                'new_conversation': created,
+                'title': conversation_title(message),
+                'created_at': datetime.utcnow().isoformat(),
+                'messages': [
+                    {'role': 'user', 'content': message, 'source': None},
+                    {'role': 'assistant', 'content': response['response'], 'source': response['source']}
+                ]
+            })
+        charge_chat_usage(user_id, response)
+        return conversation_id
+    except Exception as e:
+        logger.error(f"Erreur mise en tampon conversation: {e}")
+        db.session.rollback()
+        return None
+
+@DB_SECONDS.time(operation='transcript_flush')
+def write_transcripts(entries):
+    """Un lot d'échanges en une transaction : conversations créées, messages, dates et statistiques"""
+    with app.app_context():
+        try:
+            conversations = Conversation.__table__
+            remap = {}
+            created = [entry for entry in entries if entry['new_conversation']]
+            if created:
+                # Id déjà pris (échange mis de côté puis rejoué, compteur SQLite) : nouvel id
+                taken = {row[0] for row in db.session.query(Conversation.id)
+                         .filter(Conversation.id.in_([entry['conversation_id'] for entry in created]))}
+                for conversation_id in taken:
+                    remap[conversation_id] = conversation_ids.allocate()
+                db.session.execute(conversations.insert(), [{
+                    'id': remap.get(entry['conversation_id'], entry['conversation_id']),
+                    'user_id': entry['user_id'],
+                    'agent_type': entry['agent_type'],
+                    'title': entry['title'],
+                    'created_at': datetime.fromisoformat(entry['created_at']),
+                    'updated_at': datetime.fromisoformat(entry['created_at'])
+                } for entry in created])
+            
+            rows, last_update, activity = [], {}, {}
+            for entry in entries:
+                conversation_id = remap.get(entry['conversation_id'], entry['conversation_id'])
+                when = datetime.fromisoformat(entry['created_at'])
+                rows.extend({'conversation_id': conversation_id, 'role': message['role'], 'content': message['content'],
+                             'source': message['source'], 'created_at': when, 'updated_at': when}
+                            for message in entry['messages'])
+                last_update[conversation_id] = max(when, last_update.get(conversation_id, when))
+                user = activity.setdefault(entry['user_id'], {'messages': 0, 'agents': {}, 'last': when})
+                user['messages'] += len(entry['messages'])
+                user['last'] = max(user['last'], when)
+                if entry['new_conversation']:
+                    user['agents'][entry['agent_type']] = user['agents'].get(entry['agent_type'], 0) + 1
+            
+            db.session.execute(Message.__table__.insert(), rows)
+            db.session.execute(conversations.update()
+                               .where(conversations.c.id == db.bindparam('conversation'))
+                               .values(updated_at=db.bindparam('when')),
+                               [{'conversation': conversation_id, 'when': when}
+                                for conversation_id, when in last_update.items()])
+            
+            # Une mise à jour de user_stats par utilisateur du lot, pas par échange
+            for user_id, user in activity.items():
+                stats = get_user_stats(user_id, lock=True)
+                stats.total_messages = (stats.total_messages or 0) + user['messages']
+                if user['agents']:
+                    stats.total_conversations = (stats.total_conversations or 0) + sum(user['agents'].values())
+                    counts = stats.get_agent_counts()
+                    for agent_type, count in user['agents'].items():
+                        counts[agent_type] = counts.get(agent_type, 0) + count
+                    stats.agent_counts = json.dumps(counts)
+                if stats.last_activity is None or user['last'] > stats.last_activity:
+                    stats.last_activity = user['last']
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+# Écriture différée des échanges (WAVEAI_TRANSCRIPT_WRITE=buffered), écrite aussi à l'arrêt du processus
+conversation_ids = ConversationIdAllocator(app, db)
+transcript_buffer = TranscriptBuffer(write_transcripts)
+register_shutdown(transcript_buffer)
+
+def get_conversation_messages(conversation_id, limit=None):
+    """Derniers messages d'une conversation dans l'ordre chronologique (requête indexée)"""
+    query = latest_messages_query(conversation_id)
+    if limit:
+        query = query.limit(limit)
+    return list(reversed(query.all()))
+
+@CHAT_STAGE_SECONDS.time(stage='history')
+def load_chat_context(user_id, agent_type, message, conversation_id, settings):
+    """Conversation à poursuivre et fenêtre d'historique à injecter dans le prompt"""
+    try:
+        conversation = find_active_conversation(user_id, agent_type, conversation_id)
+        if conversation is None:
+            return conversation_id, None
+        turns = [(entry.role, entry.content) for entry in get_conversation_messages(conversation.id, HISTORY_MAX_TURNS)]
+        if transcript_buffer.enabled:
+            # Échanges pas encore écrits en base : plus récents que ceux relus
+            turns = (turns + transcript_buffer.pending_turns(conversation.id))[-HISTORY_MAX_TURNS:]
+        return conversation.id, ai_system.build_history(turns, agent_type, message, settings)
+    except Exception as e:
+        logger.error(f"Erreur chargement historique: {e}")
+        return conversation_id, None
+
+def release_connection():
+    """Rend la connexion au pool avant l'appel provider : elle n'est pas gardée pendant des secondes de génération"""
+    try:
+        db.session.close()
+    except Exception as e:
+        logger.error(f"Erreur libération connexion: {e}")
+
+def run_chat_job(payload):
+    """Traitement d'une tâche de chat par un worker (hors requête HTTP)"""
+    with app.app_context():
+        user_id = payload['user_id']
+        message = payload['message']
+        agent_type = payload['agent_type']
+        settings = get_settings_snapshot(user_id)
+        conversation_id, history = load_chat_context(user_id, agent_type, message, payload.get('conversation_id'), settings)
+        release_connection()
+        
+        response = ai_system.get_response(message, agent_type, settings, history)
+        
+        conversation_id = save_conversation(user_id, agent_type, message, response, conversation_id)
+        return dict(response, conversation_id=conversation_id)
+
+def build_job_queue():
+    """File choisie par WAVEAI_JOB_QUEUE : memory (défaut) ou database (reprise après redémarrage)"""
+    if os.environ.get('WAVEAI_JOB_QUEUE', 'memory').lower() == 'database':
+        store = DatabaseJobStore(app, db, ChatJob)
+    else:
+        store = MemoryJobStore()
+    return JobQueue(store, run_chat_job)
+
+job_queue = build_job_queue()
+
+# Quotas journaliers persistés dans user_usage
+quota_tracker.store = DatabaseQuotaStore(app, db, UserUsage)
+
+def check_chat_limits(user_id, ip):
+    """Quota du jour puis seaux utilisateur et IP : (erreur, Retry-After) ou None si la requête passe"""
+    retry_after = quota_tracker.check(user_id)
+    if retry_after:
+        return {
+            'error': 'Quota journalier atteint, il sera renouvelé à minuit (UTC)',
+            'scope': 'daily_quota',
+            'retry_after': retry_after,
+            'usage': quota_tracker.usage(user_id)
+        }, retry_after
+    for scope, key in (('user', user_id), ('ip', ip)):
+        retry_after = rate_limiter.hit(scope, key)
+        if retry_after:
+            retry_after = max(1, math.ceil(retry_after))
+            return {
+                'error': 'Trop de requêtes, réessayez dans quelques secondes',
+                'scope': scope,
+                'retry_after': retry_after
+            }, retry_after
+    return None
+
+def rate_limited_response(limit):
+    payload, retry_after = limit
+    response = jsonify(payload)
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def charge_chat_usage(user_id, response):
+    """Une requête et ses tokens au quota du jour ; réponses en cache ou de secours : aucun token"""
+    tokens = 0
+    if not response.get('cached') and response.get('source') not in ('fallback', 'default'):
+        tokens = response.get('tokens') or 0
+    quota_tracker.add(user_id, requests=1, tokens=tokens)
+
+def serialize_job(job):
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'result': job['result'],
+        'error': job['error'],
+        'created_at': job['created_at'].isoformat() if job['created_at'] else None,
+        'started_at': job['started_at'].isoformat() if job['started_at'] else None,
+        'finished_at': job['finished_at'].isoformat() if job['finished_at'] else None
+    }
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @app.route('/api/chat', methods=['POST'])
 def api_chat():
     if 'user_id' not in session:
         return jsonify({'error': 'Non connecté'}), 401
     
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'Données manquantes'}), 400
+        message, agent_type, conversation_id, error = parse_chat_request()
+        if error:
+            return error
+        
+        user_id = session['user_id']
+        limit = check_chat_limits(user_id, request.remote_addr)
+        if limit:
+            return rate_limited_response(limit)
+        
+        # Mode asynchrone : le worker web rend la main immédiatement
+        if request.args.get('async') == '1':
+            job_id = job_queue.enqueue(user_id, {
+                'user_id': user_id,
+                'message': message,
+                'agent_type': agent_type,
+                'conversation_id': conversation_id
+            })
+            return jsonify({
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': url_for('api_job', job_id=job_id)
+            }), 202
+        
+        settings = get_settings_snapshot(user_id)
+        conversation_id, history = load_chat_context(user_id, agent_type, message, conversation_id, settings)
+        release_connection()
         
-        message = data.get('message', '').strip()
-        agent_type = data.get('agent', 'kai')
+        response = ai_system.get_response(message, agent_type, settings, history)
         
-        if not message:
-            return jsonify({'error': 'Message vide'}), 400
+        conversation_id = save_conversation(user_id, agent_type, message, response, conversation_id)
         
-        if len(message) > 5000:
-            return jsonify({'error': 'Message trop long'}), 400
+        return jsonify(dict(response, conversation_id=conversation_id))
         
+    except Exception as e:
+        logger.error(f"Erreur API chat: {e}")
+        return jsonify({'error': 'Erreur interne'}), 500
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Non connecté'}), 401
+    
+    try:
+        job = job_queue.get(job_id)
+        # Tâche d'un autre utilisateur : même réponse qu'une tâche inexistante
+        if job is None or job['user_id'] != session['user_id']:
+            return jsonify({'error': 'Tâche introuvable'}), 404
+        return jsonify(serialize_job(job))
+    except Exception as e:
+        logger.error(f"Erreur API job: {e}")
+        return jsonify({'error': 'Erreur interne'}), 500
+
+def not_modified(etag):
+    """304 si le client a déjà cette version (If-None-Match), sans exécuter la requête de la page"""
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return None
+
+def page_response(data, etag):
+    response = jsonify(data)
+    response.set_etag(etag)
+    # Propre à l'utilisateur, revalidé à chaque affichage
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/api/conversations')
+def api_conversations():
+    """Conversations de l'utilisateur, plus récentes d'abord, sans le contenu des messages"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Non connecté'}), 401
+    
+    try:
         user_id = session['user_id']
-        settings = get_user_settings(user_id)
+        agent_type = request.args.get('agent') or None
+        cursor = request.args.get('cursor') or None
+        limit = parse_limit(request.args.get('limit'))
         
-        response = ai_system.get_response(message, agent_type, settings)
+        # Toute nouvelle conversation ou tout nouveau message met à jour user_stats (une ligne indexée)
+        stats = user_stats_query(user_id).with_entities(UserStats.total_conversations, UserStats.last_activity).first()
+        etag = etag_for('conversations', user_id, stats and stats.total_conversations,
+                        stats and stats.last_activity, agent_type, cursor, limit)
+        cached = not_modified(etag)
+        if cached:
+            return cached
         
-        try:
-            conversation_data = {
-                'user_message': message,
-                'agent_response': response['response'],
-                'timestamp': response['timestamp'],
-                'source': response['source']
-            }
-            
-            conversation = Conversation(
-                user_id=user_id,
-                agent_type=agent_type,
-                title=message[:100] + ('...' if len(message) > 100 else ''),
-                messages=json.dumps([conversation_data])
-            )
-            db.session.add(conversation)
-            db.session.commit()
-        except Exception as e:
-            logger.error(f"Erreur sauvegarde conversation: {e}")
+        rows, next_cursor = keyset_page(conversation_list_query(user_id, agent_type),
+                                        Conversation.created_at, Conversation.id, cursor, limit)
         
-        return jsonify(response)
+        return page_response({
+            'conversations': [{
+                'id': row.id,
+                'agent_type': row.agent_type,
+                'title': row.title,
+                'created_at': row.created_at.isoformat() if row.created_at else None,
+                'updated_at': row.updated_at.isoformat() if row.updated_at else None,
+                'messages_url': url_for('api_conversation_messages', conversation_id=row.id)
+            } for row in rows],
+            'next_cursor': next_cursor
+        }, etag)
+    except InvalidCursor:
+        return jsonify({'error': 'Curseur invalide'}), 400
+    except Exception as e:
+        logger.error(f"Erreur API conversations: {e}")
+        return jsonify({'error': 'Erreur interne'}), 500
+
+@app.route('/api/conversations/<int:conversation_id>/messages')
+def api_conversation_messages(conversation_id):
+    """Messages d'une conversation par pages : order=desc (défaut, remonter l'historique) ou asc"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Non connecté'}), 401
+    
+    try:
+        conversation = db.session.query(Conversation.id, Conversation.updated_at) \
+                                 .filter_by(id=conversation_id, user_id=session['user_id']).first()
+        # Conversation d'un autre utilisateur : même réponse qu'une conversation inexistante
+        if conversation is None:
+            return jsonify({'error': 'Conversation introuvable'}), 404
+        
+        cursor = request.args.get('cursor') or None
+        limit = parse_limit(request.args.get('limit'))
+        descending = request.args.get('order', 'desc') != 'asc'
         
+        # Chaque échange sauvegardé met à jour conversations.updated_at
+        etag = etag_for('messages', conversation.id, conversation.updated_at, cursor, limit, descending)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        rows, next_cursor = keyset_page(conversation_messages_query(conversation.id),
+                                        Message.created_at, Message.id, cursor, limit, descending)
+        return page_response({
+            'conversation_id': conversation.id,
+            'messages': [row.to_dict() for row in rows],
+            'next_cursor': next_cursor
+        }, etag)
+    except InvalidCursor:
+        return jsonify({'error': 'Curseur invalide'}), 400
     except Exception as e:
-        logger.error(f"Erreur API chat: {e}")
+        logger.error(f"Erreur API messages: {e}")
         return jsonify({'error': 'Erreur interne'}), 500
 
+message_search = MessageSearch(db)
+
+@app.route('/api/search')
+def api_search():
+    """Recherche plein texte dans l'historique : messages classés par pertinence, extraits surlignés"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Non connecté'}), 401
+    
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'error': 'Paramètre q requis'}), 400
+    
+    try:
+        started = time.perf_counter()
+        with DB_SECONDS.time(operation='search'):
+            results = message_search.search(session['user_id'], query, request.args.get('agent') or None,
+                                            parse_limit(request.args.get('limit')))
+        return jsonify({
+            'query': query,
+            'results': results,
+            'engine': message_search.backend(),
+            'took_ms': round((time.perf_counter() - started) * 1000, 2)
+        })
+    except Exception as e:
+        logger.error(f"Erreur API recherche: {e}")
+        db.session.rollback()
+        return jsonify({'error': 'Erreur interne'}), 500
+
+@app.route('/api/chat/stream', methods=['POST'])
+def api_chat_stream():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Non connecté'}), 401
+    
+    message, agent_type, conversation_id, error = parse_chat_request()
+    if error:
+        return error
+    
+    user_id = session['user_id']
+    limit = check_chat_limits(user_id, request.remote_addr)
+    if limit:
+        return rate_limited_response(limit)
+    
+    settings = get_settings_snapshot(user_id)
+    conversation_id, history = load_chat_context(user_id, agent_type, message, conversation_id, settings)
+    # Le flux peut durer longtemps : aucune connexion gardée d'ici la sauvegarde finale
+    release_connection()
+    
+    def generate():
+        try:
+            for event, payload in ai_system.stream_response(message, agent_type, settings, history):
+                if event == 'token':
+                    yield sse_event('token', {'text': payload})
+                else:
+                    # Sauvegarde une fois le flux terminé
+                    saved_id = save_conversation(user_id, agent_type, message, payload, conversation_id)
+                    yield sse_event('done', dict(payload, conversation_id=saved_id))
+        except Exception as e:
+            logger.error(f"Erreur API chat stream: {e}")
+            yield sse_event('error', {'error': 'Erreur interne'})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/status')
 def api_status():
     try:
@@ -493,12 +1643,103 @@ def api_status():
                 'ollama_local': ai_system.check_ollama_availability(),
                 'database': True
             },
+            'db_pool': pool_status(db.engine),
+            'providers': {
+                'race_mode': ai_system.race_mode,
+                'wins': dict(ai_system.provider_wins),
+                'health': health_registry.snapshot(),
+                'pools': pool_stats()
+            },
+            'response_cache': response_cache.stats() if response_cache else {'enabled': False},
+            'semantic_cache': semantic_cache.stats() if semantic_cache else {'enabled': False},
+            'model_cache': model_cache.stats(),
+            'jobs': job_queue.stats(),
+            'coalescing': ai_system.single_flight.stats(),
+            'rate_limits': rate_limiter.stats(),
+            'transcripts': transcript_buffer.stats(),
+            'quotas': quota_tracker.stats(),
             'timestamp': datetime.utcnow().isoformat()
         })
     except Exception as e:
         logger.error(f"Erreur status: {e}")
         return jsonify({'error': 'Erreur status'}), 500
 
+@app.route('/api/status/providers')
+def api_status_providers():
+    """État détaillé des providers : santé, disjoncteurs et timeouts adaptatifs"""
+    try:
+        health = health_registry.snapshot()
+        return jsonify({
+            'health': health,
+            'breakers': breakers.snapshot(),
+            'timeouts': {name: breakers.timeout(name, None) for name in health},
+            'race_mode': ai_system.race_mode,
+            'wins': dict(ai_system.provider_wins),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    except Exception as e:
+        logger.error(f"Erreur status providers: {e}")
+        return jsonify({'error': 'Erreur status'}), 500
+
+# Métriques Prometheus
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    started = g.pop('request_started', None)
+    if METRICS_ENABLED and started is not None:
+        HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or 'unknown',
+                             method=request.method, status=response.status_code)
+    return response
+
+@metrics.collector
+def collect_runtime_metrics():
+    """Caches, regroupement, tâches et disjoncteurs lus dans leurs stats au moment de la collecte"""
+    caches = {
+        'response': response_cache.stats() if response_cache else None,
+        'semantic': semantic_cache.stats() if semantic_cache else None,
+        'model': model_cache.stats()
+    }
+    caches = {name: stats for name, stats in caches.items() if stats}
+    coalescing = ai_system.single_flight.stats()
+    transcripts = transcript_buffer.stats()
+    db_pool = pool_status(db.engine)
+    breaker_states = {}
+    for state in breakers.snapshot().values():
+        breaker_states[state['state']] = breaker_states.get(state['state'], 0) + 1
+    return [
+        ('waveai_cache_lookups_total', 'counter', 'Lectures des caches par résultat',
+         [({'cache': name, 'result': result}, stats[key]) for name, stats in caches.items()
+          for result, key in (('hit', 'hits'), ('miss', 'misses'))]),
+        ('waveai_cache_hit_ratio', 'gauge', 'Part des lectures servies par le cache',
+         [({'cache': name}, stats['hits'] / (stats['hits'] + stats['misses']) if stats['hits'] + stats['misses'] else 0.0)
+          for name, stats in caches.items()]),
+        ('waveai_coalesced_requests_total', 'counter', 'Requêtes servies par un appel provider déjà en vol',
+         [({}, coalescing['coalesced'])]),
+        ('waveai_jobs', 'gauge', 'Tâches de chat par statut',
+         [({'status': status}, count) for status, count in job_queue.stats().items() if status != 'workers']),
+        ('waveai_transcripts_pending', 'gauge', "Échanges en attente d'écriture (mode différé)",
+         [({}, transcripts['pending'])]),
+        ('waveai_transcripts_spilled', 'gauge', 'Échanges mis de côté sur disque, à rejouer',
+         [({}, transcripts['spilled'])]),
+        ('waveai_db_pool_connections', 'gauge', 'Connexions du pool base par état',
+         [({'state': state}, db_pool[state]) for state in ('checked_out', 'checked_in', 'overflow') if state in db_pool]),
+        ('waveai_circuit_breakers', 'gauge', 'Disjoncteurs par état',
+         [({'state': state}, count) for state, count in sorted(breaker_states.items())])
+    ]
+
+@app.route('/metrics')
+def prometheus_metrics():
+    # Jeton optionnel : Authorization: Bearer <WAVEAI_METRICS_TOKEN>
+    token = os.environ.get('WAVEAI_METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Non autorisé\n', status=401, mimetype='text/plain')
+    if not METRICS_ENABLED:
+        return Response('Métriques désactivées\n', status=404, mimetype='text/plain')
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/manifest.json')
 def manifest():
     try:
@@ -535,10 +1776,163 @@ def internal_error(error):
     db.session.rollback()
     return render_template('error.html', error='Erreur interne'), 500
 
+@app.cli.command('migrate-messages')
+def migrate_messages_command():
+    """Convertit les anciens blobs JSON Conversation.messages en lignes de la table messages"""
+    migrated = 0
+    # Idempotent : le blob est vidé dans la transaction qui crée ses messages (migration 0007 comprise)
+    conversations = Conversation.query.filter(Conversation.messages.isnot(None)).all()
+    for conversation in conversations:
+        try:
+            entries = json.loads(conversation.messages or '[]')
+        except ValueError:
+            logger.error(f"Blob JSON invalide pour la conversation {conversation.id}")
+            continue
+        
+        for entry in entries:
+            try:
+                created_at = datetime.fromisoformat(entry.get('timestamp'))
+            except (TypeError, ValueError):
+                created_at = conversation.created_at
+            if entry.get('user_message'):
+                db.session.add(Message(conversation_id=conversation.id, role='user',
+                                       content=entry['user_message'], created_at=created_at))
+            if entry.get('agent_response'):
+                db.session.add(Message(conversation_id=conversation.id, role='assistant',
+                                       content=entry['agent_response'], source=entry.get('source'),
+                                       created_at=created_at))
+        conversation.messages = None
+        migrated += 1
+        if migrated % 500 == 0:
+            db.session.commit()
+    db.session.commit()
+    print(f"✅ {migrated} conversation(s) migrée(s) vers la table messages")
+
+@app.cli.command('build-knowledge')
+def build_knowledge_command():
+    """Reconstruit les index de connaissances de tous les agents (knowledge/<agent>/)"""
+    for agent in knowledge_base.agents():
+        index = knowledge_base.refresh(agent, rebuild=True)
+        print(f"✅ {agent}: {len(index.chunks) if index else 0} extrait(s) indexé(s)")
+
+@app.cli.command('backfill-user-stats')
+def backfill_user_stats_command():
+    """Recalcule la table user_stats à partir des conversations et messages existants"""
+    conversations = {}
+    for user_id, agent_type, count, last_update in (db.session.query(Conversation.user_id, Conversation.agent_type,
+                                                                     db.func.count(Conversation.id),
+                                                                     db.func.max(Conversation.updated_at))
+                                                    .group_by(Conversation.user_id, Conversation.agent_type)):
+        entry = conversations.setdefault(user_id, {'agents': {}, 'last_activity': None})
+        entry['agents'][agent_type] = count
+        if last_update and (entry['last_activity'] is None or last_update > entry['last_activity']):
+            entry['last_activity'] = last_update
+    
+    messages = dict(db.session.query(Conversation.user_id, db.func.count(Message.id))
+                    .join(Message, Message.conversation_id == Conversation.id)
+                    .group_by(Conversation.user_id))
+    
+    for user_id, entry in conversations.items():
+        # Idempotent : la ligne est réécrite, pas incrémentée
+        stats = get_user_stats(user_id)
+        stats.total_conversations = sum(entry['agents'].values())
+        stats.total_messages = messages.get(user_id, 0)
+        stats.agent_counts = json.dumps(entry['agents'])
+        stats.last_activity = entry['last_activity']
+    db.session.commit()
+    print(f"✅ Statistiques recalculées pour {len(conversations)} utilisateur(s)")
+
+def hot_queries(user_id=1, agent_type='alex', conversation_id=1):
+    """Requêtes exécutées à chaque chat ou affichage, construites par les mêmes fonctions que les routes"""
+    now = datetime.utcnow()
+    # Page suivante d'une liste : la pagination ajoute la condition (created_at, id) < curseur
+    cursor = encode_cursor(now, 2 ** 31)
+    queries = {
+        'settings': settings_query(user_id).limit(1),
+        'active_conversation': active_conversation_query(
+            user_id, agent_type, now - timedelta(minutes=CONVERSATION_IDLE_MINUTES)).limit(1),
+        'conversation_list': keyset_query(conversation_list_query(user_id), Conversation.created_at, Conversation.id, cursor),
+        'conversation_list_agent': keyset_query(conversation_list_query(user_id, agent_type),
+                                                Conversation.created_at, Conversation.id),
+        'history': latest_messages_query(conversation_id).limit(HISTORY_MAX_TURNS),
+        'message_page': keyset_query(conversation_messages_query(conversation_id), Message.created_at, Message.id, cursor),
+        'user_stats': user_stats_query(user_id).limit(1),
+        'daily_usage': quota_tracker.store.usage_query(db.session, user_id, now.date()),
+        'next_job': DatabaseJobStore(app, db, ChatJob).queued_query()
+    }
+    return {name: query.statement for name, query in queries.items()}
+
+@app.cli.command('explain-hot-queries')
+@click.option('--verbose', is_flag=True, help='Affiche le plan complet de chaque requête')
+def explain_hot_queries_command(verbose):
+    """Vérifie que les requêtes du chemin chaud passent par un index (code de sortie 1 sinon)"""
+    results = check_queries(db.engine, hot_queries())
+    failures = 0
+    for name, plan, problems in results:
+        print(f"{'❌' if problems else '✅'} {name}" + (f" : {', '.join(problems)}" if problems else ''))
+        if verbose or problems:
+            for line in plan:
+                print(f"    {line}")
+        failures += bool(problems)
+    if failures:
+        raise SystemExit(1)
+
+@app.cli.command('dedupe-ai-settings')
+@click.option('--dry-run', is_flag=True, help='Liste les lignes en double sans rien supprimer')
+def dedupe_ai_settings_command(dry_run):
+    """Supprime les ai_settings en double (garde la plus ancienne, celle que lisait l'application) puis crée l'index unique"""
+    keep = db.session.query(db.func.min(AISettings.id)).group_by(AISettings.user_id)
+    duplicates = AISettings.query.filter(AISettings.id.not_in(keep)).order_by(AISettings.user_id, AISettings.id).all()
+    for row in duplicates:
+        logger.info(f"{'[dry-run] ' if dry_run else ''}ai_settings supprimé : id={row.id} user_id={row.user_id} "
+                    f"modèle={row.default_model} créé le {row.created_at}")
+    print(f"{len(duplicates)} ligne(s) en double" + (' (rien supprimé)' if dry_run else ' supprimée(s)'))
+    if dry_run:
+        return
+    for row in duplicates:
+        db.session.delete(row)
+    db.session.commit()
+    if 'ix_ai_settings_user_id' not in {index['name'] for index in inspect(db.engine).get_indexes('ai_settings')}:
+        postgresql = db.engine.dialect.name == 'postgresql'
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text(f"CREATE UNIQUE INDEX {'CONCURRENTLY ' if postgresql else ''}"
+                                    f"IF NOT EXISTS ix_ai_settings_user_id ON ai_settings (user_id)"))
+        print("✅ Index unique ix_ai_settings_user_id créé")
+
+@app.cli.command('partition-messages')
+@click.option('--months-ahead', default=3, show_default=True, help='Partitions mensuelles créées à l\'avance')
+def partition_messages_command(months_ahead):
+    """PostgreSQL : partitionne la table messages par mois (1re fois) puis crée les mois à venir"""
+    with db.engine.begin() as connection:
+        if not is_supported(connection):
+            print("ℹ️ Partitionnement réservé à PostgreSQL (SQLite : table unique)")
+            return
+        created = partition_messages(connection, months_ahead)
+    print(f"✅ {len(created)} partition(s) créée(s)" + (f" : {', '.join(created)}" if created else ''))
+
+# Colonnes ajoutées aux modèles après coup : db.create_all ne modifie pas une table existante
+ADDED_COLUMNS = [
+    ('ai_settings', 'response_cache_enabled', 'BOOLEAN DEFAULT TRUE'),
+    ('chat_jobs', 'locked_by', 'VARCHAR(32)'),
+    ('chat_jobs', 'lease_until', 'TIMESTAMP')
+]
+
+def add_missing_columns():
+    inspector = inspect(db.engine)
+    for table, column, definition in ADDED_COLUMNS:
+        if inspector.has_table(table) and column not in {info['name'] for info in inspector.get_columns(table)}:
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+            logger.info(f"✅ Colonne {table}.{column} ajoutée")
+    db.session.commit()
+
 def init_database():
     try:
         with app.app_context():
-            db.create_all()
+            if AUTO_MIGRATE:
+                migrate_upgrade(directory=MIGRATIONS_DIR)
+            else:
+                db.create_all()
+                add_missing_columns()
             
             if not AppVersion.query.filter_by(is_current=True).first():
                 version = AppVersion(
@@ -550,7 +1944,18 @@ def init_database():
                 db.session.commit()
             
             logger.info("✅ Base de données WaveAI initialisée avec succès")
-            return True
+        
+        # Échanges non écrits lors d'un arrêt précédent (mode différé)
+        transcript_buffer.replay()
+        
+        # Index de connaissances préparés dès le démarrage, pas à la première question
+        if ai_system.rag_enabled:
+            knowledge_base.start()
+        
+        # File en base : reprise des tâches laissées par un redémarrage
+        if isinstance(job_queue.store, DatabaseJobStore):
+            job_queue.start()
+        return True
     except Exception as e:
         logger.error(f"❌ Erreur critique initialisation DB: {e}")
         return False
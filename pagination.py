@@ -0,0 +1,68 @@
+# WaveAI - Pagination par curseur (keyset) et ETag des listes
+# Page suivante = WHERE (created_at, id) < dernier vu : coût constant quelle que soit la profondeur
+
+import base64
+import hashlib
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, row_id):
+    raw = f"{created_at.isoformat() if created_at else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Curseur opaque -> (created_at, id) ; InvalidCursor si altéré"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(str(e))
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    try:
+        return max(1, min(maximum, int(value)))
+    except (TypeError, ValueError):
+        return default
+
+
+def keyset_query(query, created_column, id_column, cursor=None, limit=DEFAULT_LIMIT, descending=True):
+    """Requête d'une page : position du curseur, tri, et une ligne de plus que demandé"""
+    if cursor:
+        position = decode_cursor(cursor)
+        key = tuple_(created_column, id_column)
+        query = query.filter(key < position if descending else key > position)
+    if descending:
+        query = query.order_by(created_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(created_column.asc(), id_column.asc())
+    return query.limit(limit + 1)
+
+
+def keyset_page(query, created_column, id_column, cursor=None, limit=DEFAULT_LIMIT, descending=True):
+    """Lignes d'une page et curseur de la suivante (None en fin de liste).
+
+    Une ligne de plus que demandé est lue pour savoir s'il reste une page, sans COUNT.
+    """
+    rows = keyset_query(query, created_column, id_column, cursor, limit, descending).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, created_column.key), getattr(last, id_column.key))
+
+
+def etag_for(*parts):
+    """Étiquette d'une réponse à partir de l'état qui la détermine (pas du corps : calculée avant la requête)"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:32]
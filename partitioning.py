@@ -0,0 +1,121 @@
+# WaveAI - Partitionnement mensuel de la table messages (PostgreSQL, optionnel)
+# La table la plus volumineuse est découpée par mois de created_at : purge et maintenance par partition
+
+import logging
+from datetime import date
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'messages'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_y{month.year}m{month.month:02d}"
+
+
+def is_supported(connection):
+    return connection.dialect.name == 'postgresql'
+
+
+def is_partitioned(connection, table=TABLE):
+    return connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid))"
+    ), {'table': table}).scalar()
+
+
+def existing_partitions(connection, table=TABLE):
+    return set(connection.execute(text(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = :table AND pg_table_is_visible(parent.oid)"
+    ), {'table': table}).scalars())
+
+
+def ensure_partitions(connection, first_month, last_month, table=TABLE):
+    """Crée les partitions mensuelles manquantes de first_month à last_month inclus ; renvoie leurs noms"""
+    existing = existing_partitions(connection, table)
+    created = []
+    month = month_start(first_month)
+    while month <= last_month:
+        name = partition_name(month)
+        if name not in existing:
+            # Échoue si la partition par défaut contient déjà des lignes de ce mois : à déplacer à la main
+            connection.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def partition_messages(connection, months_ahead=3, today=None):
+    """Convertit messages en table partitionnée par mois (une fois), puis crée les mois à venir.
+
+    La clé primaire devient (id, created_at) ; les données sont recopiées dans une seule transaction.
+    """
+    today = month_start(today or date.today())
+    last_month = add_months(today, months_ahead)
+
+    if is_partitioned(connection):
+        return ensure_partitions(connection, today, last_month)
+
+    legacy = f'{TABLE}_unpartitioned'
+    connection.execute(text(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE"))
+    first = connection.execute(text(f"SELECT MIN(created_at) FROM {TABLE}")).scalar()
+    # Colonnes générées (recherche plein texte...) recalculées par PostgreSQL, pas recopiées
+    columns = list(connection.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_name = :table AND table_schema = current_schema() AND is_generated = 'NEVER' "
+        "ORDER BY ordinal_position"
+    ), {'table': TABLE}).scalars())
+    indexes = list(connection.execute(text(
+        "SELECT indexname, indexdef FROM pg_indexes "
+        "WHERE tablename = :table AND schemaname = current_schema() AND indexname <> :pkey"
+    ), {'table': TABLE, 'pkey': f'{TABLE}_pkey'}))
+
+    # Les noms d'index et de contrainte sont globaux au schéma : l'ancienne table libère les siens
+    connection.execute(text(f"ALTER TABLE {TABLE} RENAME TO {legacy}"))
+    connection.execute(text(f"ALTER TABLE {legacy} RENAME CONSTRAINT {TABLE}_pkey TO {legacy}_pkey"))
+    for name, _ in indexes:
+        connection.execute(text(f"ALTER INDEX {name} RENAME TO {name}_unpartitioned"))
+    # La séquence des id survit à la suppression de l'ancienne table
+    connection.execute(text(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY NONE"))
+
+    connection.execute(text(
+        f"CREATE TABLE {TABLE} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING GENERATED) PARTITION BY RANGE (created_at)"
+    ))
+    connection.execute(text(f"ALTER TABLE {TABLE} ALTER COLUMN created_at SET NOT NULL"))
+    connection.execute(text(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, created_at)"))
+    connection.execute(text(
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_conversation_id_fkey "
+        f"FOREIGN KEY (conversation_id) REFERENCES conversations (id)"
+    ))
+    connection.execute(text(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id"))
+    for _, definition in indexes:
+        # Définitions lues avant le renommage : elles visent la nouvelle table parente,
+        # et l'index est propagé à chaque partition, présente et future
+        connection.execute(text(definition))
+
+    created = ensure_partitions(connection, month_start(first) if first else today, last_month)
+    connection.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+
+    column_list = ', '.join(columns)
+    values = ', '.join('COALESCE(created_at, now())' if column == 'created_at' else column for column in columns)
+    copied = connection.execute(text(f"INSERT INTO {TABLE} ({column_list}) SELECT {values} FROM {legacy}")).rowcount
+    connection.execute(text(f"DROP TABLE {legacy}"))
+    logger.info(f"✅ Table {TABLE} partitionnée par mois : {copied} ligne(s) recopiée(s), {len(created)} partition(s)")
+    return created
@@ -0,0 +1,188 @@
+# WaveAI - Registre de santé des providers IA
+# État up/down mis en cache (TTL) et rafraîchi en arrière-plan
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def hf_endpoint_name(model_url):
+    """Nom de registre d'un modèle Hugging Face à partir de son URL"""
+    return 'huggingface:' + model_url.rsplit('/models/', 1)[-1]
+
+
+def http_probe(url, ok_status=None, timeout=2):
+    """Construit une sonde HTTP : joignable si statut < 500 (ou égal à ok_status)"""
+    def probe():
+        from http_pool import get_session
+        response = get_session('health').get(url, timeout=timeout)
+        if ok_status is not None:
+            return response.status_code == ok_status
+        return response.status_code < 500
+    return probe
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ProviderHealth:
+    def __init__(self, name, probe=None, default_up=True, window=100):
+        self.name = name
+        self.probe = probe
+        self.up = default_up
+        self.checked_at = None
+        self.last_error = None
+        # Latences des vrais appels (p95, timeouts adaptatifs) ; les sondes sont mesurées à part
+        self.latencies = deque(maxlen=window)
+        self.probe_latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.refreshing = False
+
+    def error_rate(self):
+        outcomes = list(self.outcomes)
+        if not outcomes:
+            return 0.0
+        return outcomes.count(False) / len(outcomes)
+
+    def to_dict(self):
+        latencies = list(self.latencies)
+        probe_latencies = list(self.probe_latencies)
+        return {
+            'up': self.up,
+            'checked_at': self.checked_at,
+            'error_rate': round(self.error_rate(), 3),
+            'samples': len(self.outcomes),
+            'latency_ms': {
+                'p50': _ms(percentile(latencies, 50)),
+                'p95': _ms(percentile(latencies, 95)),
+                'p99': _ms(percentile(latencies, 99))
+            },
+            'probe_latency_ms': {
+                'p50': _ms(percentile(probe_latencies, 50)),
+                'p95': _ms(percentile(probe_latencies, 95))
+            },
+            'last_error': self.last_error
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class ProviderHealthRegistry:
+    def __init__(self, ttl=None, interval=None, window=None):
+        self.ttl = ttl if ttl is not None else float(os.environ.get('WAVEAI_HEALTH_TTL', 60))
+        self.interval = interval if interval is not None else float(os.environ.get('WAVEAI_HEALTH_INTERVAL', 30))
+        self.window = window if window is not None else int(os.environ.get('WAVEAI_HEALTH_WINDOW', 100))
+        self.endpoints = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def register(self, name, probe=None, default_up=True):
+        """Enregistre un endpoint (idempotent : le premier enregistrement gagne)"""
+        with self._lock:
+            if name not in self.endpoints:
+                self.endpoints[name] = ProviderHealth(name, probe, default_up, self.window)
+            return self.endpoints[name]
+
+    def is_up(self, name, default=True):
+        """Lecture O(1) de l'état en cache ; déclenche un rafraîchissement non bloquant si périmé"""
+        health = self.endpoints.get(name)
+        if health is None:
+            return default
+        if health.probe and (health.checked_at is None or time.time() - health.checked_at > self.ttl):
+            self.refresh_async(name)
+        return health.up
+
+    def record(self, name, ok, latency=None, error=None):
+        """Enregistre le résultat d'un vrai appel (latence et taux d'erreur)"""
+        health = self.endpoints.get(name) or self.register(name)
+        with self._lock:
+            health.outcomes.append(bool(ok))
+            if latency is not None:
+                health.latencies.append(latency)
+            if error:
+                health.last_error = str(error)[:200]
+
+    def percentile(self, name, pct):
+        health = self.endpoints.get(name)
+        if health is None:
+            return None
+        return percentile(list(health.latencies), pct)
+
+    def call_samples(self, name):
+        health = self.endpoints.get(name)
+        return len(health.latencies) if health else 0
+
+    def refresh(self, name):
+        health = self.endpoints.get(name)
+        if health is None or not health.probe:
+            return None
+        started = time.monotonic()
+        try:
+            ok = bool(health.probe())
+            error = None
+        except Exception as e:
+            ok = False
+            error = e
+        latency = time.monotonic() - started
+        with self._lock:
+            health.up = ok
+            health.checked_at = time.time()
+            health.refreshing = False
+            if ok:
+                health.probe_latencies.append(latency)
+            elif error:
+                health.last_error = str(error)[:200]
+        return ok
+
+    def refresh_async(self, name):
+        health = self.endpoints.get(name)
+        with self._lock:
+            if health is None or health.refreshing:
+                return
+            health.refreshing = True
+        threading.Thread(target=self.refresh, args=(name,), daemon=True,
+                         name=f'waveai-health-{name}').start()
+
+    def refresh_all(self):
+        for name in list(self.endpoints):
+            self.refresh(name)
+
+    def start(self):
+        """Lance le thread de rafraîchissement périodique"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.refresh_all()
+                except Exception as e:
+                    logger.error(f"Erreur rafraîchissement santé providers: {e}")
+                self._stop.wait(self.interval)
+
+        self._thread = threading.Thread(target=loop, daemon=True, name='waveai-health')
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self):
+        with self._lock:
+            return {name: health.to_dict() for name, health in self.endpoints.items()}
+
+
+# Instance globale partagée par les systèmes IA
+health_registry = ProviderHealthRegistry()
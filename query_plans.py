@@ -0,0 +1,70 @@
+# WaveAI - Vérification des plans d'exécution des requêtes du chemin chaud
+# EXPLAIN sur SQLite et PostgreSQL : une requête qui parcourt toute une table ou trie sans index est signalée
+
+import re
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# SQLite : « SCAN conversations » (ou « SCAN TABLE ... » avant 3.36) = lecture complète de la table
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?! USING (?:COVERING )?INDEX)')
+SQLITE_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+POSTGRES_SORT = re.compile(r'^\s*(?:->\s*)?(?:Incremental )?Sort\b')
+
+
+def explain(connection, statement):
+    """Lignes du plan d'exécution d'une requête SQLAlchemy, paramètres compris"""
+    compiled = statement.compile(dialect=connection.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+        return [row[-1] for row in rows]
+    if connection.dialect.name == 'postgresql':
+        # Sur une petite table le planificateur préfère toujours le parcours séquentiel :
+        # on le pénalise pour vérifier qu'un index utilisable existe
+        connection.execute(text("SET LOCAL enable_seqscan = off"))
+        rows = connection.exec_driver_sql(f"EXPLAIN {compiled}", params)
+        return [row[0] for row in rows]
+    raise ValueError(f"EXPLAIN non pris en charge pour {connection.dialect.name}")
+
+
+def plan_problems(dialect, plan):
+    """Tables lues en entier et tris hors index relevés dans un plan"""
+    problems = []
+    for line in plan:
+        if dialect == 'sqlite':
+            match = SQLITE_SCAN.search(line)
+            if match:
+                problems.append(f"parcours complet de {match.group(1)}")
+            elif SQLITE_SORT in line:
+                problems.append("tri sans index")
+        else:
+            match = POSTGRES_SCAN.search(line)
+            if match:
+                problems.append(f"parcours complet de {match.group(1)}")
+            elif POSTGRES_SORT.search(line):
+                problems.append("tri sans index")
+    return problems
+
+
+def check_queries(engine, queries):
+    """[(nom, plan, problèmes)] pour chaque requête {nom: select} ; rien n'est modifié en base"""
+    results = []
+    with engine.connect() as connection:
+        for name, statement in queries.items():
+            transaction = connection.begin()
+            try:
+                plan = explain(connection, statement)
+                results.append((name, plan, plan_problems(connection.dialect.name, plan)))
+            except Exception as e:
+                logger.error(f"Erreur EXPLAIN {name}: {e}")
+                results.append((name, [], [f"erreur : {e}"]))
+            finally:
+                transaction.rollback()
+    return results
@@ -0,0 +1,323 @@
+# WaveAI - Limitation de débit et quotas journaliers
+# Seaux à jetons en mémoire (utilisateur, IP, provider) et quotas par jour en base avec écriture différée
+
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from metrics import metrics, METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Limites par utilisateur, IP et quotas désactivés par défaut : activées explicitement au déploiement
+RATE_USER = os.environ.get('WAVEAI_RATE_USER', '0')
+RATE_IP = os.environ.get('WAVEAI_RATE_IP', '0')
+RATE_PROVIDER_DEFAULTS = {'huggingface': '60/60'}
+RATE_MAX_BUCKETS = int(os.environ.get('WAVEAI_RATE_MAX_BUCKETS', 10000))
+DAILY_REQUESTS = int(os.environ.get('WAVEAI_DAILY_REQUESTS', 0))
+DAILY_TOKENS = int(os.environ.get('WAVEAI_DAILY_TOKENS', 0))
+QUOTA_FLUSH_INTERVAL = float(os.environ.get('WAVEAI_QUOTA_FLUSH_INTERVAL', 10))
+PROXY_COUNT = int(os.environ.get('WAVEAI_PROXY_COUNT', 0))
+
+RATE_LIMITED = metrics.counter('waveai_rate_limited_total', 'Requêtes refusées par limite', ['scope'])
+
+
+def parse_rate(spec):
+    """'20/60' -> (20, 60.0) : 20 requêtes par 60 s (rafale max 20) ; vide, 0 ou off -> None"""
+    if not spec or spec.strip().lower() in ('0', 'off', 'none', 'false'):
+        return None
+    count, _, period = spec.partition('/')
+    count, period = float(count), float(period or 1)
+    if count <= 0 or period <= 0:
+        return None
+    return count, period
+
+
+def provider_rate(provider):
+    return os.environ.get(f'WAVEAI_RATE_PROVIDER_{provider.upper()}', RATE_PROVIDER_DEFAULTS.get(provider, ''))
+
+
+def client_ip(remote_addr, forwarded_for=None, proxy_count=PROXY_COUNT):
+    """IP du client : l'adresse ajoutée par le N-ième proxy de confiance, sinon l'adresse TCP"""
+    if proxy_count and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+        if len(hops) >= proxy_count:
+            return hops[-proxy_count]
+    return remote_addr or 'unknown'
+
+
+def seconds_until_midnight(now=None):
+    now = now or datetime.utcnow()
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(1, int((tomorrow - now).total_seconds()))
+
+
+class TokenBucket:
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+    def __init__(self, count, period, now):
+        self.capacity = count
+        self.rate = count / period
+        self.tokens = count
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now, cost=1):
+        """0 si le jeton est pris, sinon secondes d'attente avant qu'il soit disponible"""
+        self.refill(now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Seaux par (portée, clé) ; les moins récemment utilisés sont oubliés au-delà de max_buckets"""
+
+    def __init__(self, limits, max_buckets=RATE_MAX_BUCKETS):
+        self.limits = {scope: rate for scope, rate in limits.items() if rate}
+        self.max_buckets = max(1, max_buckets)
+        self.buckets = OrderedDict()
+        self.rejected = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, scope, key, now):
+        bucket = self.buckets.get((scope, key))
+        if bucket is None:
+            bucket = self.buckets[(scope, key)] = TokenBucket(*self.limits[scope], now)
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end((scope, key))
+        return bucket
+
+    def hit(self, scope, key, cost=1):
+        """0 si autorisé, sinon Retry-After en secondes ; une portée non configurée n'est jamais limitée"""
+        if scope not in self.limits:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            retry_after = self._bucket(scope, key, now).take(now, cost)
+            if retry_after:
+                self.rejected[scope] = self.rejected.get(scope, 0) + 1
+        if retry_after and METRICS_ENABLED:
+            RATE_LIMITED.inc(scope=scope)
+        return retry_after
+
+    def remaining(self, scope, key):
+        if scope not in self.limits:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            bucket = self.buckets.get((scope, key))
+            if bucket is None:
+                return int(self.limits[scope][0])
+            bucket.refill(now)
+            return int(bucket.tokens)
+
+    def describe(self, scope):
+        rate = self.limits.get(scope)
+        return {'limit': int(rate[0]), 'period': rate[1]} if rate else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limits': {scope: f"{int(count)}/{int(period)}s" for scope, (count, period) in self.limits.items()},
+                'buckets': len(self.buckets),
+                'rejected': dict(self.rejected)
+            }
+
+
+class DatabaseQuotaStore:
+    """Compteurs journaliers en base : incréments atomiques, plusieurs workers peuvent écrire"""
+
+    def __init__(self, app, db, model):
+        self.app = app
+        self.db = db
+        self.model = model
+
+    def usage_query(self, session, user_id, day):
+        return session.query(self.model.requests, self.model.tokens).filter_by(user_id=user_id, day=day)
+
+    def load(self, user_id, day):
+        with self.app.app_context():
+            row = self.usage_query(self.db.session, user_id, day).first()
+            return (row[0], row[1]) if row else (0, 0)
+
+    def add(self, user_id, day, requests, tokens):
+        """Ajoute les deltas et renvoie les totaux à jour (écritures des autres workers comprises)"""
+        with self.app.app_context():
+            session = self.db.session
+            for _ in range(2):
+                updated = (session.query(self.model)
+                           .filter_by(user_id=user_id, day=day)
+                           .update({'requests': self.model.requests + requests,
+                                    'tokens': self.model.tokens + tokens}, synchronize_session=False))
+                if not updated:
+                    session.add(self.model(user_id=user_id, day=day, requests=requests, tokens=tokens))
+                try:
+                    session.commit()
+                    break
+                except IntegrityError:
+                    # Ligne créée entre-temps par un autre worker : on refait l'incrément
+                    session.rollback()
+            row = self.usage_query(session, user_id, day).first()
+            return (row[0], row[1]) if row else (requests, tokens)
+
+
+class QuotaTracker:
+    """Quotas journaliers : lecture et incrément en mémoire, écriture groupée en base toutes les flush_interval s.
+
+    L'écriture est faite par un thread dédié : un worker inactif ne garde pas d'incréments
+    plus de flush_interval s (au plus cette fenêtre est perdue si le processus est tué).
+    """
+
+    def __init__(self, store=None, daily_requests=DAILY_REQUESTS, daily_tokens=DAILY_TOKENS,
+                 flush_interval=QUOTA_FLUSH_INTERVAL):
+        self.store = store
+        self.daily_requests = daily_requests
+        self.daily_tokens = daily_tokens
+        self.flush_interval = flush_interval
+        # (user_id, jour) -> [requêtes, tokens, lu à (monotonic)] ; deltas pas encore écrits à part
+        self.totals = {}
+        self.pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self):
+        return self.daily_requests > 0 or self.daily_tokens > 0
+
+    def _entry(self, user_id, day):
+        key = (user_id, day)
+        entry = self.totals.get(key)
+        now = time.monotonic()
+        # Relu périodiquement pour voir la consommation des autres workers
+        if entry is None or (key not in self.pending and now - entry[2] > self.flush_interval):
+            requests, tokens = self.store.load(user_id, day) if self.store else (0, 0)
+            with self._lock:
+                delta = self.pending.get(key, (0, 0))
+                entry = self.totals[key] = [requests + delta[0], tokens + delta[1], now]
+                # Les jours passés ne sont plus consultés
+                for stale in [stale for stale in self.totals if stale[1] != day and stale not in self.pending]:
+                    del self.totals[stale]
+        return entry
+
+    def usage(self, user_id):
+        day = datetime.utcnow().date()
+        try:
+            requests, tokens, _ = self._entry(user_id, day)
+        except Exception as e:
+            logger.error(f"Erreur lecture quota: {e}")
+            requests, tokens = 0, 0
+        return {
+            'requests': requests,
+            'tokens': tokens,
+            'daily_requests': self.daily_requests or None,
+            'daily_tokens': self.daily_tokens or None,
+            'requests_left': max(0, self.daily_requests - requests) if self.daily_requests else None,
+            'tokens_left': max(0, self.daily_tokens - tokens) if self.daily_tokens else None,
+            'resets_in': seconds_until_midnight()
+        }
+
+    def check(self, user_id):
+        """0 si le quota du jour n'est pas épuisé, sinon secondes jusqu'à minuit UTC"""
+        if not self.enabled:
+            return 0
+        usage = self.usage(user_id)
+        if usage['requests_left'] == 0 or usage['tokens_left'] == 0:
+            if METRICS_ENABLED:
+                RATE_LIMITED.inc(scope='daily_quota')
+            return usage['resets_in']
+        return 0
+
+    def add(self, user_id, requests=0, tokens=0):
+        if not self.enabled:
+            return
+        key = (user_id, datetime.utcnow().date())
+        try:
+            self._entry(*key)
+        except Exception as e:
+            logger.error(f"Erreur lecture quota: {e}")
+        with self._lock:
+            entry = self.totals.setdefault(key, [0, 0, time.monotonic()])
+            entry[0] += requests
+            entry[1] += tokens
+            delta = self.pending.get(key, (0, 0))
+            self.pending[key] = (delta[0] + requests, delta[1] + tokens)
+        self.start()
+
+    def start(self):
+        if self.store is None or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name='waveai-quota-flush')
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            if self.pending:
+                self.flush()
+
+    def close(self):
+        """Arrêt du processus : dernier flush"""
+        self._stop.set()
+        self.flush()
+
+    def flush(self):
+        """Écrit les deltas accumulés (un UPDATE par utilisateur actif) et rafraîchit les totaux"""
+        if self.store is None or not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                pending, self.pending = self.pending, {}
+            for (user_id, day), (requests, tokens) in pending.items():
+                try:
+                    totals = self.store.add(user_id, day, requests, tokens)
+                except Exception as e:
+                    logger.error(f"Erreur écriture quota: {e}")
+                    with self._lock:
+                        delta = self.pending.get((user_id, day), (0, 0))
+                        self.pending[(user_id, day)] = (delta[0] + requests, delta[1] + tokens)
+                    continue
+                with self._lock:
+                    delta = self.pending.get((user_id, day), (0, 0))
+                    self.totals[(user_id, day)] = [totals[0] + delta[0], totals[1] + delta[1], time.monotonic()]
+        finally:
+            self._flush_lock.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'daily_requests': self.daily_requests,
+                'daily_tokens': self.daily_tokens,
+                'tracked_users': len(self.totals),
+                'pending_writes': len(self.pending)
+            }
+
+
+def build_rate_limiter():
+    limits = {'user': parse_rate(RATE_USER), 'ip': parse_rate(RATE_IP)}
+    for provider in ('openai', 'anthropic', 'huggingface', 'ollama'):
+        limits[f'provider:{provider}'] = parse_rate(provider_rate(provider))
+    return RateLimiter(limits)
+
+
+# Instances globales : seaux du processus, quotas branchés sur la base par multi_user_app
+rate_limiter = build_rate_limiter()
+quota_tracker = QuotaTracker()
+atexit.register(quota_tracker.close)
@@ -0,0 +1,274 @@
+# WaveAI - Cache des réponses d'agents
+# Clé : (agent, modèle, température, message normalisé) ; backends mémoire, SQLite ou Redis
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_message(message):
+    """Normalise un message : casse, accents, ponctuation et espaces ignorés"""
+    text = unicodedata.normalize('NFKD', (message or '').lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = _PUNCTUATION.sub(' ', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+def make_cache_key(agent, model, temperature, message, extra=None, scope=None):
+    """scope : empreinte des clés API (ou utilisateur) ; vide pour les réponses des clés du serveur"""
+    temperature = round(float(temperature if temperature is not None else 0.7), 2)
+    parts = [agent or '', model or '', f"{temperature:.2f}", normalize_message(message)]
+    if extra:
+        parts.append(str(extra))
+    if scope:
+        parts.append(f"scope:{scope}")
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+class MemoryCacheBackend:
+    """LRU en mémoire du processus"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max(1, max_entries)
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._items[key] = (time.time() + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def size(self):
+        return len(self._items)
+
+
+class SQLiteCacheBackend:
+    """Cache persistant dans un fichier SQLite local (partagé entre workers d'une machine)"""
+
+    def __init__(self, path='waveai_cache.db', max_entries=10000):
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS response_cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_accessed ON response_cache (accessed_at)')
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expires_at FROM response_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+                return None
+            self._conn.execute('UPDATE response_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO response_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), now + ttl, now)
+            )
+            # Éviction : entrées expirées puis les moins récemment lues au-delà de la limite
+            self._conn.execute('DELETE FROM response_cache WHERE expires_at < ?', (now,))
+            self._conn.execute(
+                'DELETE FROM response_cache WHERE key IN ('
+                'SELECT key FROM response_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM response_cache')
+
+    def size(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0]
+
+
+class RedisCacheBackend:
+    """Cache partagé sur un serveur compatible Redis (TTL natif, index LRU en sorted set)"""
+
+    def __init__(self, url='redis://localhost:6379/0', max_entries=10000, prefix='waveai:cache:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.max_entries = max(1, max_entries)
+        self.prefix = prefix
+        self.index_key = prefix + 'index'
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.client.zrem(self.index_key, key)
+            return None
+        self.client.zadd(self.index_key, {key: time.time()})
+        return json.loads(raw)
+
+    def set(self, key, value, ttl):
+        pipe = self.client.pipeline()
+        pipe.setex(self.prefix + key, int(ttl), json.dumps(value, ensure_ascii=False))
+        pipe.zadd(self.index_key, {key: time.time()})
+        pipe.execute()
+
+        overflow = self.client.zcard(self.index_key) - self.max_entries
+        if overflow > 0:
+            oldest = self.client.zrange(self.index_key, 0, overflow - 1)
+            if oldest:
+                pipe = self.client.pipeline()
+                pipe.delete(*[self.prefix + item.decode('utf-8') for item in oldest])
+                pipe.zrem(self.index_key, *oldest)
+                pipe.execute()
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+        self.client.zrem(self.index_key, key)
+
+    def clear(self):
+        keys = self.client.zrange(self.index_key, 0, -1)
+        if keys:
+            self.client.delete(*[self.prefix + item.decode('utf-8') for item in keys])
+        self.client.delete(self.index_key)
+
+    def size(self):
+        return self.client.zcard(self.index_key)
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl=3600, max_temperature=0.7):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def is_cacheable(self, temperature):
+        """Seules les réponses peu aléatoires sont mises en cache"""
+        return (temperature if temperature is not None else 0.7) <= self.max_temperature
+
+    def get(self, agent, model, temperature, message, extra=None, scope=None):
+        if not self.is_cacheable(temperature):
+            return None
+        try:
+            value = self.backend.get(make_cache_key(agent, model, temperature, message, extra, scope))
+        except Exception as e:
+            logger.error(f"Erreur lecture cache réponses: {e}")
+            with self._lock:
+                self.errors += 1
+            return None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, agent, model, temperature, message, value, extra=None, scope=None):
+        if not self.is_cacheable(temperature):
+            return
+        try:
+            self.backend.set(make_cache_key(agent, model, temperature, message, extra, scope), value, self.ttl)
+            with self._lock:
+                self.stores += 1
+        except Exception as e:
+            logger.error(f"Erreur écriture cache réponses: {e}")
+            with self._lock:
+                self.errors += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {
+            'enabled': True,
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            'stores': self.stores,
+            'errors': self.errors,
+            'size': size
+        }
+
+
+def build_response_cache():
+    """Cache configuré par WAVEAI_RESPONSE_CACHE (off par défaut : memory, sqlite ou redis)"""
+    backend_name = os.environ.get('WAVEAI_RESPONSE_CACHE', 'off').lower()
+    if backend_name in ('', 'off', 'false', 'none'):
+        return None
+
+    max_entries = int(os.environ.get('WAVEAI_CACHE_MAX_ENTRIES', 1000))
+    try:
+        if backend_name == 'memory':
+            backend = MemoryCacheBackend(max_entries)
+        elif backend_name == 'sqlite':
+            backend = SQLiteCacheBackend(os.environ.get('WAVEAI_CACHE_SQLITE_PATH', 'waveai_cache.db'), max_entries)
+        elif backend_name == 'redis':
+            backend = RedisCacheBackend(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'), max_entries)
+        else:
+            logger.error(f"Backend de cache inconnu: {backend_name}")
+            return None
+    except Exception as e:
+        logger.error(f"Erreur initialisation cache réponses ({backend_name}): {e}")
+        return None
+
+    return ResponseCache(
+        backend,
+        ttl=int(os.environ.get('WAVEAI_CACHE_TTL', 3600)),
+        max_temperature=float(os.environ.get('WAVEAI_CACHE_MAX_TEMPERATURE', 0.7))
+    )
+
+
+# Instance globale partagée (None si le cache est désactivé)
+response_cache = build_response_cache()
@@ -0,0 +1,148 @@
+# WaveAI - Recherche plein texte dans l'historique d'un utilisateur
+# PostgreSQL : colonne tsvector (français) + index GIN ; SQLite : table FTS5 tenue à jour par triggers
+
+import re
+import html
+import logging
+
+from sqlalchemy import text, inspect, DateTime
+
+logger = logging.getLogger(__name__)
+
+MAX_TERMS = 8
+MAX_RESULTS = 50
+# Délimiteurs internes des extraits : échappés en HTML puis remplacés par <mark>
+MARK_START, MARK_END = '\x02', '\x03'
+WORD = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_SEARCH = """
+    SELECT m.id, m.conversation_id, m.role, m.created_at, c.agent_type, c.title,
+           snippet(messages_fts, 0, char(2), char(3), '…', 16) AS snippet, bm25(messages_fts) AS rank
+    FROM messages_fts
+    JOIN messages m ON m.id = messages_fts.rowid
+    JOIN conversations c ON c.id = m.conversation_id
+    WHERE messages_fts MATCH :match {agent_filter}
+    ORDER BY rank
+    LIMIT :limit
+"""
+
+# ts_headline relit le texte du message : appliqué aux seuls résultats retenus
+POSTGRES_SEARCH = """
+    WITH query AS (SELECT to_tsquery('french', :tsquery) AS q),
+    hits AS (
+        SELECT m.id, m.conversation_id, m.role, m.content, m.created_at, c.agent_type, c.title,
+               ts_rank_cd(m.search_vector, query.q) AS rank
+        FROM query, messages m
+        JOIN conversations c ON c.id = m.conversation_id
+        WHERE m.search_vector @@ query.q AND c.user_id = :user_id {agent_filter}
+        ORDER BY rank DESC, m.id DESC
+        LIMIT :limit
+    )
+    SELECT hits.id, hits.conversation_id, hits.role, hits.created_at, hits.agent_type, hits.title,
+           ts_headline('french', hits.content, query.q,
+                       'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords=24, MinWords=8, MaxFragments=2') AS snippet,
+           hits.rank
+    FROM hits, query
+    ORDER BY hits.rank DESC, hits.id DESC
+"""
+
+FALLBACK_SEARCH = """
+    SELECT m.id, m.conversation_id, m.role, m.created_at, c.agent_type, c.title, m.content AS snippet, 0 AS rank
+    FROM messages m
+    JOIN conversations c ON c.id = m.conversation_id
+    WHERE c.user_id = :user_id {agent_filter} {term_filter}
+    ORDER BY m.created_at DESC, m.id DESC
+    LIMIT :limit
+"""
+
+
+def search_terms(query):
+    """Mots de la requête, sans aucune syntaxe FTS5 / tsquery (guillemets, opérateurs...)"""
+    return [word.lower() for word in WORD.findall(query or '')][:MAX_TERMS]
+
+
+def fts5_match(user_id, terms):
+    # Chaque mot en préfixe (recherche au fil de la frappe), tous requis
+    words = ' '.join(f'"{term}"*' for term in terms)
+    return f'owner : u{int(user_id)} AND content : ({words})'
+
+
+def like_pattern(term):
+    """Motif LIKE 'contient' : % et _ du terme pris littéralement (ESCAPE '\\')"""
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def tsquery(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def highlight(snippet, terms=None):
+    """Extrait échappé en HTML, termes trouvés entre <mark> ; marquage fait ici pour le repli LIKE"""
+    snippet = snippet or ''
+    if terms and MARK_START not in snippet:
+        pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+        match = pattern.search(snippet)
+        if match:
+            start = max(0, match.start() - 60)
+            snippet = ('…' if start else '') + snippet[start:start + 160] + ('…' if len(snippet) > start + 160 else '')
+        else:
+            snippet = snippet[:160] + ('…' if len(snippet) > 160 else '')
+        snippet = pattern.sub(lambda found: f'{MARK_START}{found.group(0)}{MARK_END}', snippet)
+    return html.escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+class MessageSearch:
+    """Recherche dans les messages d'un utilisateur, classée par pertinence"""
+
+    def __init__(self, db):
+        self.db = db
+        self._backend = None
+
+    def backend(self):
+        """'postgresql', 'fts5' ou 'like' selon ce que les migrations ont pu installer"""
+        if self._backend is None:
+            engine = self.db.engine
+            inspector = inspect(engine)
+            if engine.dialect.name == 'postgresql' and 'search_vector' in {
+                    column['name'] for column in inspector.get_columns('messages')}:
+                self._backend = 'postgresql'
+            elif engine.dialect.name == 'sqlite' and inspector.has_table('messages_fts'):
+                self._backend = 'fts5'
+            else:
+                logger.warning("⚠️ Index plein texte absent (flask db upgrade ?) : recherche par LIKE")
+                self._backend = 'like'
+        return self._backend
+
+    def search(self, user_id, query, agent_type=None, limit=20):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        limit = max(1, min(MAX_RESULTS, limit))
+        params = {'user_id': user_id, 'limit': limit, 'agent_type': agent_type}
+        agent_filter = 'AND c.agent_type = :agent_type' if agent_type else ''
+        backend = self.backend()
+
+        if backend == 'fts5':
+            sql = SQLITE_SEARCH.format(agent_filter=agent_filter)
+            params['match'] = fts5_match(user_id, terms)
+        elif backend == 'postgresql':
+            sql = POSTGRES_SEARCH.format(agent_filter=agent_filter)
+            params['tsquery'] = tsquery(terms)
+        else:
+            term_filter = ' '.join(f"AND lower(m.content) LIKE :term{index} ESCAPE '\\'" for index in range(len(terms)))
+            sql = FALLBACK_SEARCH.format(agent_filter=agent_filter, term_filter=term_filter)
+            params.update({f'term{index}': like_pattern(term) for index, term in enumerate(terms)})
+
+        statement = text(sql).columns(created_at=DateTime)
+        rows = self.db.session.execute(statement, params).mappings().all()
+        return [{
+            'message_id': row['id'],
+            'conversation_id': row['conversation_id'],
+            'agent_type': row['agent_type'],
+            'title': row['title'],
+            'role': row['role'],
+            'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+            'snippet': highlight(row['snippet'], terms),
+            # Plus grand = plus pertinent, quel que soit le moteur (bm25 de FTS5 est négatif)
+            'score': round(-row['rank'] if backend == 'fts5' else float(row['rank']), 6)
+        } for row in rows]
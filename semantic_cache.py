@@ -0,0 +1,203 @@
+# WaveAI - Cache sémantique des réponses
+# Une question proche d'une question déjà traitée (cosinus >= seuil) réutilise la réponse stockée
+
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from knowledge_index import HashingTfidfVectorizer, knowledge_base
+from response_cache import normalize_message
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_THRESHOLD = float(os.environ.get('WAVEAI_SEMANTIC_THRESHOLD', 0.92))
+SEMANTIC_TTL = int(os.environ.get('WAVEAI_SEMANTIC_TTL', 3600))
+SEMANTIC_MAX_ENTRIES = int(os.environ.get('WAVEAI_SEMANTIC_MAX_ENTRIES', 2000))
+SEMANTIC_HASH_DIM = int(os.environ.get('WAVEAI_SEMANTIC_HASH_DIM', 1024))
+SEMANTIC_MAX_TEMPERATURE = float(os.environ.get('WAVEAI_SEMANTIC_MAX_TEMPERATURE', 0.7))
+
+# « ne », « pas »... sont des mots vides pour le TF-IDF : la forme négative est comparée à part
+NEGATIONS = frozenset("""
+n ne pas non jamais aucun aucune rien ni sans not no never nothing none nor without
+""".split())
+_CONTRACTED_NOT = re.compile(r"n['’]t\b", re.IGNORECASE)
+
+
+def is_negated(message):
+    """Question à la forme négative (« n'est », « ne ... pas », « don't »...)"""
+    text = _CONTRACTED_NOT.sub(' not', message or '')
+    return not NEGATIONS.isdisjoint(normalize_message(text).split())
+
+
+class _Partition:
+    """Questions d'un même contexte (agent, modèle, température, clés, forme négative) : une matrice de vecteurs normalisés"""
+
+    def __init__(self, dim):
+        self.matrix = np.zeros((16, dim), dtype=np.float32)
+        self.ids = []
+        self.rows = {}
+
+    def add(self, entry_id, vector):
+        row = len(self.ids)
+        if row == len(self.matrix):
+            self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+        self.matrix[row] = vector
+        self.ids.append(entry_id)
+        self.rows[entry_id] = row
+
+    def remove(self, entry_id):
+        # Échange avec la dernière ligne : suppression en O(1), matrice toujours compacte
+        row = self.rows.pop(entry_id)
+        last = len(self.ids) - 1
+        if row != last:
+            moved = self.ids[last]
+            self.matrix[row] = self.matrix[last]
+            self.ids[row] = moved
+            self.rows[moved] = row
+        self.ids.pop()
+
+    def best(self, vector):
+        if not self.ids:
+            return None, 0.0
+        scores = self.matrix[:len(self.ids)] @ vector
+        row = int(np.argmax(scores))
+        return self.ids[row], float(scores[row])
+
+
+class SemanticCache:
+    def __init__(self, vectorizer, threshold=SEMANTIC_THRESHOLD, ttl=SEMANTIC_TTL,
+                 max_entries=SEMANTIC_MAX_ENTRIES, max_temperature=SEMANTIC_MAX_TEMPERATURE, disabled_agents=()):
+        self.vectorizer = vectorizer
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.max_temperature = max_temperature
+        self.disabled_agents = set(disabled_agents)
+        self.partitions = {}
+        # entry_id -> (partition, expires_at, question, réponse), ordre LRU
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def is_enabled_for(self, agent, temperature):
+        if agent in self.disabled_agents:
+            return False
+        return (temperature if temperature is not None else 0.7) <= self.max_temperature
+
+    def _partition_key(self, agent, model, temperature, message, scope=None):
+        # scope : empreinte des clés API (réponse payée par un utilisateur jamais servie à un autre)
+        return (agent or '', model or '', round(float(temperature if temperature is not None else 0.7), 2),
+                scope or '', is_negated(message))
+
+    def _embed(self, message):
+        vector = self.vectorizer.transform([message])[0]
+        return vector if vector.any() else None
+
+    def get(self, agent, model, temperature, message, scope=None):
+        """Réponse d'une question similaire, ou None"""
+        if not self.is_enabled_for(agent, temperature):
+            return None
+        try:
+            vector = self._embed(message)
+        except Exception as e:
+            logger.error(f"Erreur vectorisation cache sémantique: {e}")
+            with self._lock:
+                self.errors += 1
+            return None
+
+        with self._lock:
+            partition = self.partitions.get(self._partition_key(agent, model, temperature, message, scope))
+            entry_id, score = partition.best(vector) if partition and vector is not None else (None, 0.0)
+            if entry_id is not None and score >= self.threshold:
+                _, expires_at, question, value = self.entries[entry_id]
+                if expires_at >= time.time():
+                    self.entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return dict(value, semantic_match={'question': question, 'score': round(score, 3)})
+                self._remove(entry_id)
+            self.misses += 1
+            return None
+
+    def set(self, agent, model, temperature, message, value, scope=None):
+        if not self.is_enabled_for(agent, temperature):
+            return
+        try:
+            vector = self._embed(message)
+        except Exception as e:
+            logger.error(f"Erreur vectorisation cache sémantique: {e}")
+            with self._lock:
+                self.errors += 1
+            return
+        if vector is None:
+            return
+
+        key = self._partition_key(agent, model, temperature, message, scope)
+        with self._lock:
+            partition = self.partitions.get(key)
+            if partition is None:
+                partition = self.partitions[key] = _Partition(len(vector))
+            entry_id = self._next_id
+            self._next_id += 1
+            partition.add(entry_id, vector)
+            self.entries[entry_id] = (key, time.time() + self.ttl, message[:200], value)
+            self.stores += 1
+            self._evict()
+
+    def _evict(self):
+        now = time.time()
+        # Les plus anciennes en tête : expirées ou au-delà de la limite (LRU)
+        while self.entries:
+            entry_id, (_, expires_at, _, _) = next(iter(self.entries.items()))
+            if len(self.entries) <= self.max_entries and expires_at >= now:
+                break
+            self._remove(entry_id)
+
+    def _remove(self, entry_id):
+        key = self.entries.pop(entry_id)[0]
+        partition = self.partitions[key]
+        partition.remove(entry_id)
+        if not partition.ids:
+            del self.partitions[key]
+
+    def clear(self):
+        with self._lock:
+            self.partitions.clear()
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'enabled': True,
+            'vectorizer': getattr(self.vectorizer, 'name', type(self.vectorizer).__name__),
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            'stores': self.stores,
+            'errors': self.errors,
+            'size': len(self.entries),
+            'disabled_agents': sorted(self.disabled_agents)
+        }
+
+
+def build_semantic_cache():
+    """Cache configuré par WAVEAI_SEMANTIC_CACHE (désactivé par défaut)"""
+    if os.environ.get('WAVEAI_SEMANTIC_CACHE', 'false').lower() != 'true':
+        return None
+    disabled = [agent.strip() for agent in os.environ.get('WAVEAI_SEMANTIC_DISABLED_AGENTS', '').split(',') if agent.strip()]
+    # Même modèle d'embeddings que la base de connaissances s'il est configuré, sinon TF-IDF haché
+    vectorizer = knowledge_base.model_vectorizer() or HashingTfidfVectorizer(dim=SEMANTIC_HASH_DIM)
+    return SemanticCache(vectorizer, disabled_agents=disabled)
+
+
+# Instance globale partagée (None si le cache sémantique est désactivé)
+semantic_cache = build_semantic_cache()
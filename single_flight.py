@@ -0,0 +1,120 @@
+# WaveAI - Regroupement des requêtes identiques simultanées (single-flight)
+# Un seul appel provider en vol par clé, partagé par toutes les requêtes en attente
+
+import os
+import asyncio
+import threading
+
+COALESCE_ENABLED = os.environ.get('WAVEAI_COALESCE', 'true').lower() == 'true'
+COALESCE_MAX_WAITERS = int(os.environ.get('WAVEAI_COALESCE_MAX_WAITERS', 100))
+COALESCE_TIMEOUT = float(os.environ.get('WAVEAI_COALESCE_TIMEOUT', 60))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlightStats:
+    def __init__(self, max_waiters):
+        self.max_waiters = max(0, max_waiters)
+        self.leaders = 0
+        self.coalesced = 0
+        self.overflow = 0
+        self._lock = threading.Lock()
+
+    def stats(self, in_flight):
+        with self._lock:
+            requests = self.leaders + self.coalesced + self.overflow
+            return {
+                'in_flight': in_flight,
+                'provider_calls': self.leaders + self.overflow,
+                'coalesced': self.coalesced,
+                'saved_calls': self.coalesced,
+                'overflow': self.overflow,
+                'max_waiters': self.max_waiters,
+                'saved_ratio': round(self.coalesced / requests, 3) if requests else 0.0
+            }
+
+
+class SingleFlight(SingleFlightStats):
+    """Version threads (chemin WSGI et workers de tâches)"""
+
+    def __init__(self, max_waiters=COALESCE_MAX_WAITERS, timeout=COALESCE_TIMEOUT):
+        super().__init__(max_waiters)
+        self.timeout = timeout
+        self.calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self.calls.get(key)
+            if call is not None and call.waiters < self.max_waiters:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                # Attentes saturées sur cette clé : un nouvel appel partagé prend le relais
+                if call is not None:
+                    self.overflow += 1
+                else:
+                    self.leaders += 1
+                call = self.calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            if not call.done.wait(self.timeout):
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self.calls.get(key) is call:
+                    del self.calls[key]
+            call.done.set()
+
+    def stats(self):
+        return super().stats(len(self.calls))
+
+
+class AsyncSingleFlight(SingleFlightStats):
+    """Version asyncio : la tâche partagée survit à l'annulation du premier demandeur"""
+
+    def __init__(self, max_waiters=COALESCE_MAX_WAITERS):
+        super().__init__(max_waiters)
+        self.calls = {}
+
+    async def do(self, key, coroutine_fn):
+        entry = self.calls.get(key)
+        if entry is not None and entry[1] < self.max_waiters:
+            entry[1] += 1
+            with self._lock:
+                self.coalesced += 1
+        else:
+            with self._lock:
+                if entry is not None:
+                    self.overflow += 1
+                else:
+                    self.leaders += 1
+            task = asyncio.ensure_future(coroutine_fn())
+            entry = self.calls[key] = [task, 0]
+            task.add_done_callback(lambda _: self._forget(key, task))
+        return await asyncio.shield(entry[0])
+
+    def _forget(self, key, task):
+        entry = self.calls.get(key)
+        if entry is not None and entry[0] is task:
+            del self.calls[key]
+
+    def stats(self):
+        return super().stats(len(self.calls))
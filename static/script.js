@@ -206,6 +206,73 @@ const WaveAI = {
         }
     },
 
+    // Chat en streaming (Server-Sent Events) : affiche les tokens dès leur arrivée
+    async streamChat(message, agent, handlers = {}) {
+        const { onToken = () => {}, onDone = () => {}, onError = () => {}, conversationId = null } = handlers;
+
+        try {
+            const response = await fetch(this.apiBase + '/chat/stream', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream'
+                },
+                body: JSON.stringify({ message, agent, conversation_id: conversationId })
+            });
+
+            if (!response.ok || !response.body) {
+                const data = await response.json().catch(() => ({}));
+                throw new Error(data.error || `HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let fullText = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+
+                buffer += decoder.decode(value, { stream: true });
+
+                // Les événements SSE sont séparés par une ligne vide
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    let event = 'message';
+                    let data = '';
+                    rawEvent.split('\n').forEach(line => {
+                        if (line.startsWith('event:')) event = line.slice(6).trim();
+                        else if (line.startsWith('data:')) data += line.slice(5).trim();
+                    });
+                    if (!data) continue;
+
+                    const payload = JSON.parse(data);
+                    if (event === 'token') {
+                        fullText += payload.text;
+                        onToken(payload.text, fullText);
+                    } else if (event === 'done') {
+                        onDone(payload);
+                        return { success: true, data: payload };
+                    } else if (event === 'error') {
+                        throw new Error(payload.error);
+                    }
+                }
+            }
+
+            return { success: true, data: { response: fullText } };
+
+        } catch (error) {
+            console.error('Stream Error:', error);
+            onError(error);
+            this.showNotification(`Erreur: ${error.message}`, 'danger');
+            return { success: false, error: error.message };
+        }
+    },
+
     // Utilitaires diverses
     utils: {
         // Formater une date
@@ -0,0 +1,120 @@
+# Modules de l'application à la racine du dépôt, importables depuis les tests
+import os
+import sys
+import sqlite3
+import tempfile
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Base et fichiers de l'application isolés, fixés avant le premier import de multi_user_app
+TEST_DIR = tempfile.mkdtemp(prefix='waveai-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TEST_DIR, 'waveai.db')}"
+os.environ['WAVEAI_HEALTH_BACKGROUND'] = 'false'
+os.environ['WAVEAI_TRANSCRIPT_SPILL_PATH'] = os.path.join(TEST_DIR, 'transcripts_pending.jsonl')
+os.environ['WAVEAI_KNOWLEDGE_INDEX_DIR'] = os.path.join(TEST_DIR, 'knowledge-index')
+
+
+@pytest.fixture(scope='session')
+def waveai():
+    """Module multi_user_app, base migrée jusqu'à la dernière révision au premier import"""
+    import multi_user_app
+    return multi_user_app
+
+
+@pytest.fixture
+def app_db(waveai):
+    """Tables vidées et états du processus remis à zéro avant chaque test"""
+    from circuit_breaker import breakers
+    from model_cache import model_cache
+    from rate_limit import rate_limiter
+
+    with waveai.app.app_context():
+        for table in reversed(waveai.db.metadata.sorted_tables):
+            waveai.db.session.execute(table.delete())
+        waveai.db.session.commit()
+    model_cache.clear()
+    breakers.reset()
+    rate_limiter.buckets.clear()
+    waveai.quota_tracker.totals.clear()
+    waveai.quota_tracker.pending.clear()
+    waveai.health_registry.endpoints.clear()
+    return waveai
+
+
+@pytest.fixture
+def fake_provider(app_db, monkeypatch):
+    """Provider Hugging Face simulé : renvoie reply(message), appels enregistrés dans .calls"""
+    ai_system = app_db.ai_system
+
+    class FakeProvider:
+        def __init__(self):
+            self.calls = []
+            self.reply = lambda message: f"Réponse à : {message}"
+
+        def __call__(self, message, agent_type, settings, history=None):
+            self.calls.append((message, agent_type, history))
+            return ai_system.make_response(self.reply(message), 'huggingface', agent_type)
+
+    provider = FakeProvider()
+    monkeypatch.setitem(ai_system.providers, 'huggingface', provider)
+    monkeypatch.setattr(ai_system, 'race_mode', False)
+    return provider
+
+
+@pytest.fixture
+def client(app_db):
+    """Client connecté (utilisateur créé par /login)"""
+    client = app_db.app.test_client()
+    client.post('/login', data={'email': 'test@waveai.app'})
+    return client
+
+
+BASELINE_SCHEMA = """
+CREATE TABLE users (id INTEGER NOT NULL PRIMARY KEY, email VARCHAR(120) NOT NULL, name VARCHAR(100) NOT NULL,
+                    password_hash VARCHAR(200), is_active BOOLEAN, created_at DATETIME, last_login DATETIME);
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE TABLE ai_settings (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+                          openai_api_key VARCHAR(200), anthropic_api_key VARCHAR(200), huggingface_token VARCHAR(200),
+                          default_model VARCHAR(100), use_ollama BOOLEAN, temperature FLOAT, max_tokens INTEGER,
+                          created_at DATETIME, updated_at DATETIME);
+CREATE TABLE conversations (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+                            agent_type VARCHAR(50) NOT NULL, title VARCHAR(200), messages TEXT,
+                            created_at DATETIME, updated_at DATETIME);
+CREATE TABLE app_versions (id INTEGER NOT NULL PRIMARY KEY, version VARCHAR(20) NOT NULL, description TEXT,
+                           release_date DATETIME, is_current BOOLEAN);
+"""
+
+
+class BaselineDatabase:
+    """Base SQLite au schéma d'avant les migrations (db.create_all() de la version initiale)"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(BASELINE_SCHEMA)
+
+    def execute(self, sql, params=()):
+        rows = self.connection.execute(sql, params).fetchall()
+        self.connection.commit()
+        return rows
+
+    def run(self, *args):
+        """Lance l'application sur cette base dans un processus séparé (import = migrations jusqu'à head)"""
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{self.path}', WAVEAI_RAG='false')
+        command = [sys.executable, '-m', 'flask', '--app', 'multi_user_app'] + list(args) if args else \
+            [sys.executable, '-c', 'import multi_user_app']
+        return subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+
+    def indexes(self, table):
+        return {row[1] for row in self.execute(f"PRAGMA index_list('{table}')")}
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    database = BaselineDatabase(tmp_path / 'baseline.db')
+    yield database
+    database.connection.close()
@@ -0,0 +1,109 @@
+# Registre des agents : agents.json chargé une fois, prompts précompilés, rechargement à chaud sûr
+
+import os
+import json
+import logging
+
+import pytest
+
+from agent_registry import AgentRegistry, AGENTS_FILE
+
+
+def write_agents(path, agents, default_agent='kai', mtime=None):
+    path.write_text(json.dumps({'default_agent': default_agent, 'agents': agents}), encoding='utf-8')
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+KAI = {
+    'name': 'Kai', 'emoji': '🧠', 'role': 'coach de productivité', 'personality': 'Coûte 5 $ par mois',
+    'expertise': ['Organisation', 'Focus'], 'tone': 'motivant',
+    'fallbacks': {'default': 'Parlons productivité.', 'agenda|planning': 'Bloque tes créneaux.'}
+}
+ALEX = {'name': 'Alex', 'role': 'assistant mails', 'semantic_cache': False}
+
+
+@pytest.fixture
+def agents_file(tmp_path):
+    path = tmp_path / 'agents.json'
+    write_agents(path, {'kai': KAI, 'alex': ALEX}, mtime=1_000_000)
+    return path
+
+
+def test_repository_agents_file_loads():
+    registry = AgentRegistry(AGENTS_FILE, reload_interval=0)
+    assert {'kai', 'alex', 'lina', 'marco', 'sofia'} <= set(registry.agents)
+    assert registry.default_agent in registry.agents
+    for agent in registry.agents.values():
+        assert agent.name in agent.expert_prompt('Camille', '01/02/2026')
+
+
+def test_expert_prompt_is_precompiled_and_substituted(agents_file):
+    agent = AgentRegistry(str(agents_file), reload_interval=0).get('kai')
+    prompt = agent.expert_prompt('Camille', '01/02/2026')
+    assert prompt.startswith('Tu es Kai, coach de productivité.')
+    assert "L'utilisateur s'appelle Camille" in prompt and 'Date actuelle: 01/02/2026' in prompt
+    assert '• Organisation\n• Focus' in prompt
+    # Un « $ » du fichier n'est pas pris pour une variable du template
+    assert 'Coûte 5 $ par mois' in prompt
+    assert "s'appelle utilisateur" in agent.expert_prompt()
+
+
+def test_lookup_defaults_and_profiles(agents_file):
+    registry = AgentRegistry(str(agents_file), reload_interval=0)
+    assert registry.get('inconnu').id == 'kai'
+    assert registry.get('inconnu', default=False) is None
+    assert 'alex' in registry and 'inconnu' not in registry
+    assert registry.get_profiles()['alex'] == {'name': 'Alex', 'emoji': '🌊', 'description': '',
+                                               'prompt': 'Tu es Alex, agent de WaveAI.'}
+    assert registry.get('kai').semantic_cache is True and registry.get('alex').semantic_cache is False
+
+
+def test_fallbacks_use_keywords_then_default(agents_file):
+    agent = AgentRegistry(str(agents_file), reload_interval=0).get('kai')
+    assert agent.fallback('Mon planning est plein') == 'Bloque tes créneaux.'
+    assert agent.fallback('Bonjour') == 'Parlons productivité.'
+
+
+def test_hot_reload_on_file_change(agents_file):
+    registry = AgentRegistry(str(agents_file), reload_interval=0.01)
+    previous = registry.agents
+    write_agents(agents_file, {'kai': dict(KAI, name='Kai 2')}, mtime=1_000_100)
+    registry._checked_at = 0
+
+    assert registry.get('kai').name == 'Kai 2'
+    assert 'alex' not in registry
+    # Ancien registre intact pour les lecteurs qui le tiennent encore
+    assert previous['kai'].name == 'Kai'
+
+
+def test_unchanged_file_is_not_reread(agents_file, monkeypatch):
+    registry = AgentRegistry(str(agents_file), reload_interval=0.01)
+    loads = []
+    monkeypatch.setattr(registry, 'load', lambda: loads.append(1) or True)
+    registry._checked_at = 0
+    registry.get('kai')
+    assert loads == []
+
+
+def test_invalid_reload_keeps_previous_version_and_logs_once(agents_file, caplog):
+    registry = AgentRegistry(str(agents_file), reload_interval=0.01)
+    write_agents(agents_file, {'alex': ALEX}, default_agent='kai', mtime=1_000_200)
+
+    with caplog.at_level(logging.ERROR, logger='agent_registry'):
+        for _ in range(3):
+            registry._checked_at = 0
+            assert registry.get('kai').name == 'Kai'
+    assert len([record for record in caplog.records if 'agent par défaut inconnu' in record.getMessage()]) == 1
+
+
+def test_invalid_file_at_startup_raises(tmp_path):
+    path = tmp_path / 'agents.json'
+    path.write_text('{pas du json', encoding='utf-8')
+    with pytest.raises(ValueError):
+        AgentRegistry(str(path))
+
+
+def test_apps_share_the_registry(waveai):
+    from agent_registry import agent_registry
+    assert waveai.ai_system.agents is agent_registry.get_profiles()
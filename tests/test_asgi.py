@@ -0,0 +1,84 @@
+# Chemin ASGI : /api/chat en asyncio natif, routes Flask sur le pool de threads
+
+import time
+import asyncio
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def asgi(app_db, monkeypatch):
+    import asgi
+    calls = []
+
+    async def provider(message, agent_type, settings, history=None):
+        calls.append(message)
+        await asyncio.sleep(0.2)
+        return asgi.ai_system.make_response(f"Réponse à : {message}", 'huggingface', agent_type)
+
+    monkeypatch.setitem(asgi.async_ai.providers, 'huggingface', provider)
+    monkeypatch.setattr(asgi.ai_system, 'race_mode', False)
+    asgi.calls = calls
+    return asgi
+
+
+def run_client(asgi, scenario):
+    async def main():
+        transport = httpx.ASGITransport(app=asgi.application)
+        async with httpx.AsyncClient(transport=transport, base_url='http://waveai.test') as client:
+            await client.post('/login', data={'email': 'asgi@waveai.app'})
+            return await scenario(client)
+    return asyncio.run(main())
+
+
+def test_chat_requires_login(asgi):
+    async def scenario(client):
+        client.cookies.clear()
+        return await client.post('/api/chat', json={'message': 'Bonjour', 'agent': 'kai'})
+    assert run_client(asgi, scenario).status_code == 401
+
+
+def test_concurrent_chats_do_not_block_the_loop(asgi):
+    async def scenario(client):
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.post('/api/chat', json={'message': f'Question {index}', 'agent': 'kai'})
+                                           for index in range(4)))
+        return responses, time.perf_counter() - started
+
+    responses, elapsed = run_client(asgi, scenario)
+    assert [response.status_code for response in responses] == [200] * 4
+    assert sorted(response.json()['response'] for response in responses) == [f'Réponse à : Question {index}'
+                                                                               for index in range(4)]
+    assert all(response.json()['conversation_id'] for response in responses)
+    # Quatre appels de 0,2 s en parallèle, pas à la suite
+    assert elapsed < 0.6
+    assert len(asgi.calls) == 4
+
+
+def test_flask_routes_run_in_parallel_threads(asgi, monkeypatch):
+    def slow_landing():
+        time.sleep(0.3)
+        return 'ok'
+
+    monkeypatch.setitem(asgi.app.view_functions, 'landing', slow_landing)
+
+    async def scenario(client):
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.get('/') for _ in range(4)))
+        return responses, time.perf_counter() - started
+
+    responses, elapsed = run_client(asgi, scenario)
+    assert [response.text for response in responses] == ['ok'] * 4
+    assert elapsed < 0.9
+
+
+def test_flask_response_body_and_headers_pass_through(asgi):
+    async def scenario(client):
+        return await client.get('/api/conversations')
+
+    response = run_client(asgi, scenario)
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/json'
+    assert int(response.headers['content-length']) == len(response.content)
+    assert response.json()['conversations'] == []
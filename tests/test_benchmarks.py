@@ -0,0 +1,91 @@
+# Benchmarks : providers simulés (formats, streaming, erreurs) et test de charge de bout en bout
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+import requests
+
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from mock_providers import MockConfig, start_mock_server, split_chunks  # noqa: E402
+
+
+@pytest.fixture
+def mock_server():
+    server = start_mock_server(config=MockConfig(latency_ms=0, jitter_ms=0, chunk_delay_ms=0, stream_chunks=3, seed=1))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_split_chunks_rebuilds_text():
+    text = 'un deux trois quatre cinq six sept'
+    chunks = split_chunks(text, 3)
+    assert len(chunks) == 3 and ''.join(chunks) == text
+
+
+def test_openai_and_anthropic_formats(mock_server):
+    env = mock_server.provider_env()
+    reply = requests.post(f"{env['OPENAI_API_BASE']}/chat/completions",
+                          json={'model': 'gpt-3.5-turbo', 'messages': [{'role': 'user', 'content': 'Bonjour'}]}).json()
+    assert reply['choices'][0]['message']['content'].startswith('Réponse simulée openai')
+    assert reply['usage']['completion_tokens'] > 0
+
+    reply = requests.post(f"{env['ANTHROPIC_BASE_URL']}/v1/complete",
+                          json={'prompt': '\n\nHuman: Bonjour\n\nAssistant:'}).json()
+    assert 'Bonjour' in reply['completion']
+    assert requests.post(env['HUGGINGFACE_API_URL'], json={'inputs': 'Bonjour'}).json()[0]['generated_text']
+    assert mock_server.stats() == {'anthropic': {'calls': 1, 'errors': 0}, 'huggingface': {'calls': 1, 'errors': 0},
+                                   'openai': {'calls': 1, 'errors': 0}}
+
+
+def test_streaming_formats(mock_server):
+    response = requests.post(f"{mock_server.url}/v1/chat/completions", stream=True,
+                             json={'stream': True, 'messages': [{'role': 'user', 'content': 'Bonjour'}]})
+    lines = [line.decode('utf-8') for line in response.iter_lines() if line.startswith(b'data: ')]
+    assert lines[-1] == 'data: [DONE]'
+    text = ''.join(json.loads(line[6:])['choices'][0]['delta']['content'] for line in lines[:-1])
+    assert text.startswith('Réponse simulée openai')
+
+    response = requests.post(f"{mock_server.url}/api/generate", stream=True, json={'prompt': 'Bonjour'})
+    chunks = [json.loads(line) for line in response.iter_lines() if line]
+    assert chunks[-1]['done'] is True and len(chunks) == 4
+
+
+def test_error_rate_returns_server_errors(mock_server):
+    mock_server.config.error_rate = 1.0
+    response = requests.post(f"{mock_server.url}/v1/chat/completions", json={'messages': []})
+    assert response.status_code == 500
+    assert mock_server.stats()['openai'] == {'calls': 1, 'errors': 1}
+
+
+def run_load_test(tmp_path, *args):
+    env = {name: value for name, value in os.environ.items() if not name.startswith('WAVEAI_') and name != 'DATABASE_URL'}
+    command = [sys.executable, os.path.join(ROOT, 'benchmarks', 'load_test.py'), '--users', '2', '--concurrency', '2',
+               '--chats', '2', '--latency-ms', '5', '--jitter-ms', '0', '--chunk-delay-ms', '0', '--seed', '1',
+               '--output', str(tmp_path / 'report.json')] + list(args)
+    result = subprocess.run(command, cwd=str(tmp_path), env=env, capture_output=True, text=True, timeout=120)
+    return result, json.loads((tmp_path / 'report.json').read_text(encoding='utf-8'))
+
+
+def test_load_test_smoke(tmp_path):
+    result, report = run_load_test(tmp_path, '--max-error-rate', '0', '--max-queries-per-chat', '50')
+    assert result.returncode == 0, result.stderr
+    assert report['thresholds'] == {'passed': True, 'failures': []}
+    chat = report['endpoints']['chat']
+    assert chat['requests'] == 4 and chat['errors'] == 0
+    assert chat['latency_ms']['p95'] >= chat['latency_ms']['p50'] > 0
+    assert chat['db_queries']['per_request'] > 0
+    assert report['provider_calls'] == {'openai': {'calls': 4, 'errors': 0}}
+
+
+def test_load_test_fails_on_threshold(tmp_path):
+    result, report = run_load_test(tmp_path, '--stream', '--max-p95-ms', '0.001')
+    assert result.returncode == 1
+    assert report['endpoints']['chat_stream']['errors'] == 0
+    assert report['thresholds']['failures'][0].startswith('p95 chat')
@@ -0,0 +1,81 @@
+# Disjoncteur : fermé -> ouvert -> semi-ouvert -> fermé / rouvert
+
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+def make_breaker(**kwargs):
+    options = {'failure_threshold': 2, 'recovery_time': 30, 'half_open_calls': 1}
+    options.update(kwargs)
+    return CircuitBreaker('test', **options)
+
+
+def expire(breaker):
+    """Fait comme si recovery_time s'était écoulé depuis l'ouverture"""
+    breaker.opened_at -= breaker.recovery_time
+
+
+def test_opens_after_threshold():
+    breaker = make_breaker()
+    breaker.record(False)
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count():
+    breaker = make_breaker()
+    breaker.record(False)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_after_recovery_limits_trials():
+    breaker = make_breaker(half_open_calls=2)
+    breaker.record(False)
+    breaker.record(False)
+    expire(breaker)
+    assert not breaker.is_open()
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_half_open_success_closes():
+    breaker = make_breaker()
+    breaker.record(False)
+    breaker.record(False)
+    expire(breaker)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_half_open_failure_reopens_immediately():
+    breaker = make_breaker(failure_threshold=5)
+    for _ in range(5):
+        breaker.record(False)
+    expire(breaker)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.to_dict()['retry_in'] > 0
+
+
+def test_abandoned_trial_frees_its_slot():
+    breaker = make_breaker()
+    breaker.record(False)
+    breaker.record(False)
+    expire(breaker)
+    assert breaker.allow()
+    # Essai jamais conclu (appel annulé) : pas de nouvel essai avant recovery_time
+    assert not breaker.allow()
+    breaker.trial_started_at -= breaker.recovery_time
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
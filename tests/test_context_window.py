@@ -0,0 +1,89 @@
+# Fenêtre d'historique : budget de tokens, échanges récents gardés, anciens résumés
+
+import context_window
+from context_window import (HistoryWindow, build_history_window, estimate_tokens, history_budget,
+                            CONTEXT_TOKENS, HISTORY_MAX_TOKENS)
+
+
+def exchange(index, size=40):
+    return [('user', f"Question {index} " + 'q' * size), ('assistant', f"Réponse {index} " + 'r' * size)]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens(None) == 0
+    assert estimate_tokens('abcd') == 1
+    assert estimate_tokens('abcde') == 2
+
+
+def test_budget_reserves_answer_and_fixed_prompt():
+    system_prompt = 'x' * 4000
+    assert history_budget(1000, system_prompt) == min(HISTORY_MAX_TOKENS, CONTEXT_TOKENS - 1000 - 1000)
+    # Réponse attendue plafonnée à 1500 tokens, budget jamais négatif
+    assert history_budget(5000) == min(HISTORY_MAX_TOKENS, CONTEXT_TOKENS - 1500)
+    assert history_budget(1000, 'x' * CONTEXT_TOKENS * 4) == 0
+
+
+def test_recent_turns_kept_within_budget_and_older_summarized():
+    turns = [turn for index in range(10) for turn in exchange(index, size=200)]
+    window = build_history_window(turns, budget=150)
+
+    used = sum(estimate_tokens(content) + 4 for role, content in window.turns)
+    assert 0 < used <= 150
+    # Les plus récents, dans l'ordre
+    assert window.turns == turns[-len(window.turns):]
+    assert window.turns[-1][1].startswith('Réponse 9')
+    assert window.summary.startswith('Résumé des échanges précédents : ')
+    assert 'Question 0' in window.summary and 'Réponse 0' not in window.summary
+    assert window.to_text().startswith(window.summary)
+
+
+def test_whole_history_fits_without_summary():
+    turns = exchange(1, size=4)
+    window = build_history_window(turns, budget=1000)
+    assert window.turns == turns and window.summary is None
+    assert window.to_text().splitlines() == ['HISTORIQUE RÉCENT:', f"Utilisateur: {turns[0][1]}",
+                                             f"Agent: {turns[1][1]}"]
+
+
+def test_empty_budget_gives_empty_window():
+    window = build_history_window(exchange(1), budget=0)
+    assert not window
+    assert not HistoryWindow()
+
+
+def test_turn_count_capped(monkeypatch):
+    monkeypatch.setattr(context_window, 'HISTORY_MAX_TURNS', 4)
+    turns = [turn for index in range(5) for turn in exchange(index, size=1)]
+    window = build_history_window(turns, budget=10000)
+    assert len(window.turns) == 4 and window.summary is None
+    # Échanges vides ignorés
+    assert build_history_window([('user', ''), ('assistant', 'ok')], budget=100).turns == [('assistant', 'ok')]
+
+
+def test_fingerprint_follows_content():
+    a = build_history_window(exchange(1), budget=1000)
+    assert a.fingerprint() == build_history_window(exchange(1), budget=1000).fingerprint()
+    assert a.fingerprint() != build_history_window(exchange(2), budget=1000).fingerprint()
+
+
+def test_chat_sends_budgeted_history(waveai, client, fake_provider):
+    from model_cache import model_cache
+    client.post('/api/chat', json={'message': 'Premier sujet ' + 'a' * 400, 'agent': 'kai'})
+    assert fake_provider.calls[0][2] is None
+
+    with waveai.app.app_context():
+        user = waveai.User.query.filter_by(email='test@waveai.app').first()
+        waveai.get_user_settings(user.id).max_tokens = 100
+        waveai.db.session.commit()
+        model_cache.invalidate('settings', user.id)
+    for index in range(12):
+        client.post('/api/chat', json={'message': f"Sujet {index} " + 'b' * 400, 'agent': 'kai'})
+
+    history = fake_provider.calls[-1][2]
+    assert history.turns[-1] == ('assistant', f"Réponse à : Sujet 10 {'b' * 400}")
+    budget = history_budget(100, waveai.ai_system.build_system_prompt('Sujet 11', 'kai'), 'Sujet 11 ' + 'b' * 400)
+    assert sum(estimate_tokens(content) + 4 for role, content in history.turns) <= budget
+    # Au-delà du budget : résumé des questions ; au-delà des 20 derniers échanges relus : rien
+    assert history.summary.startswith('Résumé des échanges précédents : Sujet 1 ')
+    assert 'Premier sujet' not in history.to_text()
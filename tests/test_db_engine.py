@@ -0,0 +1,60 @@
+# Options du moteur SQLAlchemy selon la base (SQLite, PostgreSQL, PgBouncer) et état du pool
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+import db_engine
+from db_engine import engine_options, pool_status, TimedQueuePool, TimedNullPool
+
+
+def test_memory_sqlite_keeps_default_pool():
+    assert engine_options('sqlite://') == {}
+    assert engine_options('sqlite:///:memory:') == {}
+
+
+def test_file_sqlite_uses_timed_queue_pool(tmp_path):
+    options = engine_options(f"sqlite:///{tmp_path / 'waveai.db'}")
+    assert options['poolclass'] is TimedQueuePool
+    assert options['pool_size'] == db_engine.DB_POOL_SIZE
+    assert 'connect_args' not in options
+
+
+def test_postgresql_pool_and_connect_args(monkeypatch):
+    monkeypatch.setattr(db_engine, 'PGBOUNCER', False)
+    options = engine_options('postgresql://waveai@db/waveai')
+    assert options['poolclass'] is TimedQueuePool
+    assert options['pool_pre_ping'] == db_engine.DB_PRE_PING
+    assert options['pool_recycle'] == db_engine.DB_POOL_RECYCLE
+    assert options['connect_args'] == {'connect_timeout': db_engine.DB_CONNECT_TIMEOUT, 'application_name': 'waveai'}
+
+
+def test_pgbouncer_disables_local_pool(monkeypatch):
+    monkeypatch.setattr(db_engine, 'PGBOUNCER', True)
+    options = engine_options('postgresql://waveai@pgbouncer/waveai')
+    assert options['poolclass'] is TimedNullPool
+    assert 'pool_size' not in options and 'pool_recycle' not in options
+    # psycopg2 : aucune option d'instructions préparées à transmettre
+    assert set(options['connect_args']) == {'connect_timeout', 'application_name'}
+
+
+def test_pool_status_counts_checked_out_connections(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", **engine_options(f"sqlite:///{tmp_path / 'pool.db'}"))
+    try:
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+            status = pool_status(engine)
+            assert status['pool'] == 'TimedQueuePool'
+            assert status['checked_out'] == 1
+            assert status['size'] == db_engine.DB_POOL_SIZE
+        assert pool_status(engine)['checked_out'] == 0
+        assert pool_status(engine)['checked_in'] == 1
+    finally:
+        engine.dispose()
+
+
+def test_pool_status_without_queue_pool(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'null.db'}", poolclass=NullPool)
+    try:
+        assert set(pool_status(engine)) == {'pool', 'pgbouncer'}
+    finally:
+        engine.dispose()
@@ -0,0 +1,60 @@
+# Sessions keep-alive et cache LRU des clients SDK par clé API
+
+import threading
+
+from http_pool import LRUClientCache, api_key_fingerprint, get_session
+
+
+class Client:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_lru_keeps_most_recent_clients():
+    cache = LRUClientCache(max_size=2)
+    a = cache.get_or_create('a', lambda: Client('a'))
+    cache.get_or_create('b', lambda: Client('b'))
+    assert cache.get_or_create('a', lambda: Client('a2')) is a
+    cache.get_or_create('c', lambda: Client('c'))
+    # 'b' est le moins récemment utilisé
+    assert cache.get_or_create('b', lambda: Client('b2')).name == 'b2'
+    assert cache.stats() == {'size': 2, 'max_size': 2, 'hits': 1, 'misses': 4, 'evictions': 2}
+
+
+def test_evicted_client_still_usable_by_current_request():
+    cache = LRUClientCache(max_size=1)
+    in_use = cache.get_or_create('cle-1', lambda: Client('cle-1'))
+    # Rotation de clés pendant que la requête utilise encore son client
+    for index in range(2, 6):
+        cache.get_or_create(f'cle-{index}', lambda: Client('autre'))
+    assert cache.evictions == 4
+    assert not in_use.closed
+
+
+def test_concurrent_creation_shares_one_client():
+    cache = LRUClientCache(max_size=4)
+    barrier = threading.Barrier(4)
+    results = []
+
+    def factory():
+        barrier.wait(2)
+        return Client('partagé')
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_create('k', factory))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(results) == 4 and all(client is results[0] for client in results)
+    assert len(cache) == 1
+
+
+def test_fingerprint_and_shared_sessions():
+    assert api_key_fingerprint('sk-secret') != 'sk-secret'
+    assert api_key_fingerprint('sk-secret') == api_key_fingerprint('sk-secret')
+    assert api_key_fingerprint(None) == api_key_fingerprint('')
+    assert get_session('test-provider') is get_session('test-provider')
@@ -0,0 +1,155 @@
+# File de tâches en base : réservation exclusive, bail renouvelé, reprise d'un bail expiré, pas de double exécution
+
+import time
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from job_queue import DatabaseJobStore, JobQueue, QUEUED, RUNNING, DONE, FAILED
+
+
+@pytest.fixture
+def stores(app_db):
+    """Deux workers (processus distincts) partageant la table chat_jobs"""
+    return [DatabaseJobStore(app_db.app, app_db.db, app_db.ChatJob, lease_seconds=30, max_attempts=2)
+            for _ in range(2)]
+
+
+def expire_lease(waveai, job_id):
+    with waveai.app.app_context():
+        job = waveai.db.session.get(waveai.ChatJob, job_id)
+        job.lease_until = datetime.utcnow() - timedelta(seconds=1)
+        waveai.db.session.commit()
+
+
+def lease_until(waveai, job_id):
+    with waveai.app.app_context():
+        return waveai.db.session.get(waveai.ChatJob, job_id).lease_until
+
+
+def test_claim_is_exclusive_across_workers(stores):
+    first, second = stores
+    job_ids = {first.enqueue(1, {'message': f'tâche {index}'}) for index in range(10)}
+    claimed = [[], []]
+    barrier = threading.Barrier(2)
+
+    def work(index):
+        barrier.wait()
+        while True:
+            job = stores[index].claim(0)
+            if job is None:
+                return
+            claimed[index].append(job[0])
+
+    threads = [threading.Thread(target=work, args=(index,)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    # Chaque tâche réservée une seule fois, par l'un ou l'autre worker
+    assert sorted(claimed[0] + claimed[1]) == sorted(job_ids)
+    assert all(first.get(job_id)['status'] == RUNNING and first.get(job_id)['attempts'] == 1 for job_id in job_ids)
+
+
+def test_heartbeat_keeps_lease_alive(app_db, stores):
+    first, second = stores
+    job_id = first.enqueue(1, {'message': 'longue génération'})
+    assert first.claim(0)[0] == job_id
+    before = lease_until(app_db, job_id)
+    time.sleep(0.01)
+    assert first.renew() == 1
+    assert lease_until(app_db, job_id) > before
+    # Bail valide : l'autre worker ne reprend rien
+    assert second.recover() == 0
+    assert second.claim(0) is None
+    # Pas de tâche réservée par ce worker : rien à renouveler
+    assert second.renew() == 0
+
+
+def test_expired_lease_requeued_and_stale_result_ignored(app_db, stores):
+    first, second = stores
+    job_id = first.enqueue(1, {'message': 'bonjour'})
+    assert first.claim(0)[0] == job_id
+    # Worker figé (ou tué) : plus de battement, le bail expire
+    expire_lease(app_db, job_id)
+    assert second.recover() == 1
+    assert second.get(job_id)['status'] == QUEUED
+    assert second.claim(0) == (job_id, {'message': 'bonjour'})
+    assert first.renew() == 0
+
+    # L'ancien worker se réveille : son résultat n'écrase pas celui du nouveau détenteur
+    first.finish(job_id, result={'response': 'ancien'})
+    assert second.get(job_id)['status'] == RUNNING
+    second.finish(job_id, result={'response': 'nouveau'})
+    job = second.get(job_id)
+    assert (job['status'], job['result'], job['attempts']) == (DONE, {'response': 'nouveau'}, 2)
+
+
+def test_finished_job_never_rerun(app_db, stores):
+    first, second = stores
+    job_id = first.enqueue(1, {'message': 'bonjour'})
+    first.claim(0)
+    first.finish(job_id, result={'response': 'ok'})
+    expire_lease(app_db, job_id)
+    assert second.recover() == 0
+    assert second.claim(0) is None
+    assert first.get(job_id)['status'] == DONE
+
+
+def test_attempts_exhausted_marks_job_failed(app_db, stores):
+    first, second = stores
+    job_id = first.enqueue(1, {'message': 'bonjour'})
+    for store in stores:
+        store.recover()
+        assert store.claim(0)[0] == job_id
+        expire_lease(app_db, job_id)
+    assert second.recover() == 0
+    job = second.get(job_id)
+    assert job['status'] == FAILED and job['attempts'] == 2
+    assert second.claim(0) is None
+
+
+def test_queue_runs_each_job_once(stores):
+    store = stores[0]
+    runs = []
+    done = threading.Event()
+
+    def handler(payload):
+        runs.append(payload['message'])
+        if len(runs) == 3:
+            done.set()
+        return {'response': payload['message'].upper()}
+
+    job_queue = JobQueue(store, handler, workers=3, poll_interval=0.05)
+    try:
+        job_ids = [job_queue.enqueue(1, {'message': message}) for message in ('a', 'b', 'c')]
+        assert done.wait(5)
+        deadline = time.monotonic() + 5
+        while any(job_queue.get(job_id)['status'] != DONE for job_id in job_ids) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert [job_queue.get(job_id)['result'] for job_id in job_ids] == [{'response': 'A'}, {'response': 'B'},
+                                                                           {'response': 'C'}]
+        time.sleep(0.2)
+        assert sorted(runs) == ['a', 'b', 'c']
+    finally:
+        job_queue.stop()
+
+
+def test_async_chat_job_polling(client, fake_provider):
+    response = client.post('/api/chat?async=1', json={'message': 'Bonjour', 'agent': 'kai'})
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+    deadline = time.monotonic() + 5
+    while True:
+        job = client.get(status_url).get_json()
+        if job['status'] in (DONE, FAILED) or time.monotonic() > deadline:
+            break
+        time.sleep(0.02)
+    assert job['status'] == DONE
+    assert job['result']['response'] == 'Réponse à : Bonjour'
+    assert job['result']['conversation_id']
+    # Tâche d'un autre utilisateur : introuvable
+    other = client.application.test_client()
+    other.post('/login', data={'email': 'autre@waveai.app'})
+    assert other.get(status_url).status_code == 404
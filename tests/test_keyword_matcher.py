@@ -0,0 +1,63 @@
+# Automate Aho-Corasick : liens d'échec, sorties héritées et score par réponse
+
+import random
+
+from keyword_matcher import KeywordMatcher, WHOLE_WORD_BONUS
+
+
+def state_of(matcher, word):
+    state = 0
+    for char in word:
+        state = matcher._goto[state][char]
+    return state
+
+
+def found_keywords(matcher, message):
+    return sorted(matcher.keywords[keyword_id][0] for keyword_id in matcher.find(message))
+
+
+def test_failure_links_point_to_longest_proper_suffix():
+    matcher = KeywordMatcher([('he', 'a'), ('she', 'b'), ('his', 'c'), ('hers', 'd')])
+    assert matcher._fail[state_of(matcher, 'sh')] == state_of(matcher, 'h')
+    assert matcher._fail[state_of(matcher, 'she')] == state_of(matcher, 'he')
+    assert matcher._fail[state_of(matcher, 'hers')] == state_of(matcher, 's')
+    assert matcher._fail[state_of(matcher, 'his')] == state_of(matcher, 's')
+    assert matcher._fail[state_of(matcher, 'h')] == 0
+
+
+def test_outputs_inherited_through_failure_links():
+    matcher = KeywordMatcher([('he', 'a'), ('she', 'b'), ('his', 'c'), ('hers', 'd')])
+    assert found_keywords(matcher, 'ushers') == ['he', 'hers', 'she']
+
+
+def test_overlapping_keywords_in_one_pass():
+    matcher = KeywordMatcher([('aa', 'a'), ('aaa', 'b'), ('ab', 'c'), ('bab', 'd')])
+    assert found_keywords(matcher, 'aaabab') == ['aa', 'aaa', 'ab', 'bab']
+
+
+def test_matches_brute_force_search():
+    rng = random.Random(42)
+    keywords = sorted({''.join(rng.choice('abc') for _ in range(rng.randint(1, 4))) for _ in range(30)})
+    matcher = KeywordMatcher([(keyword, keyword) for keyword in keywords])
+    for _ in range(200):
+        text = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 20)))
+        assert found_keywords(matcher, text) == sorted(keyword for keyword in keywords if keyword in text)
+
+
+def test_case_accents_and_synonyms():
+    matcher = KeywordMatcher([('email|mail|boîte', 'gmail'), ('agenda', 'calendrier')])
+    assert matcher.best('Ma BOITE de réception déborde') == 'gmail'
+    assert matcher.best("Mon Agenda d'été") == 'calendrier'
+    assert matcher.best('bonjour') is None
+
+
+def test_whole_word_bonus_and_weights():
+    matcher = KeywordMatcher([('mail', 'partiel'), ('rendez', 'rdv', 10)])
+    assert matcher.scores('gmail')[0] == 4.0
+    assert matcher.scores('un mail')[0] == 4.0 * WHOLE_WORD_BONUS
+    assert matcher.best('mail pour un rendez-vous') == 'rdv'
+
+
+def test_tie_keeps_first_declared():
+    matcher = KeywordMatcher([('facture', 'premier'), ('devis', 'second', 7)])
+    assert matcher.best('facture et devis') == 'premier'
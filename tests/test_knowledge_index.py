@@ -0,0 +1,89 @@
+# Index de connaissances : recherche, reconstruction pendant une recherche, rechargement sur changement
+
+import time
+import threading
+
+import pytest
+
+from knowledge_index import KnowledgeBase
+
+
+TOPICS = ['archive', 'libelle', 'brouillon', 'signature', 'transfert', 'spam', 'corbeille', 'pieces', 'contacts',
+          'rappel']
+
+
+def write_documents(folder, count):
+    folder.mkdir(parents=True, exist_ok=True)
+    for old in folder.iterdir():
+        old.unlink()
+    for index in range(count):
+        (folder / f'doc{index}.md').write_text(
+            f"# Filtre {index}\nPour un filtre gmail {TOPICS[index % 10]}{index}, ouvrez les paramètres puis filtres.\n",
+            encoding='utf-8')
+
+
+@pytest.fixture
+def knowledge(tmp_path):
+    write_documents(tmp_path / 'knowledge' / 'alex', 40)
+    base = KnowledgeBase(str(tmp_path / 'knowledge'), str(tmp_path / 'knowledge' / '.index'), '', reload_interval=0)
+    base.warm()
+    return base
+
+
+def test_search_returns_matching_chunks(knowledge):
+    results = knowledge.search('alex', 'filtre gmail pieces7')
+    assert results and results[0][1]['title'] == 'Filtre 7'
+    assert knowledge.search('alex', '') == []
+    assert knowledge.search('inconnu', 'filtre') == []
+
+
+def test_rebuild_while_searching_keeps_old_index_readable(knowledge, tmp_path):
+    old = knowledge.indexes['alex']
+    # Moins de documents : la nouvelle matrice est plus petite que celle encore mappée
+    write_documents(tmp_path / 'knowledge' / 'alex', 1)
+    errors = []
+    stop = threading.Event()
+
+    def search():
+        try:
+            while not stop.is_set():
+                assert old.search('filtre gmail rappel39')
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=search)
+    thread.start()
+    try:
+        for _ in range(5):
+            knowledge.refresh('alex', rebuild=True)
+    finally:
+        stop.set()
+        thread.join(5)
+    assert not errors
+    assert old.search('filtre gmail rappel39')[0][1]['title'] == 'Filtre 39'
+    assert len(knowledge.indexes['alex'].chunks) == 1
+    assert not [path for path in (tmp_path / 'knowledge' / '.index').iterdir() if path.name.endswith('.tmp')]
+
+
+def test_changed_documents_reloaded_in_background(knowledge, tmp_path):
+    knowledge.reload_interval = 0.01
+    context = knowledge.context('alex', 'filtre gmail signature3')
+    assert 'Filtre 3' in context
+    old = knowledge.indexes['alex']
+    (tmp_path / 'knowledge' / 'alex' / 'labels.md').write_text(
+        "# Libellés\nLes libellés colorés organisent la boite.\n", encoding='utf-8')
+    time.sleep(0.02)
+    knowledge.get_index('alex')
+    deadline = time.monotonic() + 5
+    while knowledge.indexes['alex'] is old and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert knowledge.indexes['alex'] is not old
+    # Extraits mémorisés de l'ancien index oubliés
+    assert ('alex', 'filtre gmail signature3') not in knowledge._contexts
+    assert 'Libellés' in knowledge.context('alex', 'libellés colorés')
+
+
+def test_index_reloaded_from_disk_without_rebuild(knowledge):
+    fresh = KnowledgeBase(knowledge.knowledge_dir, knowledge.index_dir, '', reload_interval=0)
+    fresh.build = lambda agent: pytest.fail('index reconstruit alors que les documents sont inchangés')
+    assert len(fresh.get_index('alex').chunks) == 40
@@ -0,0 +1,97 @@
+# Messages normalisés : conversion des anciens blobs JSON (migration 0007, migrate-messages) et reprise
+
+import json
+from datetime import datetime, timedelta
+
+LEGACY_BLOB = json.dumps([
+    {'user_message': 'Bonjour Alex', 'agent_response': 'Bonjour !', 'source': 'openai',
+     'timestamp': '2026-01-01T10:00:00'},
+    {'user_message': 'Trie mes mails', 'agent_response': 'Voici comment trier.', 'source': 'openai',
+     'timestamp': '2026-01-01T10:01:00'},
+])
+
+
+def add_legacy_conversation(waveai, email='test@waveai.app'):
+    """Conversation récente encore stockée en blob (base démarrée sans migrations)"""
+    with waveai.app.app_context():
+        user = waveai.User.query.filter_by(email=email).first()
+        conversation = waveai.Conversation(user_id=user.id, agent_type='alex', title='Ancienne', messages=LEGACY_BLOB,
+                                           updated_at=datetime.utcnow() - timedelta(minutes=1))
+        waveai.db.session.add(conversation)
+        waveai.db.session.commit()
+        return user.id, conversation.id
+
+
+def message_rows(waveai, conversation_id):
+    with waveai.app.app_context():
+        return [(message.role, message.content) for message in
+                waveai.latest_messages_query(conversation_id).all()[::-1]]
+
+
+def test_legacy_conversation_not_resumed_before_conversion(waveai, client, fake_provider):
+    user_id, legacy_id = add_legacy_conversation(waveai)
+
+    # Ni par son id, ni comme conversation active : un nouvel échange ne se mêle pas au blob
+    response = client.post('/api/chat', json={'message': 'Et mon agenda ?', 'agent': 'alex', 'conversation_id': legacy_id})
+    assert response.status_code == 200
+    new_id = response.get_json()['conversation_id']
+    assert new_id != legacy_id
+    assert client.post('/api/chat', json={'message': 'Encore', 'agent': 'alex'}).get_json()['conversation_id'] == new_id
+    assert message_rows(waveai, legacy_id) == []
+
+    result = waveai.app.test_cli_runner().invoke(args=['migrate-messages'])
+    assert '1 conversation(s)' in result.output
+    assert message_rows(waveai, legacy_id) == [('user', 'Bonjour Alex'), ('assistant', 'Bonjour !'),
+                                               ('user', 'Trie mes mails'), ('assistant', 'Voici comment trier.')]
+    with waveai.app.app_context():
+        assert waveai.db.session.get(waveai.Conversation, legacy_id).messages is None
+
+    # Idempotent : le blob vidé n'est pas reconverti
+    assert '0 conversation(s)' in waveai.app.test_cli_runner().invoke(args=['migrate-messages']).output
+    assert len(message_rows(waveai, legacy_id)) == 4
+
+    # Convertie, elle se reprend avec son historique
+    response = client.post('/api/chat', json={'message': 'Suite', 'agent': 'alex', 'conversation_id': legacy_id})
+    assert response.get_json()['conversation_id'] == legacy_id
+    history = fake_provider.calls[-1][2]
+    assert history is not None and 'Trie mes mails' in history.to_text()
+
+
+def test_upgrade_converts_blobs_in_migration(baseline_db):
+    baseline_db.execute("INSERT INTO users (id, email, name) VALUES (1, 'ancien@waveai.app', 'Ancien')")
+    baseline_db.execute("INSERT INTO conversations (id, user_id, agent_type, title, messages, created_at, updated_at) "
+                        "VALUES (1, 1, 'alex', 'Ancienne', ?, '2026-01-01 10:00:00', '2026-01-01 10:01:00')",
+                        (LEGACY_BLOB,))
+    baseline_db.execute("INSERT INTO conversations (id, user_id, agent_type, messages) VALUES (2, 1, 'kai', 'pas du json')")
+
+    result = baseline_db.run()
+    assert result.returncode == 0, result.stderr
+    assert baseline_db.execute("SELECT role, content, source FROM messages WHERE conversation_id = 1 ORDER BY id") == [
+        ('user', 'Bonjour Alex', None), ('assistant', 'Bonjour !', 'openai'),
+        ('user', 'Trie mes mails', None), ('assistant', 'Voici comment trier.', 'openai')]
+    assert baseline_db.execute("SELECT id FROM conversations WHERE messages IS NOT NULL") == []
+    # Messages convertis indexés pour la recherche (déclencheurs FTS5 de 0005)
+    assert baseline_db.execute("SELECT rowid FROM messages_fts WHERE messages_fts MATCH 'trier'")
+
+    result = baseline_db.run('migrate-messages')
+    assert '0 conversation(s)' in result.stdout, result.stderr
+
+
+def test_concurrent_first_messages_share_one_conversation(waveai, client, fake_provider):
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Premiers messages simultanés du même utilisateur au même agent : une seule conversation créée
+    cookie = client.get_cookie('session').value
+
+    def chat(index):
+        parallel = waveai.app.test_client()
+        parallel.set_cookie('session', cookie)
+        return parallel.post('/api/chat', json={'message': f'Question {index}', 'agent': 'alex'}).get_json()
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(chat, range(5)))
+
+    assert {result['conversation_id'] for result in results} == {results[0]['conversation_id']}
+    with waveai.app.app_context():
+        assert waveai.Conversation.query.filter_by(agent_type='alex').count() == 1
+    assert len(message_rows(waveai, results[0]['conversation_id'])) == 10
@@ -0,0 +1,110 @@
+# Métriques Prometheus : rendu des compteurs et histogrammes, collecteurs, /metrics et étapes du chat
+
+import re
+
+from metrics import MetricsRegistry, Histogram
+
+
+def sample(text, name, **labels):
+    """Valeur d'un échantillon du format texte (0 s'il est absent)"""
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        match = re.match(r'^([a-z_]+)(?:\{(.*)\})? (\S+)$', line)
+        if not match or match.group(1) != name:
+            continue
+        found = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(2) or ''))
+        if all(found.get(key) == value for key, value in labels.items()):
+            return float(match.group(3))
+    return 0.0
+
+
+def test_counter_and_gauge_render_with_escaped_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter('waveai_test_total', 'Test', ['source'])
+    counter.inc(source='openai')
+    counter.inc(2, source='dit "bonjour"\n')
+    gauge = registry.gauge('waveai_test_level', 'Niveau')
+    gauge.set(0.5)
+    text = registry.render()
+    assert '# TYPE waveai_test_total counter' in text
+    assert 'waveai_test_total{source="openai"} 1' in text
+    assert 'waveai_test_total{source="dit \\"bonjour\\"\\n"} 2' in text
+    assert 'waveai_test_level 0.5' in text
+    # Même nom : même métrique
+    assert registry.counter('waveai_test_total', 'Test', ['source']) is counter
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('waveai_test_seconds', 'Test', buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+    lines = histogram.render()
+    assert lines == [
+        'waveai_test_seconds_bucket{le="0.1"} 2',
+        'waveai_test_seconds_bucket{le="1"} 3',
+        'waveai_test_seconds_bucket{le="+Inf"} 4',
+        'waveai_test_seconds_sum 2.65',
+        'waveai_test_seconds_count 4',
+    ]
+
+
+def test_timer_as_context_manager_and_decorator():
+    histogram = Histogram('waveai_test_seconds', 'Test', ['stage'])
+
+    @histogram.time(stage='decorated')
+    def work():
+        """Documentée"""
+        return 42
+
+    assert work() == 42 and work.__doc__ == 'Documentée'
+    with histogram.time(stage='block'):
+        pass
+    text = '\n'.join(histogram.render())
+    assert sample(text, 'waveai_test_seconds_count', stage='decorated') == 1
+    assert sample(text, 'waveai_test_seconds_count', stage='block') == 1
+
+
+def test_failing_collector_does_not_break_render():
+    registry = MetricsRegistry()
+
+    @registry.collector
+    def broken():
+        raise RuntimeError('indisponible')
+
+    @registry.collector
+    def jobs():
+        return [('waveai_test_jobs', 'gauge', 'Tâches', [({'status': 'queued'}, 3), ({'status': 'done'}, None)])]
+
+    text = registry.render()
+    assert 'waveai_test_jobs{status="queued"} 3' in text
+    assert 'status="done"' not in text
+
+
+def test_chat_records_stage_provider_and_response_metrics(waveai, client, fake_provider):
+    before = client.get('/metrics').get_data(as_text=True)
+    assert client.post('/api/chat', json={'message': 'Bonjour', 'agent': 'kai'}).status_code == 200
+    response = client.get('/metrics')
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    after = response.get_data(as_text=True)
+
+    def delta(name, **labels):
+        return sample(after, name, **labels) - sample(before, name, **labels)
+
+    for stage in ('settings', 'cache', 'provider', 'save'):
+        assert delta('waveai_chat_stage_seconds_count', stage=stage) == 1, stage
+    assert delta('waveai_provider_call_seconds_count', provider='huggingface', outcome='ok') == 1
+    assert delta('waveai_chat_responses_total', source='huggingface', cached='false') == 1
+    assert delta('waveai_tokens_total', provider='huggingface', kind='completion') > 0
+    assert delta('waveai_http_request_seconds_count', endpoint='api_chat', method='POST', status='200') == 1
+    # Collecteurs : états lus au moment de la requête
+    assert '# TYPE waveai_db_pool_connections gauge' in after
+    assert delta('waveai_cache_lookups_total', cache='model', result='miss') >= 1
+
+
+def test_metrics_token(waveai, app_db, monkeypatch):
+    monkeypatch.setenv('WAVEAI_METRICS_TOKEN', 'secret')
+    client = app_db.app.test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer autre'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
@@ -0,0 +1,75 @@
+# Migrations 0001 → head sur une base créée avant les migrations, index du chemin chaud et dédoublonnage
+
+import pytest
+
+HEAD = '0007_convert_message_blobs'
+
+EXPECTED_INDEXES = {
+    'ai_settings': {'ix_ai_settings_user_id'},
+    'conversations': {'ix_conversations_user_agent_updated', 'ix_conversations_user_created',
+                      'ix_conversations_user_agent_created'},
+    'messages': {'ix_messages_conversation_created_id'},
+    'user_stats': {'ix_user_stats_user_id'},
+    'chat_jobs': {'ix_chat_jobs_status_created'},
+}
+
+
+def add_user(baseline_db, user_id, settings=1):
+    baseline_db.execute("INSERT INTO users (id, email, name) VALUES (?, ?, ?)",
+                        (user_id, f'user{user_id}@waveai.app', f'User {user_id}'))
+    for index in range(settings):
+        baseline_db.execute("INSERT INTO ai_settings (user_id, default_model, created_at) VALUES (?, ?, ?)",
+                            (user_id, f'modele-{index}', f'2026-01-0{index + 1} 10:00:00'))
+
+
+def test_baseline_upgraded_to_head(baseline_db):
+    add_user(baseline_db, 1)
+    result = baseline_db.run()
+    assert result.returncode == 0, result.stderr
+    assert baseline_db.execute("SELECT version_num FROM alembic_version") == [(HEAD,)]
+    for table, indexes in EXPECTED_INDEXES.items():
+        assert indexes <= baseline_db.indexes(table), table
+    assert baseline_db.execute("SELECT name FROM sqlite_master WHERE name = 'messages_fts'")
+    # Colonnes ajoutées aux tables existantes
+    columns = {row[1] for row in baseline_db.execute("PRAGMA table_info('ai_settings')")}
+    assert 'response_cache_enabled' in columns
+
+    # Modèles et migrations d'accord, requêtes du chemin chaud servies par un index
+    check = baseline_db.run('db', 'check')
+    assert 'No new upgrade operations detected' in check.stdout + check.stderr
+    explain = baseline_db.run('explain-hot-queries')
+    assert explain.returncode == 0, explain.stderr
+    assert '✅ active_conversation' in explain.stdout and '❌' not in explain.stdout
+
+    # Redémarrage : migrations déjà appliquées, rien ne change
+    assert baseline_db.run().returncode == 0
+    assert baseline_db.execute("SELECT version_num FROM alembic_version") == [(HEAD,)]
+
+
+def test_duplicated_settings_skip_unique_index_until_dedupe(baseline_db):
+    add_user(baseline_db, 1, settings=2)
+    add_user(baseline_db, 2, settings=1)
+    result = baseline_db.run()
+    assert result.returncode == 0, result.stderr
+    # Rien supprimé au démarrage : index unique simplement reporté
+    assert 'dedupe-ai-settings' in result.stderr
+    assert 'ix_ai_settings_user_id' not in baseline_db.indexes('ai_settings')
+    assert baseline_db.execute("SELECT COUNT(*) FROM ai_settings") == [(3,)]
+    assert {'ix_conversations_user_created', 'ix_conversations_user_agent_created'} <= baseline_db.indexes('conversations')
+    assert baseline_db.execute("SELECT version_num FROM alembic_version") == [(HEAD,)]
+
+    dry_run = baseline_db.run('dedupe-ai-settings', '--dry-run')
+    assert '1 ligne(s) en double (rien supprimé)' in dry_run.stdout, dry_run.stderr
+    assert baseline_db.execute("SELECT COUNT(*) FROM ai_settings") == [(3,)]
+
+    dedupe = baseline_db.run('dedupe-ai-settings')
+    assert '1 ligne(s) en double supprimée(s)' in dedupe.stdout, dedupe.stderr
+    assert 'ai_settings supprimé : id=2 user_id=1' in dedupe.stderr
+    # La plus ancienne ligne (celle que lisait l'application) est conservée
+    assert baseline_db.execute("SELECT id, user_id, default_model FROM ai_settings ORDER BY id") == [
+        (1, 1, 'modele-0'), (3, 2, 'modele-0')]
+    assert 'ix_ai_settings_user_id' in baseline_db.indexes('ai_settings')
+    with pytest.raises(Exception):
+        baseline_db.execute("INSERT INTO ai_settings (user_id) VALUES (1)")
+
+    assert '0 ligne(s) en double' in baseline_db.run('dedupe-ai-settings').stdout
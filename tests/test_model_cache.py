@@ -0,0 +1,91 @@
+# Cache des utilisateurs et paramètres IA : aucune requête tant qu'il est valide, invalidé à chaque écriture
+
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from model_cache import ModelCache, model_cache
+
+
+@contextmanager
+def statements(engine):
+    """Requêtes SQL exécutées dans le bloc"""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield executed
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def user_id(waveai):
+    with waveai.app.app_context():
+        return waveai.User.query.filter_by(email='test@waveai.app').first().id
+
+
+def test_hits_misses_invalidation_and_expiry():
+    cache = ModelCache(ttl=1)
+    assert cache.get('user', 1) is None
+    cache.set('user', 1, {'name': 'Test'})
+    assert cache.get('user', 1) == {'name': 'Test'}
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    cache.invalidate('user', 1)
+    assert cache.get('user', 1) is None
+
+    cache.set('user', 1, {'name': 'Test'})
+    cache.backend._items[('user', 1)] = (time.time() - 1, {'name': 'Test'})
+    assert cache.get('user', 1) is None
+
+
+def test_disabled_with_zero_ttl():
+    cache = ModelCache(ttl=0)
+    cache.set('user', 1, {'name': 'Test'})
+    assert cache.get('user', 1) is None
+    assert cache.stats()['enabled'] is False
+
+
+def test_chat_reads_settings_once(waveai, client, fake_provider):
+    client.post('/api/chat', json={'message': 'Bonjour', 'agent': 'kai'})
+    with waveai.app.app_context(), statements(waveai.db.engine) as executed:
+        client.post('/api/chat', json={'message': 'Encore', 'agent': 'kai'})
+    assert not [sql for sql in executed if 'FROM ai_settings' in sql]
+
+
+def test_dashboard_reads_user_once(waveai, client):
+    client.get('/dashboard')
+    with waveai.app.app_context(), statements(waveai.db.engine) as executed:
+        assert client.get('/dashboard').status_code == 200
+    assert not [sql for sql in executed if 'FROM users' in sql]
+
+
+def test_settings_update_invalidates_cache(waveai, client):
+    uid = user_id(waveai)
+    with waveai.app.test_request_context():
+        assert waveai.get_settings_snapshot(uid).default_model != 'anthropic'
+
+    client.post('/ai-settings', data={'default_model': 'anthropic', 'anthropic_key': 'sk-ant-test',
+                                      'temperature': '0.2', 'max_tokens': '500'})
+    with waveai.app.test_request_context():
+        snapshot = waveai.get_settings_snapshot(uid)
+    assert snapshot.default_model == 'anthropic'
+    assert snapshot.anthropic_api_key == 'sk-ant-test'
+    assert snapshot.temperature == 0.2 and snapshot.max_tokens == 500
+
+
+def test_cached_user_can_be_modified(waveai, client):
+    uid = user_id(waveai)
+    with waveai.app.test_request_context():
+        waveai.load_user(uid)
+        assert model_cache.get('user', uid) is not None
+        # Copie rattachée à la session : les écritures passent comme pour un objet chargé
+        user = waveai.load_user(uid)
+        user.name = 'Nouveau Nom'
+        waveai.db.session.commit()
+        model_cache.invalidate('user', uid)
+        assert waveai.load_user(uid).name == 'Nouveau Nom'
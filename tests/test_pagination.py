@@ -0,0 +1,81 @@
+# Curseurs keyset (aller-retour, parcours complet sans doublon) et ETag des listes
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, Column, Integer, DateTime
+from sqlalchemy.orm import declarative_base, Session
+from werkzeug.http import parse_etags
+from werkzeug.wrappers import Response
+
+from pagination import (encode_cursor, decode_cursor, keyset_page, parse_limit, etag_for, InvalidCursor)
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = 'rows'
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    start = datetime(2026, 1, 1, 12, 0, 0)
+    with Session(engine) as session:
+        # Horodatages en double : l'id départage les lignes créées dans la même seconde
+        session.add_all(Row(id=index, created_at=start + timedelta(seconds=index // 3)) for index in range(1, 24))
+        session.commit()
+        yield session
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 3, 4, 5, 6, 7, 890123)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+@pytest.mark.parametrize('cursor', ['', 'pas-un-curseur', encode_cursor(None, 1), 'fHg'])
+def test_tampered_cursor_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_parse_limit_bounds():
+    assert parse_limit(None) == 20
+    assert parse_limit('abc') == 20
+    assert parse_limit('0') == 1
+    assert parse_limit('1000') == 100
+
+
+@pytest.mark.parametrize('descending', [True, False])
+def test_pages_cover_every_row_once(session, descending):
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        rows, cursor = keyset_page(session.query(Row), Row.created_at, Row.id, cursor, limit=5, descending=descending)
+        seen.extend(row.id for row in rows)
+        pages += 1
+        if cursor is None:
+            break
+    expected = sorted(range(1, 24), key=lambda index: (index // 3, index), reverse=descending)
+    assert seen == expected
+    assert pages == 5
+
+
+def test_last_full_page_has_no_cursor(session):
+    rows, cursor = keyset_page(session.query(Row).filter(Row.id <= 10), Row.created_at, Row.id, limit=10)
+    assert len(rows) == 10 and cursor is None
+
+
+def test_etag_round_trip():
+    etag = etag_for('messages', 7, datetime(2026, 1, 1), None, 20, True)
+    assert etag == etag_for('messages', 7, datetime(2026, 1, 1), None, 20, True)
+    assert etag != etag_for('messages', 7, datetime(2026, 1, 2), None, 20, True)
+    response = Response()
+    response.set_etag(etag)
+    # Le client renvoie l'en-tête ETag tel quel dans If-None-Match
+    assert parse_etags(response.headers['ETag']).contains(etag)
+    assert not parse_etags(response.headers['ETag']).contains(etag_for('messages', 8))
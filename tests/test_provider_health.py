@@ -0,0 +1,118 @@
+# Registre de santé des providers : lecture en cache, rafraîchissement non bloquant, latences et exclusion
+
+import time
+import threading
+from types import SimpleNamespace
+
+from provider_health import ProviderHealthRegistry, hf_endpoint_name, percentile
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condition jamais remplie'
+        time.sleep(0.005)
+
+
+def test_register_is_idempotent_and_unknown_uses_default():
+    registry = ProviderHealthRegistry(ttl=60)
+    first = registry.register('openai', default_up=False)
+    assert registry.register('openai', default_up=True) is first
+    assert registry.is_up('openai') is False
+    assert registry.is_up('inconnu') is True
+    assert registry.is_up('inconnu', default=False) is False
+
+
+def test_stale_read_returns_cached_state_without_waiting_for_probe():
+    release = threading.Event()
+    probes = []
+
+    def probe():
+        probes.append(1)
+        release.wait(2)
+        return False
+
+    registry = ProviderHealthRegistry(ttl=60)
+    registry.register('openai', probe)
+    started = time.monotonic()
+    # Jamais sondé : état par défaut renvoyé tout de suite, sonde lancée en arrière-plan
+    assert registry.is_up('openai') is True
+    assert registry.is_up('openai') is True
+    assert time.monotonic() - started < 0.5
+    release.set()
+    wait_for(lambda: registry.endpoints['openai'].checked_at is not None)
+    # Un seul rafraîchissement à la fois
+    assert len(probes) == 1
+    assert registry.is_up('openai') is False
+
+
+def test_fresh_state_is_not_probed_again():
+    probes = []
+    registry = ProviderHealthRegistry(ttl=60)
+    registry.register('openai', lambda: probes.append(1) or True)
+    registry.refresh('openai')
+    for _ in range(10):
+        registry.is_up('openai')
+    assert probes == [1]
+
+    registry.endpoints['openai'].checked_at -= 61
+    registry.is_up('openai')
+    wait_for(lambda: len(probes) == 2)
+
+
+def test_probe_error_marks_endpoint_down():
+    def probe():
+        raise ConnectionError('refusée')
+
+    registry = ProviderHealthRegistry(ttl=60)
+    registry.register('anthropic', probe)
+    assert registry.refresh('anthropic') is False
+    snapshot = registry.snapshot()['anthropic']
+    assert snapshot['up'] is False
+    assert 'refusée' in snapshot['last_error']
+
+
+def test_recorded_calls_feed_error_rate_and_latency_percentiles():
+    registry = ProviderHealthRegistry(window=10)
+    for latency in (0.1, 0.2, 0.3, 0.4):
+        registry.record('openai', True, latency)
+    registry.record('openai', False, 1.0, error='timeout')
+    snapshot = registry.snapshot()['openai']
+    assert snapshot['samples'] == 5
+    assert snapshot['error_rate'] == 0.2
+    assert snapshot['latency_ms']['p50'] == 300.0
+    assert registry.percentile('openai', 95) == 1.0
+    assert registry.call_samples('openai') == 5
+    assert percentile([], 95) is None
+
+
+def test_background_loop_refreshes_all_endpoints():
+    registry = ProviderHealthRegistry(ttl=60, interval=0.01)
+    registry.register('ollama', lambda: True, default_up=False)
+    registry.start()
+    try:
+        wait_for(lambda: registry.is_up('ollama'))
+    finally:
+        registry.stop()
+
+
+def test_hf_endpoint_name():
+    assert hf_endpoint_name('https://api-inference.huggingface.co/models/microsoft/DialoGPT-medium') == \
+        'huggingface:microsoft/DialoGPT-medium'
+
+
+def test_down_endpoint_is_skipped_in_provider_order(app_db):
+    ai_system = app_db.ai_system
+    settings = SimpleNamespace(default_model='openai', openai_api_key='sk-a', anthropic_api_key='sk-b')
+    assert ai_system.get_provider_order(settings)[0] == 'openai'
+
+    app_db.health_registry.register('openai', default_up=False)
+    assert 'openai' not in ai_system.get_provider_order(settings)
+    # Ollama inconnu du registre : considéré indisponible
+    assert ai_system.check_ollama_availability() is False
+
+
+def test_status_endpoint_exposes_health(app_db):
+    app_db.health_registry.record('openai', True, 0.25)
+    data = app_db.app.test_client().get('/api/status/providers').get_json()
+    assert data['health']['openai']['samples'] == 1
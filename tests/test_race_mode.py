@@ -0,0 +1,100 @@
+# Mode course : les N premiers providers en parallèle, première bonne réponse gardée, repli séquentiel
+
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def race(app_db, monkeypatch):
+    """Système IA en mode course (largeur 2), providers simulés et scores de victoires remis à zéro"""
+    ai_system = app_db.ai_system
+    monkeypatch.setattr(ai_system, 'race_mode', True)
+    monkeypatch.setattr(ai_system, 'race_width', 2)
+    monkeypatch.setattr(ai_system, 'race_timeout', 5)
+    monkeypatch.setattr(ai_system, 'provider_wins', {name: 0 for name in ai_system.providers})
+    monkeypatch.setattr(ai_system, 'provider_scores', {name: 0.0 for name in ai_system.providers})
+    monkeypatch.setattr(ai_system, 'coalesce', False)
+    calls = []
+
+    def provider(name, delay=0.0, reply=True):
+        def call(message, agent_type, settings, history=None):
+            calls.append(name)
+            time.sleep(delay)
+            if not reply:
+                return None
+            return ai_system.make_response(f"{name} : {message}", name, agent_type)
+        monkeypatch.setitem(ai_system.providers, name, call)
+
+    return SimpleNamespace(system=ai_system, use=provider, calls=calls)
+
+
+SETTINGS = SimpleNamespace(default_model='openai', openai_api_key='sk-a', anthropic_api_key='sk-b',
+                           huggingface_token=None, temperature=0.7, max_tokens=500, use_ollama=False,
+                           response_cache_enabled=False)
+
+
+def test_fastest_racer_wins(race):
+    race.use('openai', delay=0.5)
+    race.use('anthropic', delay=0.01)
+    race.use('huggingface')
+
+    started = time.monotonic()
+    response = race.system.get_response('Bonjour', 'kai', SETTINGS)
+    assert response['source'] == 'anthropic'
+    # Le perdant lent n'est pas attendu
+    assert time.monotonic() - started < 0.4
+    assert race.system.provider_wins['anthropic'] == 1 and race.system.provider_wins['openai'] == 0
+    # Seuls les deux premiers courent
+    assert sorted(race.calls) == ['anthropic', 'openai']
+
+
+def test_failed_racer_does_not_win(race):
+    race.use('openai', reply=False)
+    race.use('anthropic', delay=0.1)
+    race.use('huggingface')
+    assert race.system.get_response('Bonjour', 'kai', SETTINGS)['source'] == 'anthropic'
+
+
+def test_remaining_providers_tried_in_order_when_racers_fail(race):
+    race.use('openai', reply=False)
+    race.use('anthropic', reply=False)
+    race.use('huggingface')
+    response = race.system.get_response('Bonjour', 'kai', SETTINGS)
+    assert response['source'] == 'huggingface'
+    assert race.calls[-1] == 'huggingface'
+    assert race.system.provider_wins['huggingface'] == 1
+
+
+def test_no_answer_falls_back(race):
+    for name in ('openai', 'anthropic', 'huggingface'):
+        race.use(name, reply=False)
+    assert race.system.get_response('Bonjour', 'kai', SETTINGS)['source'] == 'fallback'
+
+
+def test_racers_run_outside_the_request_thread(race, monkeypatch):
+    threads = []
+    ai_system = race.system
+
+    def call(message, agent_type, settings, history=None):
+        threads.append(threading.current_thread().name)
+        # Copie des réglages : jamais l'objet de la session SQLAlchemy
+        assert settings is not SETTINGS and settings.openai_api_key == 'sk-a'
+        return ai_system.make_response('ok', 'openai', agent_type)
+
+    race.use('anthropic', reply=False)
+    race.use('huggingface')
+    monkeypatch.setitem(race.system.providers, 'openai', call)
+    assert race.system.get_response('Bonjour', 'kai', SETTINGS)['source'] == 'openai'
+    assert threads and threads[0].startswith('waveai-race')
+
+
+def test_sequential_mode_stops_at_first_answer(race, monkeypatch):
+    monkeypatch.setattr(race.system, 'race_mode', False)
+    race.use('openai')
+    race.use('anthropic')
+    race.use('huggingface')
+    assert race.system.get_response('Bonjour', 'kai', SETTINGS)['source'] == 'openai'
+    assert race.calls == ['openai']
@@ -0,0 +1,99 @@
+# Seaux à jetons (recharge, rafale, Retry-After) et quotas journaliers écrits par le thread de flush
+
+import time
+
+from rate_limit import TokenBucket, RateLimiter, QuotaTracker, parse_rate, client_ip
+
+
+def test_parse_rate():
+    assert parse_rate('20/60') == (20.0, 60.0)
+    assert parse_rate('5') == (5.0, 1.0)
+    for spec in ('', '0', 'off', None, '0/60'):
+        assert parse_rate(spec) is None
+
+
+def test_bucket_burst_then_retry_after():
+    bucket = TokenBucket(3, 60, now=0.0)
+    assert [bucket.take(0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    # 3 jetons par minute : un jeton toutes les 20 s
+    assert bucket.take(0.0) == 20.0
+    assert bucket.take(5.0) == 15.0
+
+
+def test_bucket_refills_proportionally_to_elapsed_time():
+    bucket = TokenBucket(3, 60, now=0.0)
+    for _ in range(3):
+        bucket.take(0.0)
+    bucket.refill(30.0)
+    assert bucket.tokens == 1.5
+    assert bucket.take(30.0) == 0.0
+    assert bucket.take(30.0) == 10.0
+
+
+def test_bucket_refill_capped_at_capacity():
+    bucket = TokenBucket(3, 60, now=0.0)
+    bucket.take(0.0)
+    bucket.refill(3600.0)
+    assert bucket.tokens == 3
+    assert [bucket.take(3600.0) for _ in range(4)][-1] == 20.0
+
+
+def test_limiter_scopes_and_lru_eviction():
+    limiter = RateLimiter({'user': (1, 60), 'ip': None}, max_buckets=2)
+    assert limiter.hit('ip', '1.2.3.4') == 0.0
+    assert limiter.hit('user', 1) == 0.0
+    assert limiter.hit('user', 1) > 0
+    assert limiter.remaining('user', 1) == 0
+    limiter.hit('user', 2)
+    limiter.hit('user', 3)
+    # Seau le moins récemment utilisé oublié : l'utilisateur 1 repart d'un seau plein
+    assert ('user', 1) not in limiter.buckets
+    assert limiter.hit('user', 1) == 0.0
+    assert limiter.stats()['rejected'] == {'user': 1}
+
+
+def test_client_ip_trusts_only_configured_proxies():
+    assert client_ip('10.0.0.1', '6.6.6.6, 1.2.3.4', proxy_count=1) == '1.2.3.4'
+    assert client_ip('10.0.0.1', '6.6.6.6, 1.2.3.4', proxy_count=0) == '10.0.0.1'
+    assert client_ip('10.0.0.1', '1.2.3.4', proxy_count=2) == '10.0.0.1'
+
+
+class MemoryQuotaStore:
+    def __init__(self):
+        self.rows = {}
+        self.writes = 0
+
+    def load(self, user_id, day):
+        return self.rows.get((user_id, day), (0, 0))
+
+    def add(self, user_id, day, requests, tokens):
+        self.writes += 1
+        current = self.rows.get((user_id, day), (0, 0))
+        self.rows[(user_id, day)] = (current[0] + requests, current[1] + tokens)
+        return self.rows[(user_id, day)]
+
+
+def test_quota_flushed_by_timer_thread():
+    store = MemoryQuotaStore()
+    tracker = QuotaTracker(store, daily_requests=2, daily_tokens=0, flush_interval=0.05)
+    try:
+        tracker.add(1, requests=1, tokens=10)
+        tracker.add(1, requests=1, tokens=5)
+        assert tracker.check(1) > 0
+        deadline = time.monotonic() + 2
+        while tracker.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Deltas groupés en une écriture, sans nouvelle requête pour déclencher le flush
+        assert not tracker.pending
+        assert store.writes == 1
+        assert list(store.rows.values()) == [(2, 15)]
+    finally:
+        tracker.close()
+
+
+def test_quota_disabled_by_default_limits():
+    store = MemoryQuotaStore()
+    tracker = QuotaTracker(store, daily_requests=0, daily_tokens=0)
+    tracker.add(1, requests=1)
+    assert tracker.check(1) == 0
+    assert tracker._thread is None and not tracker.pending
@@ -0,0 +1,63 @@
+# Cache des réponses : portée de la clé, hits non décomptés, champs internes jamais stockés ni renvoyés
+
+import pytest
+
+from response_cache import ResponseCache, MemoryCacheBackend, make_cache_key
+
+
+@pytest.fixture
+def cache(app_db, monkeypatch):
+    cache = ResponseCache(MemoryCacheBackend(max_entries=10))
+    monkeypatch.setattr(app_db.ai_system, 'response_cache', cache)
+    return cache
+
+
+def test_key_normalizes_message_and_separates_scope():
+    assert make_cache_key('kai', 'gpt', 0.2, 'Bonjour, ça va ?') == make_cache_key('kai', 'gpt', 0.2, 'bonjour ca va')
+    assert make_cache_key('kai', 'gpt', 0.2, 'Bonjour') != make_cache_key('alex', 'gpt', 0.2, 'Bonjour')
+    assert make_cache_key('kai', 'gpt', 0.2, 'Bonjour') != make_cache_key('kai', 'gpt', 0.2, 'Bonjour', scope='cle-a')
+    assert make_cache_key('kai', 'gpt', 0.2, 'Bonjour', extra='h1') != make_cache_key('kai', 'gpt', 0.2, 'Bonjour', extra='h2')
+
+
+def test_hot_temperature_is_not_cached():
+    cache = ResponseCache(MemoryCacheBackend(), max_temperature=0.7)
+    cache.set('kai', 'gpt', 0.9, 'Bonjour', {'response': 'x'})
+    assert cache.get('kai', 'gpt', 0.9, 'Bonjour') is None
+    assert cache.stores == 0
+
+
+def test_hit_skips_provider_and_strips_internal_fields(waveai, client, fake_provider, cache):
+    first = client.post('/api/chat', json={'message': 'Quelle heure est-il ?', 'agent': 'kai'}).get_json()
+    assert 'cached' not in first
+    assert len(fake_provider.calls) == 1
+
+    stored = cache.backend.get(next(iter(cache.backend._items)))
+    assert 'tokens' not in stored and 'usage' not in stored
+
+    # Premier message d'un autre utilisateur (sans historique ni clés API) : même clé
+    other = waveai.app.test_client()
+    other.post('/login', data={'email': 'autre@waveai.app'})
+    second = other.post('/api/chat', json={'message': 'quelle heure est il', 'agent': 'kai'}).get_json()
+    assert second['cached'] is True
+    assert second['response'] == first['response']
+    assert 'tokens' not in second and 'usage' not in second
+    assert len(fake_provider.calls) == 1
+    assert cache.stats()['hits'] == 1
+
+    # Suite de la conversation : l'historique entre dans la clé
+    client.post('/api/chat', json={'message': 'Quelle heure est-il ?', 'agent': 'kai'})
+    assert len(fake_provider.calls) == 2
+
+
+def test_entry_stored_before_filtering_is_stripped_on_hit(waveai, fake_provider, cache):
+    cache.set('kai', 'huggingface', 0.7, 'Bonjour', {'response': 'Salut', 'source': 'openai', 'agent': 'kai',
+                                                       'tokens': 42, 'usage': {'prompt_tokens': 40}})
+    response = waveai.ai_system.get_response('Bonjour', 'kai')
+    assert response['response'] == 'Salut' and response['cached'] is True
+    assert 'tokens' not in response and 'usage' not in response
+
+
+def test_fallback_response_is_not_cached(waveai, client, fake_provider, cache):
+    fake_provider.reply = lambda message: ''
+    client.post('/api/chat', json={'message': 'Personne ne répond', 'agent': 'kai'})
+    assert cache.stores == 0
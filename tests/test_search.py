@@ -0,0 +1,84 @@
+# Recherche plein texte : FTS5 (SQLite migré) et repli LIKE, limitées aux messages de l'utilisateur
+
+from datetime import datetime
+
+import pytest
+
+from search_index import MessageSearch, search_terms, fts5_match, like_pattern
+
+
+@pytest.fixture
+def history(app_db):
+    """Deux utilisateurs, une conversation chacun ; renvoie (id de l'utilisateur principal, id de l'autre)"""
+    waveai = app_db
+    with waveai.app.app_context():
+        users = [waveai.User(email=f'{name}@waveai.app', name=name) for name in ('alice', 'bob')]
+        waveai.db.session.add_all(users)
+        waveai.db.session.flush()
+        contents = {
+            users[0].id: [('alex', 'Comment créer un filtre Gmail pour les factures ?'),
+                          ('alex', 'Le fichier rapport_2026 est dans la boîte'),
+                          ('alex', 'Le fichier rapport-2026 est archivé'),
+                          ('sofia', 'Planifier la réunion budget de lundi')],
+            users[1].id: [('alex', 'Mes factures Gmail à moi')],
+        }
+        for user_id, entries in contents.items():
+            for agent_type, content in entries:
+                conversation = waveai.Conversation(user_id=user_id, agent_type=agent_type, title=content[:20])
+                waveai.db.session.add(conversation)
+                waveai.db.session.flush()
+                waveai.db.session.add(waveai.Message(conversation_id=conversation.id, role='user', content=content,
+                                                     created_at=datetime.utcnow()))
+        waveai.db.session.commit()
+        return users[0].id, users[1].id
+
+
+def run_search(waveai, backend, *args, **kwargs):
+    search = MessageSearch(waveai.db)
+    with waveai.app.app_context():
+        if backend:
+            search._backend = backend
+        else:
+            assert search.backend() == 'fts5'
+        return search.search(*args, **kwargs)
+
+
+def test_query_syntax_is_neutralised():
+    assert search_terms('"filtre" OR gmail* -NOT (x)') == ['filtre', 'or', 'gmail', 'not', 'x']
+    assert fts5_match(3, ['filtre']) == 'owner : u3 AND content : ("filtre"*)'
+    assert like_pattern('a_b%c') == '%a\\_b\\%c%'
+
+
+@pytest.mark.parametrize('backend', [None, 'like'])
+def test_search_scoped_to_user_and_agent(app_db, history, backend):
+    alice, bob = history
+    results = run_search(app_db, backend, alice, 'factures gmail')
+    assert [result['snippet'] for result in results] == [
+        'Comment créer un filtre <mark>Gmail</mark> pour les <mark>factures</mark> ?']
+    assert results[0]['agent_type'] == 'alex'
+    assert [result['snippet'] for result in run_search(app_db, backend, bob, 'factures')] == [
+        'Mes <mark>factures</mark> Gmail à moi']
+    assert run_search(app_db, backend, alice, 'réunion', agent_type='alex') == []
+    assert len(run_search(app_db, backend, alice, 'réunion', agent_type='sofia')) == 1
+    assert run_search(app_db, backend, alice, '   ') == []
+
+
+def test_fts5_prefix_match(app_db, history):
+    alice, _ = history
+    assert [result['title'] for result in run_search(app_db, None, alice, 'planif')] == ['Planifier la réunion']
+
+
+def test_like_wildcards_taken_literally(app_db, history):
+    alice, _ = history
+    # « _ » n'est plus un joker : rapport-2026 ne correspond pas à rapport_2026
+    results = run_search(app_db, 'like', alice, 'rapport_2026')
+    assert [result['snippet'] for result in results] == ['Le fichier <mark>rapport_2026</mark> est dans la boîte']
+
+
+def test_search_endpoint(client, history):
+    assert client.get('/api/search').status_code == 400
+    response = client.get('/api/search?q=gmail')
+    assert response.status_code == 200
+    data = response.get_json()
+    # Utilisateur connecté sans message : rien des autres utilisateurs
+    assert data['engine'] == 'fts5' and data['results'] == []
@@ -0,0 +1,112 @@
+# Cache sémantique : seuil de similarité, forme négative, portée des clés, expiration et limite LRU
+
+import time
+
+import pytest
+
+from knowledge_index import HashingTfidfVectorizer
+from semantic_cache import SemanticCache, is_negated
+
+QUESTION = 'Comment organiser ma semaine de travail ?'
+ANSWER = {'response': 'Bloque tes créneaux.', 'source': 'openai', 'agent': 'kai'}
+
+
+def make_cache(**kwargs):
+    return SemanticCache(HashingTfidfVectorizer(dim=1024), **kwargs)
+
+
+def lookup(cache, message, agent='kai', temperature=0.2, scope=None):
+    return cache.get(agent, 'gpt', temperature, message, scope=scope)
+
+
+def test_similar_question_hits_above_threshold():
+    cache = make_cache(threshold=0.8)
+    cache.set('kai', 'gpt', 0.2, QUESTION, ANSWER)
+    hit = lookup(cache, 'Comment organiser ma semaine de travail efficacement ?')
+    assert hit['response'] == ANSWER['response']
+    assert hit['semantic_match']['question'] == QUESTION
+    assert 0.8 <= hit['semantic_match']['score'] < 1.0
+    assert lookup(cache, 'Quelle recette de gâteau au chocolat ?') is None
+
+
+def test_threshold_rejects_looser_matches():
+    cache = make_cache(threshold=0.92)
+    cache.set('kai', 'gpt', 0.2, QUESTION, ANSWER)
+    assert lookup(cache, 'comment organiser ma semaine de travail') is not None
+    assert lookup(cache, 'Comment organiser ma semaine de travail efficacement ?') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+@pytest.mark.parametrize('message, negated', [
+    ("Comment ne pas organiser ma semaine ?", True),
+    ("Pourquoi mon agenda n'est jamais à jour ?", True),
+    ("Why don't my reminders work?", True),
+    (QUESTION, False),
+])
+def test_is_negated(message, negated):
+    assert is_negated(message) is negated
+
+
+def test_negated_question_never_reuses_affirmative_answer():
+    cache = make_cache(threshold=0.5)
+    cache.set('kai', 'gpt', 0.2, QUESTION, ANSWER)
+    assert lookup(cache, 'Comment ne pas organiser ma semaine de travail ?') is None
+
+
+def test_context_partitions_are_separate():
+    cache = make_cache(threshold=0.9)
+    cache.set('kai', 'gpt', 0.2, QUESTION, ANSWER, scope='cle-a')
+    assert lookup(cache, QUESTION, scope='cle-a') is not None
+    assert lookup(cache, QUESTION, scope='cle-b') is None
+    assert lookup(cache, QUESTION) is None
+    assert lookup(cache, QUESTION, agent='alex', scope='cle-a') is None
+    assert lookup(cache, QUESTION, temperature=0.3, scope='cle-a') is None
+
+
+def test_disabled_agents_and_hot_temperature_bypass_cache():
+    cache = make_cache(disabled_agents=['sofia'], max_temperature=0.7)
+    cache.set('sofia', 'gpt', 0.2, QUESTION, ANSWER)
+    cache.set('kai', 'gpt', 0.9, QUESTION, ANSWER)
+    assert cache.stores == 0
+
+
+def test_expired_entries_are_dropped():
+    cache = make_cache(ttl=60)
+    cache.set('kai', 'gpt', 0.2, QUESTION, ANSWER)
+    entry_id = next(iter(cache.entries))
+    key, _, question, value = cache.entries[entry_id]
+    cache.entries[entry_id] = (key, time.time() - 1, question, value)
+    assert lookup(cache, QUESTION) is None
+    assert cache.stats()['size'] == 0 and not cache.partitions
+
+
+def test_lru_limit_keeps_partitions_compact():
+    cache = make_cache(max_entries=2, threshold=0.99)
+    questions = ['Comment trier mes mails ?', 'Comment planifier mon sprint ?', 'Comment préparer ma réunion ?']
+    cache.set('kai', 'gpt', 0.2, questions[0], ANSWER)
+    cache.set('kai', 'gpt', 0.2, questions[1], ANSWER)
+    # Relue : devient la plus récente, la seconde est évincée
+    assert lookup(cache, questions[0]) is not None
+    cache.set('kai', 'gpt', 0.2, questions[2], ANSWER)
+    assert lookup(cache, questions[1]) is None
+    assert lookup(cache, questions[0]) is not None and lookup(cache, questions[2]) is not None
+    partition = next(iter(cache.partitions.values()))
+    assert len(partition.ids) == 2 and set(partition.rows.values()) == {0, 1}
+
+
+def test_chat_reuses_answer_for_rephrased_question(waveai, client, fake_provider, monkeypatch):
+    cache = make_cache(threshold=0.8)
+    monkeypatch.setattr(waveai.ai_system, 'semantic_cache', cache)
+    client.post('/api/chat', json={'message': QUESTION, 'agent': 'kai'})
+
+    other = waveai.app.test_client()
+    other.post('/login', data={'email': 'autre@waveai.app'})
+    hit = other.post('/api/chat', json={'message': 'Comment organiser ma semaine de travail efficacement ?',
+                                        'agent': 'kai'}).get_json()
+    assert hit['cached'] is True and hit['response'] == f"Réponse à : {QUESTION}"
+    assert 'tokens' not in hit
+    assert len(fake_provider.calls) == 1
+
+    # Avec un historique, la même question n'est pas servie depuis le cache
+    client.post('/api/chat', json={'message': QUESTION, 'agent': 'kai'})
+    assert len(fake_provider.calls) == 2
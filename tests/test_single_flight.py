@@ -0,0 +1,131 @@
+# Single-flight : un seul appel par clé, résultat et erreur partagés par les suiveurs
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+from single_flight import SingleFlight, AsyncSingleFlight
+
+
+class ProviderError(Exception):
+    pass
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condition jamais remplie'
+        time.sleep(0.005)
+
+
+def run_followers(flight, key, fn, count):
+    """Lance un meneur puis count suiveurs ; renvoie (threads, résultats) une fois tous en attente"""
+    results = []
+
+    def call():
+        try:
+            results.append(('ok', flight.do(key, fn)))
+        except Exception as e:
+            results.append(('error', e))
+
+    threads = [threading.Thread(target=call) for _ in range(count + 1)]
+    threads[0].start()
+    wait_for(lambda: key in flight.calls)
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: flight.calls[key].waiters == count)
+    return threads, results
+
+
+def test_followers_share_leader_result():
+    flight = SingleFlight(max_waiters=10, timeout=5)
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(2)
+        return 'réponse'
+
+    threads, results = run_followers(flight, 'k', fn, 3)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert len(calls) == 1
+    assert results == [('ok', 'réponse')] * 4
+    assert 'k' not in flight.calls
+    assert flight.stats()['coalesced'] == 3
+
+
+def test_leader_error_propagates_to_followers():
+    flight = SingleFlight(max_waiters=10, timeout=5)
+    release = threading.Event()
+    error = ProviderError('provider indisponible')
+
+    def fn():
+        release.wait(2)
+        raise error
+
+    threads, results = run_followers(flight, 'k', fn, 2)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert len(results) == 3
+    assert all(kind == 'error' and value is error for kind, value in results)
+    # L'échec n'est pas mémorisé : l'appel suivant repart d'un nouveau meneur
+    assert 'k' not in flight.calls
+    assert flight.do('k', lambda: 'rétabli') == 'rétabli'
+
+
+def test_saturated_key_starts_new_call():
+    flight = SingleFlight(max_waiters=0, timeout=5)
+    release = threading.Event()
+    thread = threading.Thread(target=flight.do, args=('k', lambda: release.wait(2)))
+    thread.start()
+    wait_for(lambda: 'k' in flight.calls)
+    assert flight.do('k', lambda: 'direct') == 'direct'
+    release.set()
+    thread.join(2)
+    assert flight.stats()['overflow'] == 1
+
+
+def test_async_leader_error_propagates_to_followers():
+    flight = AsyncSingleFlight(max_waiters=10)
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ProviderError('provider indisponible')
+
+    async def main():
+        return await asyncio.gather(*(flight.do('k', fn) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(isinstance(result, ProviderError) for result in results)
+    assert results[0] is results[1] is results[2]
+    assert flight.calls == {}
+
+
+def test_async_leader_cancellation_keeps_shared_call():
+    flight = AsyncSingleFlight(max_waiters=10)
+
+    async def fn():
+        await asyncio.sleep(0.02)
+        return 'réponse'
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do('k', fn))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do('k', fn))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == 'réponse'
+    assert flight.calls == {}
@@ -0,0 +1,114 @@
+# Chat en streaming (SSE) : jetons au fil de l'eau, événement done, repli entre providers et sauvegarde
+
+import json
+import threading
+
+import pytest
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+@pytest.fixture
+def openai_user(waveai, client):
+    """Utilisateur connecté avec une clé OpenAI et une clé Anthropic, OpenAI par défaut"""
+    from model_cache import model_cache
+    with waveai.app.app_context():
+        user = waveai.User.query.filter_by(email='test@waveai.app').first()
+        settings = waveai.get_user_settings(user.id)
+        settings.default_model = 'openai'
+        settings.openai_api_key = 'sk-test'
+        settings.anthropic_api_key = 'sk-ant-test'
+        waveai.db.session.commit()
+        model_cache.invalidate('settings', user.id)
+    return client
+
+
+def streamer(*parts, error=None):
+    def stream(message, agent_type, settings, history=None):
+        for part in parts:
+            yield part
+        if error:
+            raise error
+    return stream
+
+
+def test_requires_login(app_db):
+    response = app_db.app.test_client().post('/api/chat/stream', json={'message': 'Bonjour', 'agent': 'kai'})
+    assert response.status_code == 401
+
+
+def test_tokens_then_done_and_saved(waveai, openai_user, fake_provider, monkeypatch):
+    monkeypatch.setattr(waveai.ai_system, 'stream_openai_response', streamer('Bon', 'jour ', 'Alex'))
+    response = openai_user.post('/api/chat/stream', json={'message': 'Salut', 'agent': 'alex'})
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    events = parse_events(response.get_data(as_text=True))
+    assert [payload['text'] for event, payload in events if event == 'token'] == ['Bon', 'jour ', 'Alex']
+    event, done = events[-1]
+    assert event == 'done'
+    assert done['response'] == 'Bonjour Alex' and done['source'] == 'openai'
+    assert done['conversation_id']
+
+    with waveai.app.app_context():
+        messages = waveai.latest_messages_query(done['conversation_id']).all()[::-1]
+        assert [(message.role, message.content) for message in messages] == [('user', 'Salut'),
+                                                                             ('assistant', 'Bonjour Alex')]
+    # Aucun appel non streamé
+    assert fake_provider.calls == []
+
+
+def test_tokens_are_sent_before_the_provider_finishes(waveai, openai_user, monkeypatch):
+    release = threading.Event()
+
+    def stream(message, agent_type, settings, history=None):
+        yield 'Premier'
+        # Le client doit avoir reçu le premier jeton avant la suite
+        assert release.wait(2)
+        yield ' second'
+
+    monkeypatch.setattr(waveai.ai_system, 'stream_openai_response', stream)
+    response = openai_user.post('/api/chat/stream', json={'message': 'Salut', 'agent': 'kai'}, buffered=False)
+    chunks = iter(response.response)
+    first = next(chunks)
+    first = first.decode('utf-8') if isinstance(first, bytes) else first
+    assert parse_events(first) == [('token', {'text': 'Premier'})]
+    release.set()
+    rest = ''.join(chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk for chunk in chunks)
+    assert parse_events(rest)[-1][1]['response'] == 'Premier second'
+    response.close()
+
+
+def test_failure_before_first_token_tries_next_provider(waveai, openai_user, monkeypatch):
+    monkeypatch.setattr(waveai.ai_system, 'stream_openai_response', streamer(error=RuntimeError('coupé')))
+    monkeypatch.setattr(waveai.ai_system, 'stream_anthropic_response', streamer('Réponse ', 'Claude'))
+    events = parse_events(openai_user.post('/api/chat/stream', json={'message': 'Salut', 'agent': 'kai'})
+                          .get_data(as_text=True))
+    assert events[-1][0] == 'done'
+    assert events[-1][1]['source'] == 'anthropic'
+    assert events[-1][1]['response'] == 'Réponse Claude'
+
+
+def test_failure_after_first_token_keeps_partial_answer(waveai, openai_user, monkeypatch):
+    monkeypatch.setattr(waveai.ai_system, 'stream_openai_response', streamer('Début', error=RuntimeError('coupé')))
+    anthropic = streamer('jamais')
+    monkeypatch.setattr(waveai.ai_system, 'stream_anthropic_response', anthropic)
+    events = parse_events(openai_user.post('/api/chat/stream', json={'message': 'Salut', 'agent': 'kai'})
+                          .get_data(as_text=True))
+    # Le client a déjà affiché des jetons : pas de second provider mêlé à la réponse
+    assert [payload['text'] for event, payload in events if event == 'token'] == ['Début']
+    assert events[-1][1]['source'] == 'openai' and events[-1][1]['response'] == 'Début'
+
+
+def test_without_streaming_provider_sends_full_answer(waveai, client, monkeypatch):
+    monkeypatch.setattr(waveai.ai_system, 'get_huggingface_response',
+                        lambda message, agent_type, settings: waveai.ai_system.make_response('Réponse HF', 'huggingface', agent_type))
+    events = parse_events(client.post('/api/chat/stream', json={'message': 'Salut', 'agent': 'kai'}).get_data(as_text=True))
+    assert events[0] == ('token', {'text': 'Réponse HF'})
+    assert events[-1][0] == 'done' and events[-1][1]['source'] == 'huggingface'
@@ -0,0 +1,134 @@
+# Tampon des échanges : lots, reprise après échec, mise de côté sur disque et rejeu
+
+import os
+import json
+
+import pytest
+
+from transcript_buffer import TranscriptBuffer, MAX_FAILURES
+
+
+class Writer:
+    """Base simulée : refuse les lots tant que down, et tout lot contenant un échange rejeté"""
+
+    def __init__(self):
+        self.batches = []
+        self.down = False
+        self.rejected = set()
+
+    def __call__(self, entries):
+        if self.down:
+            raise ConnectionError('base indisponible')
+        if any(entry['conversation_id'] in self.rejected for entry in entries):
+            raise ValueError('échange invalide')
+        self.batches.append([entry['conversation_id'] for entry in entries])
+
+    @property
+    def written(self):
+        return [conversation_id for batch in self.batches for conversation_id in batch]
+
+
+def entry(conversation_id, user_id=1, agent_type='alex'):
+    return {
+        'user_id': user_id,
+        'agent_type': agent_type,
+        'conversation_id': conversation_id,
+        'new_conversation': True,
+        'title': f'conversation {conversation_id}',
+        'created_at': '2026-01-01T12:00:00',
+        'messages': [{'role': 'user', 'content': 'bonjour'}, {'role': 'assistant', 'content': 'salut'}]
+    }
+
+
+@pytest.fixture
+def writer():
+    return Writer()
+
+
+@pytest.fixture
+def make_buffer(tmp_path, writer):
+    spill_path = str(tmp_path / 'pending.jsonl')
+
+    def make(**kwargs):
+        # Mode sync : pas de thread, les flush sont appelés explicitement par le test
+        options = {'mode': 'sync', 'max_entries': 2, 'spill_path': spill_path}
+        options.update(kwargs)
+        return TranscriptBuffer(writer, **options)
+    return make
+
+
+def test_flush_writes_batches_in_order(make_buffer, writer):
+    buffer = make_buffer()
+    for conversation_id in range(1, 6):
+        buffer.submit(entry(conversation_id))
+    assert buffer.pending_turns(5) == [('user', 'bonjour'), ('assistant', 'salut')]
+    assert buffer.pending_conversation(5, 1, 'alex').id == 5
+    assert buffer.pending_conversation(5, 2, 'alex') is None
+    assert buffer.flush()
+    assert writer.batches == [[1, 2], [3, 4], [5]]
+    assert buffer.pending_turns(5) == [] and buffer.active == {}
+    assert buffer.stats()['written'] == 5
+
+
+def test_transient_failure_keeps_order(make_buffer, writer):
+    buffer = make_buffer()
+    for conversation_id in range(1, 4):
+        buffer.submit(entry(conversation_id))
+    writer.down = True
+    assert not buffer.flush()
+    assert [pending['conversation_id'] for pending in buffer.pending] == [1, 2, 3]
+    # Toujours lisible par le chat suivant en attendant l'écriture
+    assert buffer.latest_conversation(1, 'alex', since=buffer.active[(1, 'alex')][1]).id == 3
+    writer.down = False
+    assert buffer.flush()
+    assert writer.written == [1, 2, 3]
+
+
+def test_poison_entry_spilled_then_replayed(make_buffer, writer):
+    buffer = make_buffer()
+    writer.rejected = {2}
+    for conversation_id in range(1, 4):
+        buffer.submit(entry(conversation_id))
+    for _ in range(MAX_FAILURES - 1):
+        assert not buffer.flush()
+    assert buffer.flush()
+    # Le lot fautif est rejoué échange par échange : seul l'échange 2 est mis de côté
+    assert writer.written == [1, 3]
+    with open(buffer.spill_path, encoding='utf-8') as spill:
+        assert [json.loads(line)['conversation_id'] for line in spill] == [2]
+    assert buffer.stats()['spilled'] == 1
+
+    writer.rejected = set()
+    assert buffer.replay() == 1
+    assert writer.written == [1, 3, 2]
+    assert not os.path.exists(buffer.spill_path)
+    assert buffer.stats()['spilled'] == 0
+
+
+def test_close_spills_and_next_process_replays(make_buffer, writer):
+    buffer = make_buffer()
+    for conversation_id in range(1, 4):
+        buffer.submit(entry(conversation_id))
+    writer.down = True
+    buffer.close()
+    assert not buffer.pending
+    assert writer.written == []
+
+    writer.down = False
+    restarted = make_buffer()
+    assert restarted.replay() == 3
+    assert writer.batches == [[1, 2], [3]]
+    assert restarted.replay() == 0
+
+
+def test_failed_replay_keeps_spill_file(make_buffer, writer):
+    buffer = make_buffer()
+    buffer._spill([entry(1), entry(2)])
+    writer.down = True
+    assert buffer.replay() == 0
+    assert not os.path.exists(f'{buffer.spill_path}.replay')
+    with open(buffer.spill_path, encoding='utf-8') as spill:
+        assert [json.loads(line)['conversation_id'] for line in spill] == [1, 2]
+    writer.down = False
+    assert buffer.replay() == 2
+    assert writer.written == [1, 2]
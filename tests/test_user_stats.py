@@ -0,0 +1,78 @@
+# Statistiques matérialisées (user_stats) : mises à jour à chaque échange, recalcul par backfill-user-stats
+
+from contextlib import contextmanager
+
+from flask import template_rendered
+
+
+def stats_row(waveai):
+    with waveai.app.app_context():
+        user = waveai.User.query.filter_by(email='test@waveai.app').first()
+        stats = waveai.user_stats_query(user.id).first()
+        if stats is None:
+            return None
+        return {'total_conversations': stats.total_conversations, 'total_messages': stats.total_messages,
+                'agent_counts': stats.get_agent_counts(), 'last_activity': stats.last_activity}
+
+
+@contextmanager
+def captured_templates(app):
+    recorded = []
+
+    def record(sender, template, context, **extra):
+        recorded.append((template.name, context))
+
+    template_rendered.connect(record, app)
+    try:
+        yield recorded
+    finally:
+        template_rendered.disconnect(record, app)
+
+
+def chat_a_bit(client):
+    client.post('/api/chat', json={'message': 'Bonjour Kai', 'agent': 'kai'})
+    client.post('/api/chat', json={'message': 'Encore Kai', 'agent': 'kai'})
+    client.post('/api/chat', json={'message': 'Bonjour Alex', 'agent': 'alex'})
+
+
+def test_each_exchange_updates_stats(waveai, client, fake_provider):
+    assert stats_row(waveai) is None
+    chat_a_bit(client)
+    stats = stats_row(waveai)
+    assert stats['total_conversations'] == 2
+    assert stats['total_messages'] == 6
+    assert stats['agent_counts'] == {'kai': 1, 'alex': 1}
+    assert stats['last_activity'] is not None
+
+
+def test_dashboard_reads_materialized_stats(waveai, client, fake_provider):
+    chat_a_bit(client)
+    with captured_templates(waveai.app) as templates:
+        assert client.get('/dashboard').status_code == 200
+    name, context = templates[0]
+    assert name == 'dashboard.html'
+    assert context['stats']['total_conversations'] == 2
+    assert context['stats']['agents_used'] == 2
+    assert context['stats']['last_activity'] != 'Première connexion'
+
+
+def test_dashboard_without_activity(waveai, client):
+    with captured_templates(waveai.app) as templates:
+        client.get('/dashboard')
+    stats = templates[0][1]['stats']
+    assert stats['total_conversations'] == 0 and stats['agents_used'] == 0
+
+
+def test_backfill_rebuilds_stats_idempotently(waveai, client, fake_provider):
+    chat_a_bit(client)
+    expected = stats_row(waveai)
+    with waveai.app.app_context():
+        waveai.UserStats.query.delete()
+        waveai.db.session.commit()
+
+    runner = waveai.app.test_cli_runner()
+    assert '1 utilisateur(s)' in runner.invoke(args=['backfill-user-stats']).output
+    assert stats_row(waveai) == expected
+    # Réécrit, jamais incrémenté
+    runner.invoke(args=['backfill-user-stats'])
+    assert stats_row(waveai) == expected
@@ -0,0 +1,248 @@
+# WaveAI - Écriture différée des échanges de chat
+# Tampon du processus vidé par lots (un INSERT groupé toutes les N ms ou M échanges) par un thread dédié
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# sync : commit dans la requête (défaut, tests) ; buffered : écriture différée
+TRANSCRIPT_WRITE = os.environ.get('WAVEAI_TRANSCRIPT_WRITE', 'sync').lower()
+FLUSH_INTERVAL_MS = int(os.environ.get('WAVEAI_TRANSCRIPT_FLUSH_MS', 200))
+FLUSH_MAX_ENTRIES = int(os.environ.get('WAVEAI_TRANSCRIPT_BATCH', 100))
+MAX_PENDING = int(os.environ.get('WAVEAI_TRANSCRIPT_MAX_PENDING', 10000))
+SPILL_PATH = os.environ.get('WAVEAI_TRANSCRIPT_SPILL_PATH', 'waveai_transcripts_pending.jsonl')
+MAX_FAILURES = 3
+
+
+class ConversationIdAllocator:
+    """Id d'une conversation créée en différé, connu avant son INSERT (renvoyé tout de suite au client)"""
+
+    def __init__(self, app, db, table='conversations'):
+        self.app = app
+        self.db = db
+        self.table = table
+        self._next = None
+        self._lock = threading.Lock()
+
+    def allocate(self):
+        if self.db.engine.dialect.name == 'postgresql':
+            # nextval n'attend aucun commit et reste correct avec plusieurs workers
+            return self.db.session.execute(text("SELECT nextval(pg_get_serial_sequence(:table, 'id'))"),
+                                           {'table': self.table}).scalar()
+        # SQLite : compteur du processus (un seul processus écrit en développement)
+        with self._lock:
+            if self._next is None:
+                with self.app.app_context():
+                    current = self.db.session.execute(text(f"SELECT MAX(id) FROM {self.table}")).scalar()
+                self._next = (current or 0) + 1
+            allocated = self._next
+            self._next += 1
+            return allocated
+
+
+class TranscriptBuffer:
+    """Échanges en attente d'écriture ; writer(entries) les enregistre en une transaction.
+
+    Un lot en échec est réessayé ; après MAX_FAILURES échecs, chaque échange est réessayé seul
+    et ceux qui échouent encore sont copiés dans spill_path, rejoué au prochain lot réussi ou au démarrage.
+    """
+
+    def __init__(self, writer, mode=TRANSCRIPT_WRITE, flush_interval_ms=FLUSH_INTERVAL_MS,
+                 max_entries=FLUSH_MAX_ENTRIES, max_pending=MAX_PENDING, spill_path=SPILL_PATH):
+        self.writer = writer
+        self.enabled = mode == 'buffered'
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_entries = max(1, max_entries)
+        self.max_pending = max(self.max_entries, max_pending)
+        self.spill_path = spill_path
+        self.pending = deque()
+        # Conversations et activité pas encore en base : lues par le chat suivant avant le flush
+        self.active = {}
+        self.turns = {}
+        self.owners = {}
+        self.counters = {'submitted': 0, 'written': 0, 'batches': 0, 'failures': 0, 'spilled': 0}
+        self.last_flush_ms = None
+        self._failures = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+
+    def submit(self, entry):
+        """entry : user_id, agent_type, conversation_id, new_conversation, title, created_at (ISO), messages"""
+        with self._condition:
+            self.pending.append(entry)
+            self.counters['submitted'] += 1
+            self.active[(entry['user_id'], entry['agent_type'])] = (entry['conversation_id'],
+                                                                    datetime.fromisoformat(entry['created_at']))
+            self.turns.setdefault(entry['conversation_id'], []).extend(
+                (message['role'], message['content']) for message in entry['messages'])
+            self.owners[entry['conversation_id']] = (entry['user_id'], entry['agent_type'])
+            backlog = len(self.pending)
+            if backlog >= self.max_entries:
+                self._condition.notify()
+        self.start()
+        # Base lente ou indisponible : la requête écrit elle-même plutôt que de laisser le tampon grossir
+        if backlog >= self.max_pending:
+            self.flush()
+
+    def pending_conversation(self, conversation_id, user_id, agent_type):
+        """Conversation demandée par son id alors qu'elle attend encore son INSERT"""
+        with self._condition:
+            owner = self.owners.get(conversation_id)
+        if owner == (user_id, agent_type):
+            return SimpleNamespace(id=conversation_id)
+        return None
+
+    def latest_conversation(self, user_id, agent_type, since):
+        """Dernière conversation de l'utilisateur avec cet agent si un échange attend d'être écrit (plus récente que la base)"""
+        with self._condition:
+            active = self.active.get((user_id, agent_type))
+        if active and active[1] >= since:
+            return SimpleNamespace(id=active[0])
+        return None
+
+    def pending_turns(self, conversation_id):
+        with self._condition:
+            return list(self.turns.get(conversation_id, ()))
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name='waveai-transcripts')
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._condition:
+                if len(self.pending) < self.max_entries:
+                    self._condition.wait(self.flush_interval)
+            if self._stop.is_set():
+                break
+            if self.pending and not self.flush():
+                # Base indisponible : on espace les tentatives
+                time.sleep(min(5.0, self.flush_interval * 2 ** self._failures))
+
+    def flush(self):
+        """Écrit tout ce qui est en attente, par lots de max_entries ; False si un lot a échoué"""
+        with self._flush_lock:
+            while True:
+                with self._condition:
+                    batch = [self.pending.popleft() for _ in range(min(self.max_entries, len(self.pending)))]
+                if not batch:
+                    return True
+                started = time.perf_counter()
+                try:
+                    self.writer(batch)
+                except Exception as e:
+                    self._failures += 1
+                    self.counters['failures'] += 1
+                    logger.error(f"Erreur écriture des échanges ({len(batch)}): {e}")
+                    if self._failures < MAX_FAILURES:
+                        with self._condition:
+                            self.pending.extendleft(reversed(batch))
+                        return False
+                    self._isolate(batch)
+                    continue
+                self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+                self._written(batch)
+                if self._failures or self.counters['spilled']:
+                    self._failures = 0
+                    self.replay()
+
+    def _isolate(self, batch):
+        # Un échange invalide ne doit pas bloquer les autres ; ceux qui échouent seuls sont mis de côté
+        self._failures = 0
+        for entry in batch:
+            try:
+                self.writer([entry])
+                self._written([entry])
+            except Exception as e:
+                logger.error(f"Échange mis de côté ({self.spill_path}): {e}")
+                self._spill([entry])
+                self._written([entry], written=False)
+
+    def _written(self, batch, written=True):
+        with self._condition:
+            if written:
+                self.counters['written'] += len(batch)
+                self.counters['batches'] += 1
+            still_pending = {entry['conversation_id'] for entry in self.pending}
+            for entry in batch:
+                key = (entry['user_id'], entry['agent_type'])
+                if self.active.get(key, (None,))[0] == entry['conversation_id'] and entry['conversation_id'] not in still_pending:
+                    del self.active[key]
+                if entry['conversation_id'] not in still_pending:
+                    self.turns.pop(entry['conversation_id'], None)
+                    self.owners.pop(entry['conversation_id'], None)
+
+    def _spill(self, entries):
+        with open(self.spill_path, 'a', encoding='utf-8') as spill:
+            for entry in entries:
+                spill.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.counters['spilled'] += len(entries)
+
+    def replay(self):
+        """Réécrit les échanges mis de côté (après un arrêt ou une panne de la base)"""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return 0
+        processing = f"{self.spill_path}.replay"
+        try:
+            os.replace(self.spill_path, processing)
+            with open(processing, encoding='utf-8') as spill:
+                entries = [json.loads(line) for line in spill if line.strip()]
+            # Ordre d'origine : la création d'une conversation précède ses échanges suivants
+            for start in range(0, len(entries), self.max_entries):
+                self.writer(entries[start:start + self.max_entries])
+            os.remove(processing)
+            self.counters['spilled'] = 0
+            if entries:
+                logger.info(f"✅ {len(entries)} échange(s) mis de côté réécrit(s)")
+            return len(entries)
+        except Exception as e:
+            logger.error(f"Erreur reprise des échanges mis de côté: {e}")
+            # Remis en place pour la prochaine tentative (avec ce qui a pu être ajouté entre-temps)
+            if os.path.exists(processing):
+                with open(processing, encoding='utf-8') as spill:
+                    remaining = spill.read()
+                with open(self.spill_path, 'a', encoding='utf-8') as target:
+                    target.write(remaining)
+                os.remove(processing)
+            return 0
+
+    def close(self):
+        """Arrêt du processus : dernier flush, et copie sur disque de ce qui n'a pas pu être écrit"""
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        if not self.pending:
+            return
+        if not self.flush():
+            with self._condition:
+                remaining = list(self.pending)
+                self.pending.clear()
+            self._spill(remaining)
+            logger.error(f"❌ {len(remaining)} échange(s) non écrit(s) copiés dans {self.spill_path}")
+
+    def stats(self):
+        with self._condition:
+            return dict(self.counters, mode='buffered' if self.enabled else 'sync',
+                        pending=len(self.pending), last_flush_ms=self.last_flush_ms)
+
+
+def register_shutdown(buffer):
+    atexit.register(buffer.close)